@@ -1,12 +1,22 @@
 import logging
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import click
+from pypika import CustomFunction
+from pypika.terms import Term
 
 from data_organizer.config import OrganizerConfig
-from data_organizer.data.populator import get_table_data_from_user_input
-from data_organizer.db.connection import DatabaseConnection
+from data_organizer.data.populator import (
+    coerce_value,
+    column_input_type,
+    get_table_data_from_user_input,
+    infer_format,
+    is_missing,
+    read_chunks,
+)
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.model import ColumnSetting
 from data_organizer.utils import echo_and_log, init_logging_to_file
 
 logger = logging.getLogger(__name__)
@@ -34,8 +44,35 @@ logger = logging.getLogger(__name__)
     show_default=True,
     help="File containing the secrets (e.g. Database password).",
 )
+@click.option(
+    "--from_file",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Add all rows in this csv or jsonl file to --table instead of prompting. "
+    "Values for the relative table are set in columns named REL_TABLE.COLUMN.",
+)
+@click.option(
+    "--table",
+    default=None,
+    help="Table (name in the config) the rows in --from_file are added to.",
+)
+@click.option(
+    "--batch_size",
+    default=1000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of rows per INSERT statement with --from_file.",
+)
+@click.pass_context
 def cli(
-    config_files: Tuple[str, ...], conf_base: str, default_settings: str, secrets: str
+    ctx,
+    config_files: Tuple[str, ...],
+    conf_base: str,
+    default_settings: str,
+    secrets: str,
+    from_file: Optional[str],
+    table: Optional[str],
+    batch_size: int,
 ):
     """
     CLI app to add data to a table defined in the passed CONFIG_FILES.
@@ -57,9 +94,17 @@ def cli(
     if not config.tables:
         click.echo("No tables set in the initialized configuration")
 
+    if from_file is not None and table not in config.tables:
+        raise click.BadParameter(
+            "Pass a table defined in the config with --table if --from_file is used"
+        )
+
     conn_name = "DataOrganizerCli-EditTable"
 
     with DatabaseConnection(**config.settings.db.to_dict(), name=conn_name) as db:
+        if from_file is not None:
+            assert table is not None
+            ctx.exit(code=edit_from_file(config, db, table, from_file, batch_size))
         edit(config, db)
 
 
@@ -95,15 +140,18 @@ def edit_table(config: OrganizerConfig, db: DatabaseConnection, table: str):
     while not exit_cond_met:
         action = "add"  # Replace with a prompt if more actions are available
         if action == "add":
-            _, values = get_table_data_from_user_input(
+            columns, values = get_table_data_from_user_input(
                 config, table, prompt_func=click.prompt
             )
-            success, err = db.insert(config.tables[table], [values])
+            if config.tables[table].rel_table:
+                success, err = insert_relative(
+                    config, db, table, dict(zip(columns, values))
+                )
+            else:
+                success, err = db.insert(config.tables[table], [values])
             # TODO: Error is printed twice. Error and warning from logging still shown
             if not success:
                 click.echo("Data could not be inserted: %s" % err)
-            if success and config.tables[table].rel_table:
-                insert_relative(config, db, table)
 
         if click.confirm(
             "Are you finished applying actions to this table?", default=True
@@ -112,17 +160,24 @@ def edit_table(config: OrganizerConfig, db: DatabaseConnection, table: str):
 
 
 def insert_relative(
-    config: OrganizerConfig, db: DatabaseConnection, table: str
-) -> None:
+    config: OrganizerConfig,
+    db: DatabaseConnection,
+    table: str,
+    values: Dict[str, column_input_type],
+) -> Tuple[bool, Optional[str]]:
     """
-    Insert data into a relative table. Is expected to be called directly after inserting
-    the data in the main table because the last value of the common column is queries
-    from the database.
+    Insert the data of the main table and optionally data into the relative table.
+    Both are inserted in one transaction and the value of the common column (e.g.
+    SERIAL) is taken from the inserted main row.
 
     Args:
         config: Config with relative table
         db: Database for insertion
         table: Name of the main table
+        values: Column -> value of the inserted row in the main table
+
+    Returns: Boolean flag denoting success of the insertion and Optional string
+             specifying the error
     """
     # At this point rel_table_name is ensured to be a string
     main_table = config.tables[table]
@@ -141,28 +196,182 @@ def insert_relative(
         # Check again. Mainly used to skip adding of ^^^ confirm was denied
         if db.has_table(config.tables[rel_table_name].name):
             common_column: str = main_table.rel_table_common_column  # type: ignore
-            # We need the value for the common column. In principle could be taken from
-            # inserted data but querying is save for SERIAL values that are only set
-            # at insertion time
-            sql = f"""
-                SELECT {common_column}
-                FROM {db.schema}.{main_table.name}
-                ORDER BY {common_column} DESC
-                LIMIT 1;
-            """
-            logger.debug(sql)
-            last_id = db.query_to_df(sql)[common_column].iloc[0]
+            # Values for SERIAL columns are only set at insertion time. The
+            # placeholder is replaced by the value of the inserted main row.
+            common_value = values.get(common_column, 0)
 
             # Ask for user input that will be filled in the relative table
-            _, values = get_table_data_from_user_input(
+            rel_columns, rel_values = get_table_data_from_user_input(
                 config,
                 rel_table_name,
                 prompt_func=click.prompt,
-                set_values={common_column: last_id},
+                set_values={common_column: common_value},  # type: ignore
             )
-            success, err = db.insert(config.tables[rel_table_name], [values])
-            if not success:
-                click.echo("Data could not be inserted: %s" % err)
+            success, err, _ = db.insert_with_relative(
+                main_table,
+                list(values.values()),
+                config.tables[rel_table_name],
+                [rel_values],
+                common_column,
+            )
+            return success, err
+
+    return db.insert(main_table, [list(values.values())])
+
+
+def _get_last_serial_value(
+    db: DatabaseConnection, table_name: str, column: str
+) -> Term:
+    """SQL expression of the last value of the SERIAL column in the transaction"""
+    if db.backend == Backend.MYSQL:
+        return CustomFunction("LAST_INSERT_ID", [])()
+    # The name is parsed as (qualified) identifier. Quote it to keep upper case
+    table_name = f'"{table_name}"'
+    if db.schema is not None:
+        table_name = f'"{db.schema}".{table_name}'
+    currval = CustomFunction("currval", ["sequence"])
+    pg_get_serial_sequence = CustomFunction(
+        "pg_get_serial_sequence", ["table", "column"]
+    )
+    return currval(pg_get_serial_sequence(table_name, column))
+
+
+def edit_from_file(
+    config: OrganizerConfig,
+    db: DatabaseConnection,
+    table: str,
+    file_name: str,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Add all rows in the file to the table (and the relative table) in one
+    transaction. The values are parsed with the same rules as the prompted input.
+    Nothing is inserted if any row is invalid or rejected by the database.
+
+    Args:
+        config: Config with the tables
+        db: Database for insertion
+        table: Name of the main table
+        file_name: csv or jsonl file. Columns of the relative table are prefixed
+                   with the name of the relative table (e.g. rel_table.value)
+        batch_size: Number of rows per INSERT statement
+
+    Returns: 0 if all rows were inserted, 1 otherwise
+    """
+    auto_fill_ctypes = config.settings.table_settings.auto_fill_ctypes
+    main_table = config.tables[table]
+    rel_table_name = main_table.rel_table
+    common_column = main_table.rel_table_common_column
+
+    for table_name in [table] + ([] if rel_table_name is None else [rel_table_name]):
+        if not db.has_table(config.tables[table_name].name):
+            echo_and_log("ERROR", "Table %s not yet created in database", table_name)
+            return 1
+
+    def _get_columns(table_name: str) -> List[ColumnSetting]:
+        return [
+            c
+            for c in config.tables[table_name].columns
+            if c.ctype.upper() not in auto_fill_ctypes
+        ]
+
+    main_columns = _get_columns(table)
+    rel_columns = [] if rel_table_name is None else _get_columns(rel_table_name)
+    # Value of the common column is only known after the insert (e.g. SERIAL)
+    common_from_db = common_column is not None and common_column not in [
+        c.name for c in main_columns
+    ]
+
+    try:
+        input_format = infer_format(file_name)
+    except ValueError as e:
+        echo_and_log("ERROR", "%s", e)
+        return 1
+
+    main_rows: List[List[Any]] = []
+    rel_rows: List[Optional[List[Any]]] = []
+    n_invalid = 0
+    i_row = 0
+    for chunk in read_chunks(file_name, input_format, batch_size):
+        for record in chunk.to_dict(orient="records"):
+            i_row += 1
+            rel_record: Dict[str, Any] = {}
+            if rel_table_name is not None:
+                rel_record = {
+                    key.split(".", 1)[1]: value
+                    for key, value in record.items()
+                    if key.startswith(f"{rel_table_name}.")
+                    and not is_missing(value)
+                    and value != ""
+                }
+            try:
+                main_row: List[Any] = [
+                    coerce_value(c, record.get(c.name)) for c in main_columns
+                ]
+                # Values of the relative table. None if the row has none
+                rel_row: Optional[List[Any]] = None
+                if rel_table_name is not None and rel_record:
+                    if not common_from_db:
+                        rel_record[common_column] = main_row[
+                            [c.name for c in main_columns].index(common_column)
+                        ]
+                    rel_row = [
+                        coerce_value(c, rel_record.get(c.name))
+                        if c.name != common_column or not common_from_db
+                        else None
+                        for c in rel_columns
+                    ]
+            except ValueError as e:
+                echo_and_log("ERROR", "Row %s is invalid: %s", i_row, str(e))
+                n_invalid += 1
+                continue
+            main_rows.append(main_row)
+            rel_rows.append(rel_row)
+
+    if n_invalid:
+        echo_and_log("ERROR", "%s rows are invalid. No rows inserted", n_invalid)
+        return 1
+
+    inserts: List[Tuple[Any, List[List[Any]]]] = []
+    if common_from_db:
+        # The relative row has to be inserted directly after its main row to
+        # reference the generated value. The statements are sent in batches.
+        assert rel_table_name is not None and common_column is not None
+        last_value = _get_last_serial_value(db, main_table.name, common_column)
+        common_index = [c.name for c in rel_columns].index(common_column)
+        for main_row, rel_row in zip(main_rows, rel_rows):
+            inserts.append((main_table, [main_row]))
+            if rel_row is not None:
+                rel_row[common_index] = last_value
+                inserts.append((config.tables[rel_table_name], [rel_row]))
+    else:
+        for i in range(0, len(main_rows), batch_size):
+            inserts.append((main_table, main_rows[i : i + batch_size]))
+        valid_rel_rows = [r for r in rel_rows if r is not None]
+        for i in range(0, len(valid_rel_rows), batch_size):
+            assert rel_table_name is not None
+            inserts.append(
+                (config.tables[rel_table_name], valid_rel_rows[i : i + batch_size])
+            )
+
+    if not inserts:
+        echo_and_log("WARNING", "No rows in %s", file_name)
+        return 0
+
+    success = db.insert_many(inserts, batch_size=batch_size if common_from_db else 1)
+    if not success:
+        echo_and_log("ERROR", "Rows could not be inserted. No rows inserted")
+        return 1
+
+    echo_and_log(
+        "INFO",
+        "Inserted %s rows into %s and %s rows into %s",
+        len(main_rows),
+        table,
+        len([r for r in rel_rows if r is not None]),
+        rel_table_name,
+    )
+    return 0
 
 
 if __name__ == "__main__":
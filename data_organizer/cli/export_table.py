@@ -0,0 +1,375 @@
+import csv
+import gzip
+import logging
+import re
+import time
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import click
+from pypika import Table
+from sqlalchemy.exc import ProgrammingError
+
+from data_organizer.config import OrganizerConfig
+from data_organizer.db.connection import DatabaseConnection
+from data_organizer.db.model import ColumnSetting, TableSetting
+from data_organizer.db.query import SqlCriterion
+from data_organizer.utils import init_logging
+
+logger = logging.getLogger("ExportTableCli")
+
+output_formats = ["csv", "parquet"]
+# Directory name of the partition with NULL values (same as Hive/Spark)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+@click.command()
+@click.argument("config_files", nargs=-1)
+@click.option(
+    "--conf_base",
+    default="conf/",
+    show_default=True,
+    help="Base directory containing all config files. All other condif file paths will "
+    "be interpreted relative to this",
+)
+@click.option(
+    "--default_settings",
+    default="settings.toml",
+    show_default=True,
+    help="Main settings file defining e.g. DB options and table configuration. Pass "
+    "the file relative to --conf_base.",
+)
+@click.option(
+    "--secrets",
+    default=".secrets.toml",
+    show_default=True,
+    help="File containing the secrets (e.g. Database password).",
+)
+@click.option(
+    "--table",
+    required=True,
+    help="Table (name in the config) that is exported.",
+)
+@click.option(
+    "--output",
+    required=True,
+    help="Output file. With --partition_by the output directory.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(output_formats),
+    default=None,
+    help="Format of the output. csv files are gzip compressed. Inferred from the "
+    "extension of --output if not passed (.csv.gz or .parquet). parquet requires "
+    "pyarrow.",
+)
+@click.option(
+    "--columns",
+    default=None,
+    help="Comma separated list of the exported columns. All columns if not passed.",
+)
+@click.option(
+    "--where",
+    default=None,
+    help='SQL condition the exported rows are filtered with (e.g. "date >= '
+    "'2022-01-01'\").",
+)
+@click.option(
+    "--partition_by",
+    default=None,
+    help="Write the rows into one subdirectory per value of this column (e.g. "
+    "OUTPUT/date=2022-01-01/part-000.parquet).",
+)
+@click.option(
+    "--partition_format",
+    default=None,
+    help="strftime format applied to date values of --partition_by (e.g. %Y-%m for "
+    "monthly partitions).",
+)
+@click.option(
+    "--batch_size",
+    default=50000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of rows fetched from the database and written at once.",
+)
+@click.option("--debug", is_flag=True, help="Enable debug logging.")
+@click.pass_context
+def cli(
+    ctx,
+    config_files: Tuple[str, ...],
+    conf_base: str,
+    default_settings: str,
+    secrets: str,
+    table: str,
+    output: str,
+    output_format: Optional[str],
+    columns: Optional[str],
+    where: Optional[str],
+    partition_by: Optional[str],
+    partition_format: Optional[str],
+    batch_size: int,
+    debug: bool,
+):
+    """
+    Utility that exports a table defined in the passed CONFIG_FILES to gzip
+    compressed CSV or Parquet files. The rows are streamed from the database so the
+    memory usage does not depend on the size of the table.
+    """
+    init_logging("DEBUG" if debug else "INFO")
+
+    for passed_file in list(config_files) + [default_settings, secrets]:
+        if not Path(f"{conf_base}/{passed_file}").is_file():
+            raise RuntimeError("File %s does not exist" % passed_file)
+
+    config = OrganizerConfig(
+        config_dir_base=conf_base,
+        default_settings=default_settings,
+        secrets=secrets,
+        additional_configs=list(config_files),
+    )
+
+    if table not in config.tables:
+        raise click.BadParameter("Table %s is not defined in the config" % table)
+
+    conn_name = "DataOrganizerCli-ExportTable"
+
+    with DatabaseConnection(**config.settings.db.to_dict(), name=conn_name) as db:
+        status_code = export(
+            db,
+            table=config.tables[table],
+            output=output,
+            output_format=output_format,
+            columns=None if columns is None else columns.split(","),
+            where=where,
+            partition_by=partition_by,
+            partition_format=partition_format,
+            batch_size=batch_size,
+        )
+
+    ctx.exit(code=status_code)
+
+
+def infer_format(file_name: str) -> str:
+    """Get the output format from the extension of the file"""
+    suffixes = [s.lower() for s in Path(file_name).suffixes]
+    if suffixes[-2:] == [".csv", ".gz"]:
+        return "csv"
+    if suffixes and suffixes[-1] in [".parquet", ".pq"]:
+        return "parquet"
+
+    raise click.BadParameter(
+        "Format of %s can not be inferred. Pass one of %s with --format"
+        % (file_name, output_formats)
+    )
+
+
+class CsvGzWriter:
+    """Write rows incrementally to a gzip compressed csv file"""
+
+    extension = "csv.gz"
+
+    def __init__(self, file_name: Union[str, Path], columns: List[ColumnSetting]):
+        self._file = gzip.open(file_name, "wt", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([c.name for c in columns])
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self._writer.writerows(
+            [
+                [
+                    # Same representation as the hex output of BYTEA in POSTGRES
+                    "\\x" + bytes(v).hex()
+                    if isinstance(v, (bytes, bytearray, memoryview))
+                    else v
+                    for v in row
+                ]
+                for row in rows
+            ]
+        )
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Write rows incrementally to a parquet file. Each call of write adds a row
+    group. The schema is derived from the column types in the config.
+    """
+
+    extension = "parquet"
+
+    def __init__(self, file_name: Union[str, Path], columns: List[ColumnSetting]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Writing parquet files requires the pyarrow package. Install "
+                "data_organizer[parquet]"
+            )
+        self._pa = pa
+        self.schema = pa.schema(
+            [pa.field(c.name, self.get_arrow_type(c.ctype)) for c in columns]
+        )
+        self._writer = pq.ParquetWriter(str(file_name), self.schema)
+
+    def get_arrow_type(self, ctype: str) -> Any:
+        pa = self._pa
+        ctype = ctype.upper()
+        if ctype in ["SMALLINT", "SMALLSERIAL"]:
+            return pa.int16()
+        elif ctype in ["INT", "INTEGER", "SERIAL"]:
+            return pa.int32()
+        elif ctype in ["BIGINT", "BIGSERIAL"]:
+            return pa.int64()
+        elif ctype == "FLOAT":
+            return pa.float64()
+        elif ctype == "BOOLEAN":
+            return pa.bool_()
+        elif ctype == "DATE":
+            return pa.date32()
+        elif ctype == "TIME":
+            return pa.time64("us")
+        elif ctype.startswith("TIMESTAMP"):
+            return pa.timestamp("us")
+        elif ctype == "INTERVAL":
+            return pa.duration("us")
+        elif ctype == "BYTEA":
+            return pa.binary()
+        return pa.string()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        arrays = []
+        for i, field in enumerate(self.schema):
+            values = [row[i] for row in rows]
+            if field.type == self._pa.string():
+                values = [None if v is None else str(v) for v in values]
+            elif field.type == self._pa.binary():
+                values = [None if v is None else bytes(v) for v in values]
+            arrays.append(self._pa.array(values, type=field.type))
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def get_partition_name(column: str, value: Any, partition_format: Optional[str]) -> str:
+    """Name of the directory of the partition with the passed value"""
+    if value is None:
+        return f"{column}={NULL_PARTITION}"
+    if partition_format is not None and hasattr(value, "strftime"):
+        value = value.strftime(partition_format)
+    return "%s=%s" % (column, re.sub(r"[/\\]", "_", str(value)))
+
+
+def export(
+    db: DatabaseConnection,
+    table: TableSetting,
+    output: str,
+    output_format: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+    partition_by: Optional[str] = None,
+    partition_format: Optional[str] = None,
+    batch_size: int = 50000,
+) -> int:
+    if output_format is None:
+        if partition_by is not None:
+            raise click.BadParameter("Pass --format if --partition_by is used")
+        output_format = infer_format(output)
+    writer_class = CsvGzWriter if output_format == "csv" else ParquetWriter
+
+    table_columns = {c.name: c for c in table.columns}
+    if columns is None:
+        columns = list(table_columns.keys())
+    for column in columns + ([] if partition_by is None else [partition_by]):
+        if column not in table_columns:
+            raise click.BadParameter(
+                "Column %s is not defined in table %s" % (column, table.name)
+            )
+    exported_columns = [table_columns[c] for c in columns]
+
+    main_table = Table(table.name)
+    q = db.pypika_query.from_(main_table).select(*[main_table[c] for c in columns])
+    if partition_by is not None:
+        # Last selected column. Only written if it is also in columns
+        q = q.select(main_table[partition_by])
+    if where is not None:
+        q = q.where(SqlCriterion(where))
+    if partition_by is not None:
+        # Rows of a partition are consecutive, so only one file is open at a time
+        q = q.orderby(main_table[partition_by])
+
+    # Partition -> number of files written. A partition gets an additional file
+    # if its rows are not consecutive (e.g. partition_format w/o the year)
+    n_parts: Dict[str, int] = {}
+    current_partition: Optional[str] = None
+    current_writer: Optional[Any] = None
+
+    def _get_writer(partition: Optional[str]) -> Any:
+        nonlocal current_partition, current_writer
+        key = "" if partition is None else partition
+        if current_writer is not None and key == current_partition:
+            return current_writer
+        if current_writer is not None:
+            current_writer.close()
+            current_writer = None
+
+        part = n_parts.get(key, 0)
+        n_parts[key] = part + 1
+        if partition is None:
+            file_name = Path(output)
+        else:
+            file_name = (
+                Path(output) / partition / f"part-{part:03}.{writer_class.extension}"
+            )
+        file_name.parent.mkdir(parents=True, exist_ok=True)
+        logger.info("Writing file: %s", file_name)
+        current_partition = key
+        current_writer = writer_class(file_name, exported_columns)
+        return current_writer
+
+    n_rows = 0
+    start = time.perf_counter()
+    try:
+        for batch in db.query_stream(q, batch_size=batch_size, tables=[table]):
+            if partition_by is None:
+                _get_writer(None).write(batch)
+            else:
+                for name, rows in groupby(
+                    batch,
+                    key=lambda row: get_partition_name(
+                        partition_by, row[-1], partition_format
+                    ),
+                ):
+                    _get_writer(name).write([tuple(row[:-1]) for row in rows])
+            n_rows += len(batch)
+            logger.debug("Exported %s rows", n_rows)
+    except ProgrammingError as e:
+        logger.error("Got a sql ProgrammingError error. Details in debug log. Exiting")
+        logger.debug(e)
+        return 1
+    finally:
+        if current_writer is not None:
+            current_writer.close()
+
+    if n_rows == 0:
+        logger.warning("Query returned no data")
+    seconds = time.perf_counter() - start
+    logger.info(
+        "Exported %s rows to %s file(s) in %.1f s: %.0f rows/s",
+        n_rows,
+        sum(n_parts.values()),
+        seconds,
+        n_rows / seconds if seconds > 0 else 0.0,
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    cli()
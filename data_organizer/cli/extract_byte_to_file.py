@@ -1,17 +1,48 @@
+import hashlib
+import json
 import logging
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 import click
-from pypika import Table, Tables
+from pypika import CustomFunction, Table, Tables
+from pypika import functions as fn
+from pypika.terms import Criterion
+from pypika.terms import Tuple as RowValue
+from pypika.terms import ValueWrapper
 from sqlalchemy.exc import ProgrammingError
 
 from data_organizer.config import OrganizerConfig
-from data_organizer.db.connection import DatabaseConnection
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.model import TableSetting
+from data_organizer.db.query import SqlCriterion
 from data_organizer.utils import init_logging
 
 logger = logging.getLogger("ExtractByteCli")
 
+MANIFEST_NAME = ".extract-byte-manifest.json"
+
+
+def parse_shard(ctx, param, value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse the --shard option of the form i/N"""
+    if value is None:
+        return None
+    try:
+        shard, n_shards = (int(v) for v in value.split("/"))
+    except ValueError:
+        raise click.BadParameter("Expected format i/N (e.g. 0/4)")
+    if n_shards < 1 or not 0 <= shard < n_shards:
+        raise click.BadParameter("Shard i must satisfy 0 <= i < N")
+    return shard, n_shards
+
 
 @click.command()
 @click.argument("config_files", nargs=-1)
@@ -82,6 +113,82 @@ logger = logging.getLogger("ExtractByteCli")
     help="Comma separated list of columns selected from the joined table. Can be "
     "passed multiple time to join multiple tables.",
 )
+@click.option(
+    "--where",
+    default=None,
+    help='SQL condition added to the query (e.g. "tracks.year = 2022").',
+)
+@click.option(
+    "--limit",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Maximum number of rows that are extracted.",
+)
+@click.option(
+    "--shard",
+    default=None,
+    callback=parse_shard,
+    help="Only extract shard i of N (passed as i/N with 0 <= i < N). Rows are assigned "
+    "to the shards by --shard_column, so N processes can extract disjoint parts in "
+    "parallel. Use different --archive names for the shards.",
+)
+@click.option(
+    "--shard_column",
+    default=None,
+    help="Column of the main table used to assign rows to shards. Defaults to the "
+    "first column in --columns.",
+)
+@click.option(
+    "--shard_method",
+    default="hash",
+    show_default=True,
+    type=click.Choice(["hash", "modulo"]),
+    help="Assign rows by the hash of --shard_column or by its value modulo N "
+    "(integer columns).",
+)
+@click.option(
+    "--batch_size",
+    default=100,
+    show_default=True,
+    type=int,
+    help="Number of rows fetched from the database at a time. Only one batch is held "
+    "in memory.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only write new or changed files. Size and hash of written files are kept "
+    f"in a manifest ({MANIFEST_NAME}) in the output path.",
+)
+@click.option(
+    "--watermark_column",
+    default=None,
+    help="Column of the main table that increases for new or updated rows (e.g. an "
+    "update timestamp). With --incremental, rows are fetched ordered by this column "
+    "and --columns, and only rows after the last row of the last run are fetched "
+    "from the database.",
+)
+@click.option(
+    "--archive",
+    default=None,
+    help="Write all files into one archive in --path instead of single files. The "
+    "format is inferred from the extension: .tar, .tar.gz, .tar.xz, .tar.bz2, "
+    ".tar.zst (requires zstandard), or .zip",
+)
+@click.option(
+    "--max_archive_size",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Split the archive into parts of at most this size in MB. Parts are named "
+    "NAME_000.tar, NAME_001.tar, ...",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of threads writing the files.",
+)
 @click.option("--debug", is_flag=True, help="Enable debug logging.")
 @click.pass_context
 def cli(
@@ -99,6 +206,17 @@ def cli(
     join_tables: Tuple[str, ...],
     join_on: Tuple[str, ...],
     join_columns: Tuple[str, ...],
+    where: Optional[str],
+    limit: Optional[int],
+    shard: Optional[Tuple[int, int]],
+    shard_column: Optional[str],
+    shard_method: str,
+    batch_size: int,
+    incremental: bool,
+    watermark_column: Optional[str],
+    archive: Optional[str],
+    max_archive_size: Optional[int],
+    workers: int,
     debug: bool,
 ):
     """
@@ -142,6 +260,20 @@ def cli(
             join_tables=join_tables_,
             join_on=join_on_,
             join_columns=join_columns_,
+            where=where,
+            limit=limit,
+            shard=shard,
+            shard_column=shard_column,
+            shard_method=shard_method,
+            batch_size=batch_size,
+            workers=workers,
+            incremental=incremental,
+            watermark_column=watermark_column,
+            archive=archive,
+            max_archive_size=max_archive_size,
+            tables=[
+                t for t in config.tables.values() if t.name in [table] + join_tables_
+            ],
         )
 
     ctx.exit(code=status_code)
@@ -158,41 +290,506 @@ def extract(
     join_tables: List[str],
     join_on: List[str],
     join_columns: List[List[str]],
+    where: Optional[str] = None,
+    limit: Optional[int] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    shard_column: Optional[str] = None,
+    shard_method: str = "hash",
+    batch_size: int = 100,
+    workers: int = 1,
+    incremental: bool = False,
+    watermark_column: Optional[str] = None,
+    archive: Optional[str] = None,
+    max_archive_size: Optional[int] = None,
+    tables: Optional[Sequence[TableSetting]] = None,
 ) -> int:
+    """
+    Write the values of data_column to files. Compressed and deduplicated values
+    are decoded for the columns configured in tables.
+    """
     logger.info("Will select data from table **%s**", table)
     for jo, jt in zip(join_on, join_tables):
         logger.info("Joining **%s** on **%s**", jt, jo)
+    manifest: Optional[Manifest] = None
+    if incremental:
+        manifest_name = MANIFEST_NAME
+        if shard is not None:
+            # Each shard keeps track of its own files and watermark
+            manifest_name = manifest_name.replace(
+                ".json", "-%s-%s.json" % (shard[0], shard[1])
+            )
+        manifest = Manifest.load(Path(path) / manifest_name)
+    elif watermark_column is not None:
+        logger.warning("--watermark_column is only used with --incremental")
+        watermark_column = None
+
     # Build the query based on the passed options
+    main_table = Table(table)
     join_tables_: List[Table] = Tables(*join_tables)
-    q = db.pypika_query.from_(Table(table))
+    q = db.pypika_query.from_(main_table)
     for joc, jt in zip(join_on, join_tables_):
         q = q.join(jt).on_field(joc)
     q = q.select(*[data_column], *columns)
     for jc, jt in zip(join_columns, join_tables_):
         q = q.select(*[jt[c] for c in jc])  # type: ignore
+    # Rows are fetched in the order of (watermark, columns) and the position of the
+    # last row is saved. So rows sharing the watermark are not lost if --limit
+    # stops in between them
+    cursor_columns = []
+    if watermark_column is not None:
+        assert manifest is not None
+        cursor_columns = [main_table[watermark_column]]
+        cursor_columns += [main_table[c] for c in columns]
+        # Last selected column. Not part of the identifier
+        q = q.select(main_table[watermark_column])
+        if manifest.watermark is not None and manifest.watermark_key is None:
+            # Manifest w/o the key of the last row. Fetch all rows of the watermark
+            logger.info(
+                "Fetching rows with %s >= %s", watermark_column, manifest.watermark
+            )
+            q = q.where(cursor_columns[0] >= ValueWrapper(manifest.watermark))
+        elif manifest.watermark is not None:
+            assert manifest.watermark_key is not None
+            logger.info(
+                "Fetching rows after %s = %s, %s = %s",
+                watermark_column,
+                manifest.watermark,
+                columns,
+                manifest.watermark_key,
+            )
+            q = q.where(
+                RowValue(*cursor_columns)
+                > RowValue(
+                    *[
+                        ValueWrapper(v)
+                        for v in [manifest.watermark] + manifest.watermark_key
+                    ]
+                )
+            )
+    if where is not None:
+        q = q.where(SqlCriterion(where))
+    if shard is not None:
+        logger.info("Extracting shard %s of %s", shard[0], shard[1])
+        q = q.where(
+            get_shard_criterion(
+                db,
+                main_table[columns[0] if shard_column is None else shard_column],
+                shard[0],
+                shard[1],
+                shard_method,
+            )
+        )
+    if cursor_columns:
+        q = q.orderby(*cursor_columns)
+    if limit is not None:
+        q = q.limit(limit)
 
+    archive_writer: Optional[ArchiveWriter] = None
+    if archive is not None:
+        archive_writer = ArchiveWriter(
+            Path(path) / archive,
+            max_size=None if max_archive_size is None else max_archive_size * 10**6,
+        )
+        if workers > 1:
+            logger.warning("Archives are written by one worker")
+            workers = 1
+
+    # Watermark and key of the last fetched row
+    last_cursor: Optional[Tuple[Any, List[Any]]] = None
     try:
-        data = db.query(q)
+        with FileWriterPool(
+            workers,
+            # Unchanged files can only be skipped if they are written to the path
+            manifest=manifest if archive_writer is None else None,
+            sink=None if archive_writer is None else archive_writer.write,
+        ) as writer:
+            for batch in db.query_stream(q, batch_size=batch_size, tables=tables):
+                for res in batch:
+                    values = list(res)
+                    if watermark_column is not None:
+                        watermark = values.pop()
+                        if watermark is not None:
+                            last_cursor = (watermark, values[1 : 1 + len(columns)])
+                    identifier = "_".join([str(r) for r in values[1::]])
+                    file_name = f"{prefix}_{identifier}.{file_ext}"
+                    if archive_writer is None:
+                        file_name = f"{path}/{file_name}"
+                    writer.submit(file_name, values[0])
     except ProgrammingError as e:
         logger.error("Got a sql ProgrammingError error. Details in debug log. Exiting")
         logger.debug(e)
         return 1
+    finally:
+        if archive_writer is not None:
+            archive_writer.close()
+        if archive_writer is not None and archive_writer.parts:
+            logger.info(
+                "Wrote archive(s): %s", ", ".join(str(p) for p in archive_writer.parts)
+            )
 
-    for res in data:
-        data_value = res[0]
-        identifier = "_".join([str(r) for r in res[1::]])
-        outfile_name = f"{path}/{prefix}_{identifier}.{file_ext}"
-        logger.info("Writing file: %s", outfile_name)
-        try:
-            with open(outfile_name, "wb") as f:
-                f.write(bytes(data_value))
-        except Exception as e:
-            logger.error("Writing to file failed. Details in debug log. Exiting")
-            logger.debug(e)
-            return 1
+    summary = writer.summary
+    if summary.n_files == 0 and summary.n_skipped == 0 and not summary.errors:
+        logger.warning("Query returned no data")
+    logger.info(
+        "Wrote %s files (%.1f MB) in %.1f s: %.1f files/s, %.1f MB/s",
+        summary.n_files,
+        summary.n_bytes / 1e6,
+        summary.seconds,
+        summary.files_per_second,
+        summary.mb_per_second,
+    )
+    if manifest is not None:
+        logger.info("Skipped %s unchanged files", summary.n_skipped)
+        # Rows of failed files have to be fetched again in the next run
+        if last_cursor is not None and not summary.errors:
+            manifest.watermark = str(last_cursor[0])
+            manifest.watermark_key = [str(v) for v in last_cursor[1]]
+        manifest.save()
+    if summary.errors:
+        logger.error("Writing failed for %s files:", len(summary.errors))
+        for file_name, error in summary.errors:
+            logger.error("  %s: %s", file_name, error)
+        return 1
 
     return 0
 
 
+def get_shard_criterion(
+    db: DatabaseConnection, column: Any, shard: int, n_shards: int, method: str
+) -> Criterion:
+    """
+    Get the condition selecting the rows of a shard
+
+    Args:
+        db: Connection used for the query (defines the hash function)
+        column: Term of the column the shards are based on
+        shard: Index of the shard (0 <= shard < n_shards)
+        n_shards: Total number of shards
+        method: hash (hash of the column as text) or modulo (value of the
+                column modulo n_shards)
+
+    Returns: Criterion for the WHERE clause
+    """
+    mod = CustomFunction("MOD", ["value", "divisor"])
+    if method == "modulo":
+        value = column
+    elif db.backend == Backend.POSTGRES:
+        hashtext = CustomFunction("hashtext", ["value"])
+        value = fn.Cast(hashtext(fn.Cast(column, "text")), "bigint")
+    else:
+        crc32 = CustomFunction("CRC32", ["value"])
+        value = crc32(column)
+    # The hash can be negative. Make sure the result is in [0, n_shards)
+    return mod(mod(value, n_shards) + n_shards, n_shards) == shard
+
+
+class Manifest:
+    """
+    Size and sha256 of all files written by incremental runs and the watermark and
+    key (values of the identifier columns) of the last row of the last run. Stored
+    as json in the output path.
+    """
+
+    def __init__(
+        self,
+        file_name: Path,
+        files: Optional[Dict[str, Dict[str, Any]]] = None,
+        watermark: Optional[str] = None,
+        watermark_key: Optional[List[str]] = None,
+    ):
+        self.file_name = file_name
+        self.files: Dict[str, Dict[str, Any]] = {} if files is None else files
+        self.watermark = watermark
+        self.watermark_key = watermark_key
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, file_name: Path) -> "Manifest":
+        """Load the manifest. Returns an empty manifest if the file does not exist"""
+        if not file_name.is_file():
+            logger.info("No manifest found. Writing all files")
+            return cls(file_name)
+        with open(file_name, "r") as f:
+            data = json.load(f)
+        return cls(
+            file_name,
+            files=data["files"],
+            watermark=data["watermark"],
+            watermark_key=data.get("watermark_key"),
+        )
+
+    def save(self) -> None:
+        """Write the manifest (atomically replacing the existing one)"""
+        tmp_file_name = self.file_name.with_suffix(".tmp")
+        with open(tmp_file_name, "w") as f:
+            json.dump(
+                {
+                    "watermark": self.watermark,
+                    "watermark_key": self.watermark_key,
+                    "files": self.files,
+                },
+                f,
+                indent=1,
+            )
+        os.replace(tmp_file_name, self.file_name)
+
+    def is_unchanged(self, file_name: str, size: int, sha256: str) -> bool:
+        """Check if the file exists with the passed size and hash"""
+        with self._lock:
+            entry = self.files.get(Path(file_name).name)
+        return (
+            entry is not None
+            and entry["size"] == size
+            and entry["sha256"] == sha256
+            and Path(file_name).is_file()
+        )
+
+    def update(self, file_name: str, size: int, sha256: str) -> None:
+        with self._lock:
+            self.files[Path(file_name).name] = {"size": size, "sha256": sha256}
+
+
+@dataclass
+class WriteSummary:
+    """Summary of the files written by a FileWriterPool"""
+
+    n_files: int = 0
+    n_skipped: int = 0
+    n_bytes: int = 0
+    seconds: float = 0.0
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.n_files / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.n_bytes / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+
+class FileWriterPool:
+    """
+    Write files with a pool of threads. Files are passed to the threads via a
+    bounded queue, so submit blocks if the writers can not keep up with the
+    reader. Errors are collected in the summary instead of aborting. If a manifest
+    is passed, files that exist with the same content are not written again.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        queue_size: Optional[int] = None,
+        manifest: Optional[Manifest] = None,
+        sink: Optional[Callable[[str, Any], int]] = None,
+    ):
+        """
+        Args:
+            workers: Number of writer threads
+            queue_size: Maximum number of queued files. Defaults to 2 * workers
+            manifest: Optional manifest for skipping unchanged files
+            sink: Optional callable writing the data under the passed name and
+                  returning the number of written bytes. Defaults to writing to
+                  the file with the passed name
+        """
+        self.workers = workers
+        self.manifest = manifest
+        self.sink = write_file if sink is None else sink
+        self._queue: queue.Queue = queue.Queue(
+            maxsize=2 * workers if queue_size is None else queue_size
+        )
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._start = 0.0
+        self.summary = WriteSummary()
+
+    def __enter__(self) -> "FileWriterPool":
+        self._start = time.perf_counter()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="FileWriter"
+        )
+        for _ in range(self.workers):
+            self._executor.submit(self._work)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        for _ in range(self.workers):
+            self._queue.put(None)
+        assert self._executor is not None
+        self._executor.shutdown(wait=True)
+        self.summary.seconds = time.perf_counter() - self._start
+
+    def submit(self, file_name: str, data: Any) -> None:
+        """Queue data (bytes or memoryview) to be written to file_name"""
+        self._queue.put((file_name, data))
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            file_name, data = item
+            if self.manifest is not None:
+                size = memoryview(data).nbytes
+                sha256 = hashlib.sha256(data).hexdigest()
+                if self.manifest.is_unchanged(file_name, size, sha256):
+                    logger.debug("Skipping unchanged file: %s", file_name)
+                    with self._lock:
+                        self.summary.n_skipped += 1
+                    continue
+            logger.info("Writing file: %s", file_name)
+            try:
+                n_bytes = self.sink(file_name, data)
+            except Exception as e:
+                logger.debug(e)
+                with self._lock:
+                    self.summary.errors.append((file_name, str(e)))
+            else:
+                if self.manifest is not None:
+                    self.manifest.update(file_name, size, sha256)
+                with self._lock:
+                    self.summary.n_files += 1
+                    self.summary.n_bytes += n_bytes
+
+
+def write_file(file_name: str, data: Any) -> int:
+    """Write data (bytes or memoryview) to a file"""
+    with open(file_name, "wb") as f:
+        # Written directly from the buffer w/o copying the value
+        return f.write(data)
+
+
+class _BufferReader:
+    """File-like object reading from a buffer w/o copying it at once"""
+
+    def __init__(self, data: Any):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else self._pos + size
+        chunk = self._view[self._pos : end]
+        self._pos += len(chunk)
+        return bytes(chunk)
+
+
+class ArchiveWriter:
+    """
+    Stream files into tar (optionally compressed) or zip archives. Each file is
+    written into the archive as it arrives. If max_size is set, a new part is
+    started when adding a file would exceed the size of the current part (estimated
+    from the uncompressed size of the files).
+    """
+
+    tar_modes = {
+        ".tar": "w|",
+        ".tar.gz": "w|gz",
+        ".tgz": "w|gz",
+        ".tar.xz": "w|xz",
+        ".tar.bz2": "w|bz2",
+        ".tar.zst": "w|",
+    }
+
+    def __init__(self, file_name: Path, max_size: Optional[int] = None):
+        self.file_name = file_name
+        self.max_size = max_size
+        self.parts: List[Path] = []
+        self.suffix = next(
+            (
+                suffix
+                for suffix in list(self.tar_modes.keys()) + [".zip"]
+                if file_name.name.endswith(suffix)
+            ),
+            None,
+        )
+        if self.suffix is None:
+            raise click.BadParameter(
+                "Archive %s has an unsupported extension" % file_name.name
+            )
+        self._file: Optional[IO[bytes]] = None
+        self._compressor: Optional[IO[bytes]] = None
+        self._archive: Any = None
+        self._n_members = 0
+        self._part_size = 0
+
+    def _open_part(self) -> None:
+        if self.max_size is None:
+            part_name = self.file_name
+        else:
+            assert self.suffix is not None
+            stem = self.file_name.name[: -len(self.suffix)]
+            part_name = self.file_name.with_name(
+                f"{stem}_{len(self.parts):03d}{self.suffix}"
+            )
+        logger.info("Opening archive %s", part_name)
+        self.parts.append(part_name)
+        self._file = open(part_name, "wb")
+        self._n_members = 0
+        self._part_size = 0
+        if self.suffix == ".zip":
+            self._archive = zipfile.ZipFile(
+                self._file, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+            )
+            return
+        fileobj: IO[bytes] = self._file
+        if self.suffix == ".tar.zst":
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError(
+                    "Writing .tar.zst archives requires the zstandard package. "
+                    "Install data_organizer[zstd]"
+                )
+            self._compressor = zstandard.ZstdCompressor().stream_writer(
+                self._file, closefd=False
+            )
+            fileobj = self._compressor  # type: ignore
+        self._archive = tarfile.open(
+            fileobj=fileobj, mode=self.tar_modes[self.suffix]  # type: ignore
+        )
+
+    def _close_part(self) -> None:
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        if self._compressor is not None:
+            self._compressor.close()
+            self._compressor = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, name: str, data: Any) -> int:
+        """Add data (bytes or memoryview) as file with the passed name"""
+        size = memoryview(data).nbytes
+        # Size of the member in an uncompressed tar (header and padded data). The
+        # compressed parts are smaller
+        member_size = tarfile.BLOCKSIZE * (1 + -(-size // tarfile.BLOCKSIZE))
+        if (
+            self._file is not None
+            and self.max_size is not None
+            and self._n_members > 0
+            and self._part_size + member_size > self.max_size
+        ):
+            self._close_part()
+        if self._file is None:
+            self._open_part()
+        self._part_size += member_size
+
+        if self.suffix == ".zip":
+            self._archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            self._archive.addfile(info, fileobj=_BufferReader(data))
+        self._n_members += 1
+
+        return size
+
+    def close(self) -> None:
+        self._close_part()
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,356 @@
+import glob
+import logging
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
+
+import click
+
+from data_organizer.config import OrganizerConfig
+from data_organizer.data.populator import parse_column_value
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.exceptions import QueryReturnedNoData
+from data_organizer.db.model import TableSetting
+from data_organizer.utils import init_logging
+
+logger = logging.getLogger("ImportBytesCli")
+
+
+@click.command()
+@click.argument("config_files", nargs=-1)
+@click.option(
+    "--conf_base",
+    default="conf/",
+    show_default=True,
+    help="Base directory containing all config files. All other condif file paths will "
+    "be interpreted relative to this",
+)
+@click.option(
+    "--default_settings",
+    default="settings.toml",
+    show_default=True,
+    help="Main settings file defining e.g. DB options and table configuration. Pass "
+    "the file relative to --conf_base.",
+)
+@click.option(
+    "--secrets",
+    default=".secrets.toml",
+    show_default=True,
+    help="File containing the secrets (e.g. Database password).",
+)
+@click.option(
+    "--source",
+    required=True,
+    help="Directory (all files in it and its subdirectories are imported) or glob "
+    "pattern (e.g. 'tracks/**/*.gpx') of the files to import.",
+)
+@click.option(
+    "--table",
+    required=True,
+    help="Table (name in the config) the files are inserted into.",
+)
+@click.option(
+    "--data_column",
+    required=True,
+    help="Name of the column the file content is inserted into. Expecting byte column "
+    "type",
+)
+@click.option(
+    "--pattern",
+    default=None,
+    help="Regular expression with named groups matched against the file names. The "
+    "groups are inserted into the columns with the same name (e.g. "
+    "'track_(?P<id>\\d+)\\.gpx'). Files not matching the pattern are skipped. All "
+    "other columns need a default or must be nullable.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Skip files with keys (groups of --pattern) that already exist in the table. "
+    "Requires --pattern.",
+)
+@click.option(
+    "--batch_size",
+    default=100,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of files inserted with one statement (COPY for POSTGRES).",
+)
+@click.option(
+    "--workers",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of threads reading the files.",
+)
+@click.option("--debug", is_flag=True, help="Enable debug logging.")
+@click.pass_context
+def cli(
+    ctx,
+    config_files: Tuple[str, ...],
+    conf_base: str,
+    default_settings: str,
+    secrets: str,
+    source: str,
+    table: str,
+    data_column: str,
+    pattern: Optional[str],
+    resume: bool,
+    batch_size: int,
+    workers: int,
+    debug: bool,
+):
+    """
+    Utility that inserts the content of files into a byte column. Values for other
+    columns are derived from the file names. Pass additional one or more CONFIG_FILES
+    as first arguments.
+    """
+    init_logging("DEBUG" if debug else "INFO")
+
+    for passed_file in list(config_files) + [default_settings, secrets]:
+        if not Path(f"{conf_base}/{passed_file}").is_file():
+            raise RuntimeError("File %s does not exist" % passed_file)
+
+    config = OrganizerConfig(
+        config_dir_base=conf_base,
+        default_settings=default_settings,
+        secrets=secrets,
+        additional_configs=list(config_files),
+    )
+
+    if table not in config.tables:
+        raise click.BadParameter("Table %s is not defined in the config" % table)
+
+    conn_name = "DataOrganizerCli-ImportBytes"
+
+    with DatabaseConnection(**config.settings.db.to_dict(), name=conn_name) as db:
+        status_code = import_files(
+            db,
+            table=config.tables[table],
+            source=source,
+            data_column=data_column,
+            pattern=None if pattern is None else re.compile(pattern),
+            resume=resume,
+            batch_size=batch_size,
+            workers=workers,
+        )
+
+    ctx.exit(code=status_code)
+
+
+def collect_files(source: str) -> List[Path]:
+    """Get all files in a directory (recursively) or matching a glob pattern"""
+    if Path(source).is_dir():
+        files = [p for p in Path(source).rglob("*") if p.is_file()]
+    else:
+        files = [Path(p) for p in glob.glob(source, recursive=True)]
+        files = [p for p in files if p.is_file()]
+
+    return sorted(files)
+
+
+def get_row_template(
+    table: TableSetting, data_column: str, key_columns: List[str]
+) -> List[Any]:
+    """
+    Get the values of the columns that are neither the data column nor derived from
+    the file name (default or None).
+
+    Raises:
+        click.BadParameter if a column has no value
+    """
+    if table.disable_auto_insert_columns:
+        insert_columns = table.columns
+    else:
+        insert_columns = [c for c in table.columns if c.is_inserted]
+
+    template: List[Any] = []
+    for column in insert_columns:
+        if column.name == data_column or column.name in key_columns:
+            template.append(None)
+        elif column.default is not None:
+            template.append(column.typed_default)
+        elif column.is_nullable:
+            template.append(None)
+        else:
+            raise click.BadParameter(
+                "Column %s has no default, is not nullable and not set in --pattern"
+                % column.name
+            )
+
+    return template
+
+
+def get_existing_keys(
+    db: DatabaseConnection, table: TableSetting, key_columns: List[str]
+) -> Set[Tuple[str, ...]]:
+    """Get the keys (as strings) of all rows in the table"""
+    query = db.pypika_query.from_(table.name).select(*key_columns)
+    existing: Set[Tuple[str, ...]] = set()
+    try:
+        for batch in db.query_stream(query, batch_size=10000):
+            existing.update(tuple(str(v) for v in row) for row in batch)
+    except QueryReturnedNoData:
+        pass
+
+    return existing
+
+
+def read_file(file_name: Path, large_file_threshold: int) -> Any:
+    """
+    Read the file. Large files are passed as path so the database connection
+    streams them.
+    """
+    if file_name.stat().st_size > large_file_threshold:
+        return str(file_name)
+    return file_name.read_bytes()
+
+
+def import_files(
+    db: DatabaseConnection,
+    table: TableSetting,
+    source: str,
+    data_column: str,
+    pattern: Optional[Pattern] = None,
+    resume: bool = False,
+    batch_size: int = 100,
+    workers: int = 4,
+) -> int:
+    """
+    Insert the files in source into the data column of the table. Batches are
+    loaded with COPY for POSTGRES unless they contain files larger than
+    large_file_threshold, which are streamed with INSERT.
+
+    Returns: Status code (1 if a file could not be read or inserted)
+    """
+    if resume and pattern is None:
+        raise click.BadParameter("--resume requires --pattern")
+
+    files = collect_files(source)
+    logger.info("Found %s files in %s", len(files), source)
+
+    key_columns = [] if pattern is None else list(pattern.groupindex.keys())
+    column_names = [
+        c.name
+        for c in table.columns
+        if c.is_inserted or table.disable_auto_insert_columns
+    ]
+    for column in [data_column] + key_columns:
+        if column not in column_names:
+            raise click.BadParameter(
+                "Column %s is not inserted in table %s" % (column, table.name)
+            )
+    column_settings = {c.name: c for c in table.columns}
+    template = get_row_template(table, data_column, key_columns)
+    existing = get_existing_keys(db, table, key_columns) if resume else set()
+
+    # File name -> values for the key columns
+    keys: Dict[Path, Dict[str, Any]] = {}
+    n_skipped = 0
+    for file_name in files:
+        if pattern is not None:
+            match = pattern.fullmatch(file_name.name)
+            if match is None:
+                logger.warning("%s does not match the pattern. Skipping", file_name)
+                n_skipped += 1
+                continue
+            try:
+                values = {
+                    column: parse_column_value(column_settings[column], value)
+                    for column, value in match.groupdict().items()
+                }
+            except ValueError as e:
+                logger.warning("Invalid key in %s: %s. Skipping", file_name, e)
+                n_skipped += 1
+                continue
+            if tuple(str(v) for v in values.values()) in existing:
+                n_skipped += 1
+                continue
+            keys[file_name] = values
+        else:
+            keys[file_name] = {}
+    if resume:
+        logger.info("Skipping %s files", n_skipped)
+
+    to_import = list(keys.keys())
+    n_inserted = 0
+    n_bytes = 0
+    n_failed = 0
+    start = time.perf_counter()
+
+    def _insert(batch: List[Path], futures: List[Future]) -> None:
+        nonlocal n_inserted, n_bytes, n_failed
+        rows: List[List[Any]] = []
+        read_files: List[Path] = []
+        for file_name, future in zip(batch, futures):
+            try:
+                data = future.result()
+            except OSError as e:
+                logger.error("Could not read %s: %s", file_name, e)
+                n_failed += 1
+                continue
+            row = list(template)
+            for column, value in keys[file_name].items():
+                row[column_names.index(column)] = value
+            row[column_names.index(data_column)] = data
+            rows.append(row)
+            read_files.append(file_name)
+        if not rows:
+            return
+        # Large files (passed as path) can only be streamed with insert
+        use_copy = db.backend == Backend.POSTGRES and all(
+            isinstance(row[column_names.index(data_column)], bytes) for row in rows
+        )
+        success: bool
+        err: Optional[str]
+        if use_copy:
+            success, err = db.copy(table, rows)
+        else:
+            success, err = db.insert(table, rows)
+        if success:
+            n_inserted += len(read_files)
+            n_bytes += sum(f.stat().st_size for f in read_files)
+            logger.info("Inserted %s/%s files", n_inserted, len(to_import))
+        else:
+            n_failed += len(read_files)
+            logger.error(
+                "Inserting %s ... %s failed: %s",
+                read_files[0].name,
+                read_files[-1].name,
+                err,
+            )
+
+    # The files of the next batch are read while the current batch is inserted
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Optional[Tuple[List[Path], List[Future]]] = None
+        for i in range(0, len(to_import), batch_size):
+            batch = to_import[i : i + batch_size]
+            futures = [
+                executor.submit(read_file, f, db.large_file_threshold) for f in batch
+            ]
+            if pending is not None:
+                _insert(*pending)
+            pending = (batch, futures)
+        if pending is not None:
+            _insert(*pending)
+
+    seconds = time.perf_counter() - start
+    logger.info(
+        "Inserted %s files (%.1f MB) in %.1f s: %.1f files/s, %.1f MB/s",
+        n_inserted,
+        n_bytes / 1e6,
+        seconds,
+        n_inserted / seconds if seconds > 0 else 0.0,
+        n_bytes / 1e6 / seconds if seconds > 0 else 0.0,
+    )
+    if n_failed:
+        logger.error("%s files could not be inserted", n_failed)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,267 @@
+import csv
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+from sqlalchemy.exc import DBAPIError
+
+from data_organizer.config import OrganizerConfig
+from data_organizer.data.populator import (
+    coerce_value,
+    infer_format,
+    input_formats,
+    read_chunks,
+)
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.model import TableSetting
+from data_organizer.utils import init_logging
+
+logger = logging.getLogger("LoadTableCli")
+
+load_methods = ["copy", "insert"]
+
+
+@click.command()
+@click.argument("config_files", nargs=-1)
+@click.option(
+    "--conf_base",
+    default="conf/",
+    show_default=True,
+    help="Base directory containing all config files. All other condif file paths will "
+    "be interpreted relative to this",
+)
+@click.option(
+    "--default_settings",
+    default="settings.toml",
+    show_default=True,
+    help="Main settings file defining e.g. DB options and table configuration. Pass "
+    "the file relative to --conf_base.",
+)
+@click.option(
+    "--secrets",
+    default=".secrets.toml",
+    show_default=True,
+    help="File containing the secrets (e.g. Database password).",
+)
+@click.option(
+    "--input",
+    "input_file",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="File with the data. The columns in the file are matched to the columns "
+    "of the table by name.",
+)
+@click.option(
+    "--table",
+    required=True,
+    help="Table (name in the config) the data is loaded into.",
+)
+@click.option(
+    "--format",
+    "input_format",
+    type=click.Choice(input_formats),
+    default=None,
+    help="Format of the input. Inferred from the extension if not passed (.csv, "
+    ".jsonl, .ndjson, .parquet, optionally compressed for csv and jsonl). parquet "
+    "requires pyarrow.",
+)
+@click.option(
+    "--method",
+    type=click.Choice(load_methods),
+    default="copy",
+    show_default=True,
+    help="Load the data with COPY (POSTGRES only) or batched INSERT statements.",
+)
+@click.option(
+    "--chunk_size",
+    default=10000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of rows read and loaded at once.",
+)
+@click.option(
+    "--rejected",
+    default=None,
+    help="CSV file the rows that could not be loaded are written to together with "
+    "the error. Defaults to INPUT.rejected.csv",
+)
+@click.option("--debug", is_flag=True, help="Enable debug logging.")
+@click.pass_context
+def cli(
+    ctx,
+    config_files: Tuple[str, ...],
+    conf_base: str,
+    default_settings: str,
+    secrets: str,
+    input_file: str,
+    table: str,
+    input_format: Optional[str],
+    method: str,
+    chunk_size: int,
+    rejected: Optional[str],
+    debug: bool,
+):
+    """
+    Utility that loads data from a CSV, JSON Lines or Parquet file into a table
+    defined in the passed CONFIG_FILES. The values are validated against the column
+    types in the config.
+    """
+    init_logging("DEBUG" if debug else "INFO")
+
+    for passed_file in list(config_files) + [default_settings, secrets]:
+        if not Path(f"{conf_base}/{passed_file}").is_file():
+            raise RuntimeError("File %s does not exist" % passed_file)
+
+    config = OrganizerConfig(
+        config_dir_base=conf_base,
+        default_settings=default_settings,
+        secrets=secrets,
+        additional_configs=list(config_files),
+    )
+
+    if table not in config.tables:
+        raise click.BadParameter("Table %s is not defined in the config" % table)
+
+    conn_name = "DataOrganizerCli-LoadTable"
+
+    with DatabaseConnection(**config.settings.db.to_dict(), name=conn_name) as db:
+        n_rejected = load_file(
+            db,
+            table=config.tables[table],
+            input_file=input_file,
+            input_format=input_format,
+            method=method,
+            chunk_size=chunk_size,
+            rejected=rejected,
+        )
+
+    ctx.exit(code=0 if n_rejected == 0 else 1)
+
+
+def load_file(
+    db: DatabaseConnection,
+    table: TableSetting,
+    input_file: str,
+    input_format: Optional[str] = None,
+    method: str = "copy",
+    chunk_size: int = 10000,
+    rejected: Optional[str] = None,
+) -> int:
+    """
+    Load the data in the file into the table. If a chunk can not be loaded, the
+    rows are inserted one by one to find the rows that are rejected.
+
+    Returns: Number of rejected rows
+    """
+    if input_format is None:
+        try:
+            input_format = infer_format(input_file)
+        except ValueError as e:
+            raise click.BadParameter("%s. Pass it with --format" % e)
+    if rejected is None:
+        rejected = f"{input_file}.rejected.csv"
+    if method == "copy" and db.backend != Backend.POSTGRES:
+        logger.warning("COPY is only supported for POSTGRES. Using insert")
+        method = "insert"
+    load = db.copy if method == "copy" else db.insert
+
+    if table.disable_auto_insert_columns:
+        insert_columns = table.columns
+    else:
+        insert_columns = [c for c in table.columns if c.is_inserted]
+
+    n_loaded = 0
+    n_rejected = 0
+    rejected_writer: Optional[Any] = None
+    rejected_file = None
+    start = time.perf_counter()
+
+    def _reject(record: Dict[str, Any], error: str) -> None:
+        nonlocal n_rejected, rejected_writer, rejected_file
+        if rejected_writer is None:
+            rejected_file = open(rejected, "w", newline="")
+            # Columns of the input that are not in the table are not written
+            rejected_writer = csv.DictWriter(
+                rejected_file,
+                fieldnames=[c.name for c in table.columns] + ["error"],
+                extrasaction="ignore",
+            )
+            rejected_writer.writeheader()
+        rejected_writer.writerow({**record, "error": error})
+        n_rejected += 1
+
+    try:
+        for i_chunk, chunk in enumerate(
+            read_chunks(input_file, input_format, chunk_size)
+        ):
+            if i_chunk == 0:
+                unknown_columns = set(chunk.columns) - {c.name for c in table.columns}
+                if unknown_columns:
+                    logger.warning("Ignoring columns %s", sorted(unknown_columns))
+
+            records = chunk.to_dict(orient="records")
+            rows: List[List[Any]] = []
+            valid_records = []
+            for record in records:
+                try:
+                    rows.append(
+                        [coerce_value(c, record.get(c.name)) for c in insert_columns]
+                    )
+                    valid_records.append(record)
+                except ValueError as e:
+                    _reject(record, str(e))
+            if not rows:
+                continue
+
+            try:
+                success, _ = load(table, rows)
+            except DBAPIError as e:
+                # The transaction of the chunk is rolled back when its connection
+                # is closed. E.g. DataError for values too long for VARCHAR(n)
+                logger.debug("Chunk %s failed: %s", i_chunk, str(e.orig).strip())
+                success = False
+            if success:
+                n_loaded += len(rows)
+            else:
+                logger.warning(
+                    "Chunk %s could not be loaded. Inserting rows one by one", i_chunk
+                )
+                for record, row in zip(valid_records, rows):
+                    try:
+                        success, err = db.insert(table, [row])
+                    except DBAPIError as e:
+                        success, err = False, str(e.orig).strip()
+                    if success:
+                        n_loaded += 1
+                    else:
+                        _reject(record, str(err))
+
+            seconds = time.perf_counter() - start
+            logger.info(
+                "Loaded %s rows (%.0f rows/s). %s rows rejected",
+                n_loaded,
+                n_loaded / seconds if seconds > 0 else 0.0,
+                n_rejected,
+            )
+    finally:
+        if rejected_file is not None:
+            rejected_file.close()
+
+    seconds = time.perf_counter() - start
+    logger.info(
+        "Loaded %s rows into %s in %.1f s: %.0f rows/s",
+        n_loaded,
+        table.name,
+        seconds,
+        n_loaded / seconds if seconds > 0 else 0.0,
+    )
+    if n_rejected:
+        logger.error("%s rows were rejected. See %s", n_rejected, rejected)
+
+    return n_rejected
+
+
+if __name__ == "__main__":
+    cli()
@@ -3,10 +3,43 @@ from typing import Any, Dict, List, Optional
 
 from dynaconf import Dynaconf, LazySettings, ValidationError, Validator
 
-from data_organizer.db.model import TableSetting, get_table_setting_from_dict
+from data_organizer.db.compression import compression_codecs
+from data_organizer.db.model import (
+    IndexSetting,
+    TableSetting,
+    ViewSetting,
+    get_table_setting_from_dict,
+    table_options,
+)
 
 logger = logging.getLogger(__name__)
 
+index_options = ["name", "columns", "method", "is_unique", "where"]
+index_methods = ["btree", "hash", "gin", "gist", "spgist", "brin"]
+partition_options = [
+    "column",
+    "method",
+    "interval",
+    "premake",
+    "start",
+    "values",
+    "default_partition",
+]
+partition_intervals = ["day", "month", "year"]
+# RANGE partitions are created for date intervals (prefixes, e.g. TIMESTAMPTZ)
+partition_range_ctypes = ("DATE", "TIMESTAMP")
+retention_options = [
+    "column",
+    "keep_days",
+    "action",
+    "archive_table",
+    "archive_file",
+    "batch_size",
+    "throttle",
+]
+retention_actions = ["delete", "archive"]
+column_storages = ["PLAIN", "EXTERNAL", "EXTENDED", "MAIN"]
+
 
 class OrganizerConfig:
     def __init__(
@@ -34,7 +67,7 @@ class OrganizerConfig:
             for table in self.settings.tables:
                 table_dict = self.settings[table].to_dict()
                 for key in table_dict.keys():
-                    if isinstance(table_dict[key], dict):
+                    if isinstance(table_dict[key], dict) and key not in table_options:
                         if (
                             table_dict[key]["ctype"]
                             in self.settings.table_settings.auto_fill_ctypes
@@ -44,10 +77,26 @@ class OrganizerConfig:
 
         self.settings.update({"tables_as_settings": tables})
 
+        views: Dict[str, ViewSetting] = {}
+        if self.settings.views:
+            for view in self.settings.views:
+                view_dict = self.settings[view].to_dict()
+                # Source tables are defined by the config name of the table
+                view_dict["source_tables"] = [
+                    tables[table].name for table in view_dict.get("source_tables", [])
+                ]
+                views[view] = ViewSetting(**view_dict)
+
+        self.settings.update({"views_as_settings": views})
+
     @property
     def tables(self):
         return self.settings.tables_as_settings
 
+    @property
+    def views(self):
+        return self.settings.views_as_settings
+
 
 def get_settings(
     name: str = "DataOrganizer",
@@ -115,7 +164,9 @@ def validate_settings(settings: LazySettings) -> None:
         Validator("db.port", must_exist=True),
         Validator("db.prefix", must_exist=True),
         Validator("db.schema", default=None),
+        Validator("db.replicas", default=None, is_type_of=(list, type(None))),
         Validator("tables", default=None),
+        Validator("views", default=None),
     )
     settings.validators.validate()
 
@@ -123,6 +174,9 @@ def validate_settings(settings: LazySettings) -> None:
     if settings.tables:
         validate_table(settings)
 
+    if settings.views:
+        validate_views(settings)
+
 
 def validate_table(settings: LazySettings) -> None:
     """
@@ -143,13 +197,6 @@ def validate_table(settings: LazySettings) -> None:
         for key, cfg_type in settings.table_settings.key_types.items()
     }
 
-    top_level_table_options = [
-        "name",
-        "rel_table",
-        "rel_table_common_column",
-        "rel_table_common_column_as_foreign_key",
-    ]
-
     for table in settings.tables:
         table_settings = settings[table]
         # Check if table as a name
@@ -200,9 +247,16 @@ def validate_table(settings: LazySettings) -> None:
                     )
                 )
 
-        for key in [
-            key for key in table_settings.keys() if key not in top_level_table_options
-        ]:
+        if "indexes" in table_settings.keys():
+            validate_indexes(table, table_settings)
+
+        if "partition" in table_settings.keys():
+            validate_partition(table, table_settings)
+
+        if "retention" in table_settings.keys():
+            validate_retention(table, table_settings)
+
+        for key in [key for key in table_settings.keys() if key not in table_options]:
             # Check that the item for all other keys is a dict
             if not isinstance(table_settings[key], dict):
                 raise ValidationError(
@@ -231,6 +285,31 @@ def validate_table(settings: LazySettings) -> None:
                                 key_types[column_key],
                             )
                         )
+            if "compression" in table_settings[key].keys():
+                if table_settings[key]["compression"] not in compression_codecs:
+                    raise ValidationError(
+                        "Compression of column %s in table %s must be one of %s"
+                        % (key, table, compression_codecs)
+                    )
+                if table_settings[key].get("ctype") != "BYTEA":
+                    raise ValidationError(
+                        "Compression set for column %s in table %s but ctype is "
+                        "not BYTEA" % (key, table)
+                    )
+            if (
+                table_settings[key].get("deduplicate", False)
+                and table_settings[key].get("ctype") != "BYTEA"
+            ):
+                raise ValidationError(
+                    "deduplicate set for column %s in table %s but ctype is not BYTEA"
+                    % (key, table)
+                )
+            if "storage" in table_settings[key].keys():
+                if table_settings[key]["storage"].upper() not in column_storages:
+                    raise ValidationError(
+                        "Storage of column %s in table %s must be one of %s"
+                        % (key, table, column_storages)
+                    )
             # Check that all mandatory keys are set in each column
             if not all(
                 [
@@ -242,3 +321,215 @@ def validate_table(settings: LazySettings) -> None:
                     "Column %s in table %s is missing mandatory keys. %s are needed"
                     % (key, table, mandatory_columns)
                 )
+
+
+def validate_indexes(table: str, table_settings: Dict[str, Any]) -> None:
+    """
+    Validate the indexes option of a table
+
+    Args:
+        table: Name of the table in the config
+        table_settings: Settings of the table
+
+    Raises:
+        ValidationError if some criteria is not met
+    """
+    if not isinstance(table_settings["indexes"], list):
+        raise ValidationError("indexes in table %s must be a list" % table)
+
+    for index in table_settings["indexes"]:
+        if not isinstance(index, dict):
+            raise ValidationError("Elements of indexes in %s must be tables" % table)
+        for key in index.keys():
+            if key not in index_options:
+                raise ValidationError(
+                    "Index in table %s has invalid key %s" % (table, key)
+                )
+        if (
+            "columns" not in index.keys()
+            or not isinstance(index["columns"], list)
+            or not index["columns"]
+        ):
+            raise ValidationError(
+                "Indexes in table %s require a non-empty list of columns" % table
+            )
+        for column in index["columns"]:
+            if not isinstance(column, str):
+                raise ValidationError(
+                    "Index columns in table %s must be of type str" % table
+                )
+            if not IndexSetting.is_expression(column) and column not in [
+                key
+                for key, value in table_settings.items()
+                if isinstance(value, dict) and key not in table_options
+            ]:
+                raise ValidationError(
+                    "Index column **%s** is not defined in table **%s**"
+                    % (column, table)
+                )
+        method = index.get("method", "btree")
+        if method not in index_methods:
+            raise ValidationError(
+                "Index method %s in table %s not supported. Use one of %s"
+                % (method, table, index_methods)
+            )
+        if index.get("is_unique", False) and method != "btree":
+            raise ValidationError("Unique indexes require the btree method")
+        if method == "hash" and len(index["columns"]) > 1:
+            raise ValidationError("hash indexes only support a single column")
+
+
+def validate_partition(table: str, table_settings: Dict[str, Any]) -> None:
+    """
+    Validate the partition option of a table
+
+    Args:
+        table: Name of the table in the config
+        table_settings: Settings of the table
+
+    Raises:
+        ValidationError if some criteria is not met
+    """
+    partition = table_settings["partition"]
+    if not isinstance(partition, dict):
+        raise ValidationError("partition in table %s must be a table" % table)
+    for key in partition.keys():
+        if key not in partition_options:
+            raise ValidationError(
+                "Partition in table %s has invalid key %s" % (table, key)
+            )
+
+    columns = {
+        key: value
+        for key, value in table_settings.items()
+        if isinstance(value, dict) and key not in table_options
+    }
+    if "column" not in partition.keys() or partition["column"] not in columns:
+        raise ValidationError(
+            "Partition in table **%s** requires a column defined in the table" % table
+        )
+    # Postgres requires that primary keys and unique constraints contain the
+    # partition column
+    for flag in ["is_primary", "is_unique"]:
+        if any(c.get(flag, False) for c in columns.values()) and not columns[
+            partition["column"]
+        ].get(flag, False):
+            raise ValidationError(
+                "Partition column of table **%s** must be set %s because other "
+                "columns are" % (table, flag)
+            )
+
+    method = partition.get("method", "RANGE").upper()
+    if method == "RANGE":
+        ctype = str(columns[partition["column"]].get("ctype", ""))
+        if not ctype.upper().startswith(partition_range_ctypes):
+            raise ValidationError(
+                "RANGE partition column of table **%s** must be of type DATE or "
+                "TIMESTAMP. Got %s" % (table, ctype)
+            )
+        if partition.get("interval", "month") not in partition_intervals:
+            raise ValidationError(
+                "Partition interval in table %s must be one of %s"
+                % (table, partition_intervals)
+            )
+        if not isinstance(partition.get("premake", 0), int):
+            raise ValidationError("premake must be of type int")
+    elif method == "LIST":
+        if not isinstance(partition.get("values"), dict) or not partition["values"]:
+            raise ValidationError("LIST partition in table %s requires values" % table)
+        for values in partition["values"].values():
+            if not isinstance(values, list):
+                raise ValidationError(
+                    "Values of LIST partitions in table %s must be lists" % table
+                )
+    else:
+        raise ValidationError(
+            "Partition method in table %s must be RANGE or LIST" % table
+        )
+
+
+def validate_views(settings: LazySettings) -> None:
+    """
+    Validate the materialized views defined in the settings
+
+    Args:
+        setting: Initialized settings from dynaconf
+
+    Raises:
+        ValidationError if some criteria is not met
+    """
+    for view in settings.views:
+        if view not in settings:
+            raise ValidationError("View %s is not defined" % view)
+        view_settings = settings[view]
+        for key in ["name", "query", "unique_columns"]:
+            if key not in view_settings.keys():
+                raise ValidationError("%s not defined in view %s" % (key, view))
+        for key in view_settings.keys():
+            if key not in ["name", "query", "unique_columns", "source_tables"]:
+                raise ValidationError("View %s has invalid key %s" % (view, key))
+        # A unique index is required for refreshing concurrently
+        if (
+            not isinstance(view_settings["unique_columns"], list)
+            or not view_settings["unique_columns"]
+        ):
+            raise ValidationError(
+                "unique_columns in view %s must be a non-empty list" % view
+            )
+        for table in view_settings.get("source_tables", []):
+            if not settings.tables or table not in settings.tables:
+                raise ValidationError(
+                    "Source table **%s** of view **%s** is not defined in tables"
+                    % (table, view)
+                )
+
+
+def validate_retention(table: str, table_settings: Dict[str, Any]) -> None:
+    """
+    Validate the retention option of a table
+
+    Args:
+        table: Name of the table in the config
+        table_settings: Settings of the table
+
+    Raises:
+        ValidationError if some criteria is not met
+    """
+    retention = table_settings["retention"]
+    if not isinstance(retention, dict):
+        raise ValidationError("retention in table %s must be a table" % table)
+    for key in retention.keys():
+        if key not in retention_options:
+            raise ValidationError(
+                "Retention in table %s has invalid key %s" % (table, key)
+            )
+
+    columns = [
+        key
+        for key, value in table_settings.items()
+        if isinstance(value, dict) and key not in table_options
+    ]
+    if "column" not in retention.keys() or retention["column"] not in columns:
+        raise ValidationError(
+            "Retention in table **%s** requires a column defined in the table" % table
+        )
+    if not isinstance(retention.get("keep_days"), int) or retention["keep_days"] < 0:
+        raise ValidationError(
+            "keep_days in table %s must be a non-negative int" % table
+        )
+    action = retention.get("action", "delete")
+    if action not in retention_actions:
+        raise ValidationError(
+            "Retention action in table %s must be one of %s"
+            % (table, retention_actions)
+        )
+    n_targets = sum(key in retention for key in ["archive_table", "archive_file"])
+    if action == "archive" and n_targets != 1:
+        raise ValidationError(
+            "Retention action archive in table %s requires either archive_table or "
+            "archive_file" % table
+        )
+    if action == "delete" and n_targets > 0:
+        raise ValidationError(
+            "archive_table/archive_file set in table %s but action is delete" % table
+        )
@@ -1,15 +1,164 @@
 import logging
-from datetime import date, time
-from typing import Callable, Dict, List, Tuple, Union
+from datetime import date, datetime, time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
 import pandas as pd
 
 from data_organizer.config import OrganizerConfig
+from data_organizer.db.model import ColumnSetting
 
 logger = logging.getLogger(__name__)
 
 column_input_type = Union[None, str, float, int]
 
+# Formats of files with table data (see read_chunks)
+input_formats = ["csv", "jsonl", "parquet"]
+
+
+def parse_column_value(column: ColumnSetting, value: str) -> column_input_type:
+    """
+    Convert a string value (e.g. user input or a field in a csv file) to the value
+    inserted into the column. Empty strings, NULL, and NONE are converted to None
+    for nullable columns and empty strings to the default of the column.
+
+    Args:
+        column: ColumnSetting of the column
+        value: Value to convert
+
+    Returns: Converted value
+
+    Raises:
+        ValueError: If the value is not valid for the type of the column
+    """
+    if column.is_nullable and (
+        value == "" or value.upper() == "NULL" or value.upper() == "NONE"
+    ):
+        return None
+    elif column.default is not None and value == "":
+        return column.typed_default
+    elif column.ctype.upper() == "INT":
+        return int(value)
+    elif column.ctype.upper() == "FLOAT":
+        return float(value)
+
+    # For some types additional checks should be executed
+    value = str(value)
+    if column.ctype.upper() == "DATE":
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            raise ValueError("Use YYYY-MM-DD (iso format) for DATE columns")
+    elif column.ctype.upper() == "TIME":
+        if len(value) == 2:
+            raise ValueError("HH format not supported")
+        try:
+            time.fromisoformat(value)
+        except ValueError:
+            raise ValueError("Use HH:MM, or HH:MM:SS (iso format) for TIME columns")
+    elif column.ctype.upper() == "INTERVAL":
+        value = value.replace(" ", "")
+        elems = value.split(":")
+        if ":" not in value or not (len(elems) == 2 or len(elems) == 3):
+            raise ValueError("Only HH:MM:SS or HH:MM formats are supported")
+        for i, elem in enumerate(elems):
+            if elem == "":
+                raise ValueError("Element %s is empty" % i)
+            # Raise value error if element can not be converted to int
+            int_elem = int(elem)
+            if i != 0 and int_elem >= 60:
+                raise ValueError("Element %s must be < 59" % i)
+
+    return value
+
+
+def infer_format(file_name: str) -> str:
+    """
+    Get the input format from the extension of the file
+
+    Raises:
+        ValueError: If the extension does not belong to one of input_formats
+    """
+    suffixes = [s.lower() for s in Path(file_name).suffixes]
+    if suffixes and suffixes[-1] in [".gz", ".bz2", ".xz", ".zst", ".zip"]:
+        suffixes = suffixes[:-1]
+    if suffixes and suffixes[-1] == ".csv":
+        return "csv"
+    if suffixes and suffixes[-1] in [".jsonl", ".ndjson"]:
+        return "jsonl"
+    if suffixes and suffixes[-1] in [".parquet", ".pq"]:
+        return "parquet"
+
+    raise ValueError(
+        "Format of %s can not be inferred. Supported are %s"
+        % (file_name, input_formats)
+    )
+
+
+def read_chunks(
+    file_name: str, input_format: str, chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Read the file in chunks of chunk_size rows. csv files are read w/o type
+    conversion.
+    """
+    if input_format == "csv":
+        with pd.read_csv(
+            file_name, chunksize=chunk_size, dtype=str, keep_default_na=False
+        ) as reader:
+            yield from reader
+    elif input_format == "jsonl":
+        with pd.read_json(
+            file_name, lines=True, chunksize=chunk_size, dtype=False
+        ) as reader:
+            yield from reader
+    elif input_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Reading parquet files requires the pyarrow package. Install "
+                "data_organizer[parquet]"
+            )
+        for batch in pq.ParquetFile(file_name).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise NotImplementedError("Format %s is not supported" % input_format)
+
+
+def is_missing(value: Any) -> bool:
+    """Check if the value read from the input is missing (None, NaN, NaT)"""
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def coerce_value(column: ColumnSetting, value: Any) -> Union[column_input_type, bytes]:
+    """
+    Convert a value read from the input to the value inserted into the column.
+
+    Raises:
+        ValueError: If the value is not valid for the type of the column
+    """
+    if is_missing(value):
+        if not column.is_nullable and column.default is None:
+            raise ValueError("Column %s is not nullable" % column.name)
+        value = ""
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    elif column.ctype.upper() == "DATE" and isinstance(value, datetime):
+        value = value.date()
+    elif (
+        column.ctype.upper() == "INT"
+        and isinstance(value, float)
+        and value.is_integer()
+    ):
+        # Integer columns with missing values are read as float
+        value = int(value)
+
+    return parse_column_value(column, str(value))
+
 
 def get_table_data_from_user_input(
     config: OrganizerConfig,
@@ -24,7 +173,6 @@ def get_table_data_from_user_input(
     column_input: column_input_type
     for column in config.tables[table].columns:
         exit_input = False
-        add_err_info = None
         if column.ctype.upper() in config.settings.table_settings.auto_fill_ctypes:
             continue
         while not exit_input:
@@ -45,60 +193,14 @@ def get_table_data_from_user_input(
                         )
                     else:
                         column_input_prompt = prompt_func(prompt_text)
-                if column.is_nullable and (
-                    column_input_prompt == ""
-                    or column_input_prompt.upper() == "NULL"
-                    or column_input_prompt.upper() == "NONE"
-                ):
-                    column_input = None
-                elif column.default is not None and column_input_prompt == "":
-                    column_input = column.typed_default
-                elif column.ctype.upper() == "INT":
-                    column_input = int(column_input_prompt)
-                elif column.ctype.upper() == "FLOAT":
-                    column_input = float(column_input_prompt)
-                else:
-                    # For some types additional checks should be executed
-                    column_input = str(column_input_prompt)
-                    if column.ctype.upper() == "DATE":
-                        date.fromisoformat(column_input)
-                        add_err_info = "Use YYYY-MM-DD (iso format) for DATE columns"
-                    elif column.ctype.upper() == "TIME":
-                        time.fromisoformat(column_input)
-                        add_err_info = (
-                            "Use HH:MM, or HH:MM:SS (iso format) for TIME columns"
-                        )
-                        if len(column_input) == 2:
-                            raise ValueError("HH format not supported")
-                    elif column.ctype.upper() == "INTERVAL":
-                        add_err_info = "Only HH:MM:SS or HH:MM formats are supported "
-                        column_input = column_input.replace(" ", "")
-                        if ":" not in column_input:
-                            raise ValueError
-                        elems = column_input.split(":")
-                        if not (len(elems) == 2 or len(elems) == 3):
-                            raise ValueError
-                        for i, elem in enumerate(elems):
-                            # Raise value error if element can not be converted to int
-                            if elem == "":
-                                add_err_info = "Element %s is empty" % i
-                                raise ValueError
-
-                            int_elem = int(elem)
-                            if i != 0:
-                                if int_elem >= 60:
-                                    add_err_info = "Element %s must be < 59" % i
-                                    raise ValueError
-
-                    else:
-                        pass
+                column_input = parse_column_value(column, column_input_prompt)
                 columns.append(column.name)
                 values.append(column_input)
                 exit_input = True
             except ValueError as e:
                 logger.error("Invalid input for column with typ %s", column.ctype)
-                if add_err_info is not None:
-                    logger.error(add_err_info)
+                if str(e):
+                    logger.error(str(e))
                 if debug:
                     raise e
     logger.debug("Read VALUES %s", values)
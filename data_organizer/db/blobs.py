@@ -0,0 +1,31 @@
+import hashlib
+from typing import Any
+
+# Values of deduplicated columns are references to the blob table. A reference
+# consists of the magic bytes followed by the sha256 digest of the payload.
+REFERENCE_MAGIC = b"\x00DOR"
+REFERENCE_LENGTH = len(REFERENCE_MAGIC) + hashlib.sha256().digest_size
+
+
+def content_hash(data: bytes) -> bytes:
+    """Content address (sha256 digest) of the passed payload"""
+    return hashlib.sha256(data).digest()
+
+
+def make_reference(digest: bytes) -> bytes:
+    """Value stored in a deduplicated column for the payload with the digest"""
+    return REFERENCE_MAGIC + digest
+
+
+def is_blob_reference(value: Any) -> bool:
+    """Check if the passed value is a reference to the blob table"""
+    return (
+        isinstance(value, (bytes, bytearray, memoryview))
+        and len(value) == REFERENCE_LENGTH
+        and bytes(value[: len(REFERENCE_MAGIC)]) == REFERENCE_MAGIC
+    )
+
+
+def reference_hash(value: Any) -> bytes:
+    """Digest of the payload referenced by the passed value"""
+    return bytes(value[len(REFERENCE_MAGIC) :])
@@ -0,0 +1,101 @@
+import logging
+import lzma
+import zlib
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Compressed values start with the magic bytes followed by one byte identifying the
+# codec. Values w/o the header are returned unchanged on read.
+MAGIC = b"\x00DOC"
+HEADER_LENGTH = len(MAGIC) + 1
+
+codec_ids: Dict[str, int] = {"zlib": 1, "lzma": 2, "zstd": 3}
+compression_codecs = list(codec_ids.keys())
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression requires the zstandard package. Install "
+            "data_organizer[zstd]"
+        )
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd decompression requires the zstandard package. Install "
+            "data_organizer[zstd]"
+        )
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_compressors: Dict[str, Callable[[bytes], bytes]] = {
+    "zlib": zlib.compress,
+    "lzma": lzma.compress,
+    "zstd": _zstd_compress,
+}
+_decompressors: Dict[int, Callable[[bytes], bytes]] = {
+    codec_ids["zlib"]: zlib.decompress,
+    codec_ids["lzma"]: lzma.decompress,
+    codec_ids["zstd"]: _zstd_decompress,
+}
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    Compress the passed data and prepend the header identifying the codec
+
+    Args:
+        data: Raw data
+        codec: One of compression_codecs
+
+    Returns: Header and compressed data
+    """
+    if codec not in codec_ids:
+        raise NotImplementedError(
+            "Codec %s not supported. Use one of %s" % (codec, compression_codecs)
+        )
+    return MAGIC + bytes([codec_ids[codec]]) + _compressors[codec](bytes(data))
+
+
+def is_compressed(data: Any) -> bool:
+    """Check if the passed value starts with a valid compression header"""
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return False
+    header = bytes(data[:HEADER_LENGTH])
+    return (
+        len(header) == HEADER_LENGTH
+        and header[: len(MAGIC)] == MAGIC
+        and header[-1] in _decompressors
+    )
+
+
+def decompress(data: Any) -> Any:
+    """
+    Decompress the passed value if it starts with a compression header. All other
+    values are returned unchanged.
+    """
+    if not is_compressed(data):
+        return data
+    # Indexing a memoryview returns bytes (not int) for some buffer formats
+    codec_id = bytes(data[:HEADER_LENGTH])[-1]
+    return _decompressors[codec_id](bytes(data[HEADER_LENGTH:]))
+
+
+def decompress_rows(
+    rows: Sequence[Sequence[Any]], columns: Sequence[int]
+) -> List[Tuple[Any, ...]]:
+    """Decompress the values of the passed columns (indices) in the rows"""
+    if not columns:
+        return [tuple(row) for row in rows]
+    return [
+        tuple(decompress(v) if i in columns else v for i, v in enumerate(row))
+        for row in rows
+    ]
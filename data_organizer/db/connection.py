@@ -1,24 +1,70 @@
+import csv
+import gzip
+import io
 import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
 from enum import Enum, auto
+from graphlib import CycleError
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    overload,
+)
 
 import pandas as pd
 import psycopg2
-from pypika import Dialects, MySQLQuery, PostgreSQLQuery
+from pypika import CustomFunction, Dialects, MySQLQuery, PostgreSQLQuery
+from pypika.dialects import PostgreSQLQueryBuilder
 from pypika.queries import Column, CreateQueryBuilder, QueryBuilder, Schema, Table
-from sqlalchemy import create_engine, inspect, text
-from sqlalchemy.engine import Connection
-from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+from pypika.terms import Term, ValueWrapper
+from sqlalchemy import bindparam, create_engine, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, OperationalError
 from sqlalchemy.sql import ClauseElement
 
+from data_organizer.config import OrganizerConfig
+from data_organizer.db.blobs import (
+    content_hash,
+    is_blob_reference,
+    make_reference,
+    reference_hash,
+)
+from data_organizer.db.compression import (
+    compress,
+    decompress,
+    decompress_rows,
+)
 from data_organizer.db.exceptions import (
     BinaryDataException,
     InvalidDataException,
+    ProvisioningException,
     QueryReturnedNoData,
     TableNotExists,
 )
-from data_organizer.db.model import ColumnSetting, TableSetting
+from data_organizer.db.model import (
+    ColumnSetting,
+    IndexSetting,
+    TableSetting,
+    ViewSetting,
+    get_creation_order,
+    get_foreign_key_settings,
+)
+from data_organizer.db.script import StatementTiming, split_sql_statements
 
 logger = logging.getLogger(__name__)
 
@@ -32,9 +78,25 @@ class Backend(Enum):
         return Backend._member_names_
 
 
+@dataclass
+class PreparedStatementStats:
+    """Usage statistics of a prepared statement"""
+
+    prepares: int = 0
+    executions: int = 0
+    total_time: float = 0.0
+
+
 class DatabaseConnection:
     """Wrapper for the database connection"""
 
+    # Table holding the payloads of deduplicated BYTEA columns
+    blob_table = "data_organizer_blobs"
+    # Files for BYTEA columns larger than this (in bytes) are streamed to the
+    # database as large objects instead of being read into memory
+    large_file_threshold = 64 * 1024**2
+    stream_chunk_size = 8 * 1024**2
+
     def __init__(
         self,
         user: str,
@@ -46,8 +108,45 @@ class DatabaseConnection:
         verbose: bool = False,
         schema: str = None,
         name: str = "DataOrganizer",
+        replicas: Optional[List[Dict[str, Any]]] = None,
+        replica_retry_interval: float = 30.0,
     ):
-        url = f"{prefix}://{user}:{password}@{host}:{port}/{database}"
+        """
+        Args:
+            user: Database user
+            password: Password of the database user
+            database: Name of the database
+            host: Host of the (primary) database server
+            port: Port of the (primary) database server
+            prefix: SQLAlchemy dialect+driver prefix of the engine URL
+            verbose: Passed as echo to the engine
+            schema: Schema that is used as search_path. Created if it does not exist
+            name: Application name set on the connection
+            replicas: Optional list of read replicas. Each element is a dict that
+                      overwrites user, password, database, host, and/or port of the
+                      primary connection. Reads are distributed round-robin over
+                      all healthy replicas.
+            replica_retry_interval: Seconds a replica that failed (connecting
+                                    failed or the connection was lost during a
+                                    query) is skipped before it is tried again
+        """
+        # Arguments needed to rebuild the connection (e.g. in another process)
+        self._spec: Dict[str, Any] = dict(
+            user=user,
+            password=password,
+            database=database,
+            host=host,
+            port=port,
+            prefix=prefix,
+            verbose=verbose,
+            schema=schema,
+            name=name,
+            replicas=replicas,
+            replica_retry_interval=replica_retry_interval,
+        )
+        self._pid = os.getpid()
+
+        url = self._build_url(prefix, user, password, host, port, database)
         logger.debug(
             "Engine URL: %s",
             url.replace(":" + password + "@", ":" + len(password) * "?" + "@"),
@@ -73,9 +172,41 @@ class DatabaseConnection:
             if schema is not None:
                 connect_args.update({"options": f"-csearch_path={schema},public"})
 
-        self.engine = create_engine(
+        self._engine = create_engine(
             url, echo=verbose, connect_args=connect_args, future=True
         )
+
+        self.replica_engines: List[Engine] = []
+        for replica in replicas or []:
+            replica_password = str(replica.get("password", password))
+            replica_url = self._build_url(
+                prefix,
+                replica.get("user", user),
+                replica_password,
+                replica.get("host", host),
+                replica.get("port", port),
+                replica.get("database", database),
+            )
+            logger.debug(
+                "Replica engine URL: %s",
+                replica_url.replace(
+                    ":" + replica_password + "@",
+                    ":" + len(replica_password) * "?" + "@",
+                ),
+            )
+            self.replica_engines.append(
+                create_engine(
+                    replica_url,
+                    echo=verbose,
+                    connect_args=connect_args,
+                    future=True,
+                    pool_pre_ping=True,
+                )
+            )
+        self.replica_retry_interval = replica_retry_interval
+        self._next_replica = 0
+        # Replica index -> time.monotonic() of the last failed health check
+        self._unhealthy_replicas: Dict[int, float] = {}
         connection: Connection
         try:
             logger.debug("Opening test connection")
@@ -99,11 +230,155 @@ class DatabaseConnection:
                     connection.execute(text(f"CREATE SCHEMA {schema}"))
                 connection.commit()
         self.created_tables: List[str] = []
+        # Tables with successful inserts since the last refresh of dependent views
+        self.modified_tables: Set[str] = set()
+        self.prepared_statements: Dict[str, str] = {}
+        self.prepared_statement_stats: Dict[str, PreparedStatementStats] = {}
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> "DatabaseConnection":
+        """
+        Create a new connection from a connection spec (see connection_spec).
+
+        Args:
+            spec: Arguments of the DatabaseConnection init
+
+        Returns: New DatabaseConnection with its own engine(s)
+        """
+        return cls(**spec)
+
+    @property
+    def connection_spec(self) -> Dict[str, Any]:
+        """
+        Picklable arguments required to rebuild this connection. Attention: Contains
+        the password in plain text.
+        """
+        return dict(self._spec)
+
+    def for_worker(self) -> "DatabaseConnection":
+        """
+        Create a new connection with the same settings but a separate engine and
+        connection pool. Intended to be called in (forked) worker processes.
+        """
+        return self.from_spec(self.connection_spec)
+
+    def __reduce__(self):
+        # Engines and pooled sockets can not be shared between processes. A
+        # unpickled connection is rebuilt from the spec.
+        return (self.__class__.from_spec, (self.connection_spec,))
+
+    @property
+    def engine(self) -> Engine:
+        """Engine of the primary database. Fork-safe (see _check_fork)"""
+        self._check_fork()
+        return self._engine
+
+    def _check_fork(self) -> None:
+        """
+        Check if the process was forked since the engines were created (or last
+        checked). In this case the connections inherited from the parent process are
+        dropped without closing them, so the sockets of the parent are not affected.
+        New connections will be opened by the child process as needed.
+        """
+        pid = os.getpid()
+        if pid != self._pid:
+            logger.debug(
+                "Detected fork (pid %s -> %s). Disposing inherited connections",
+                self._pid,
+                pid,
+            )
+            self._engine.dispose(close=False)
+            for replica_engine in self.replica_engines:
+                replica_engine.dispose(close=False)
+            self._pid = pid
+
+    @staticmethod
+    def _build_url(
+        prefix: str, user: str, password: str, host: str, port: int, database: str
+    ) -> str:
+        return f"{prefix}://{user}:{password}@{host}:{port}/{database}"
 
     def close(self) -> None:
         """Close the connection"""
         logger.debug("Closing connection")
         self.engine.dispose()
+        for replica_engine in self.replica_engines:
+            replica_engine.dispose()
+
+    def _get_read_engine(self, use_primary: bool = False) -> Engine:
+        """
+        Get the engine that should be used for a read-only query. Replicas are
+        selected round-robin. Replicas marked as unhealthy are skipped for
+        replica_retry_interval seconds. Afterwards the next query is the probe
+        of the replica. If no healthy replica is available, the primary engine is
+        returned.
+
+        Args:
+            use_primary: Force the primary engine (e.g. for read-after-write
+                         consistency)
+
+        Returns: Engine for the read query
+        """
+        self._check_fork()
+        if use_primary or not self.replica_engines:
+            return self.engine
+
+        n_replicas = len(self.replica_engines)
+        for _ in range(n_replicas):
+            idx = self._next_replica
+            self._next_replica = (self._next_replica + 1) % n_replicas
+
+            failed_at = self._unhealthy_replicas.get(idx)
+            if (
+                failed_at is not None
+                and time.monotonic() - failed_at < self.replica_retry_interval
+            ):
+                continue
+
+            return self.replica_engines[idx]
+
+        logger.warning("No healthy replica available. Reading from primary")
+        return self.engine
+
+    def _mark_replica_unhealthy(self, engine: Engine, error: Exception) -> None:
+        idx = self.replica_engines.index(engine)
+        logger.warning(
+            "Replica %s failed. Skipping it for %s s", idx, self.replica_retry_interval
+        )
+        logger.debug(error)
+        self._unhealthy_replicas[idx] = time.monotonic()
+
+    @contextmanager
+    def _read_connection(self, use_primary: bool = False) -> Iterator[Connection]:
+        """
+        Connection for a read-only query (see _get_read_engine). If a replica can
+        not be connected to, the next replica (or the primary) is used. A replica
+        is marked as unhealthy if connecting fails or the connection is lost
+        during the query (connection_invalidated). Errors of the query are raised
+        without marking the replica.
+        """
+        while True:
+            engine = self._get_read_engine(use_primary)
+            try:
+                connection = engine.connect()
+            except DBAPIError as e:
+                if engine is self.engine:
+                    raise
+                self._mark_replica_unhealthy(engine, e)
+                continue
+            break
+
+        with connection:
+            try:
+                yield connection
+            except DBAPIError as e:
+                # Errors of the query (e.g. a missing table) are not a problem of
+                # the replica
+                if engine is not self.engine and e.connection_invalidated:
+                    self._mark_replica_unhealthy(engine, e)
+                raise
+        if engine is not self.engine:
+            self._unhealthy_replicas.pop(self.replica_engines.index(engine), None)
 
     def __enter__(self):
         return self
@@ -153,6 +428,113 @@ class DatabaseConnection:
 
         return ret
 
+    def exec_script(
+        self, script: Union[str, Path], batch_size: int = 100
+    ) -> Tuple[bool, List[StatementTiming]]:
+        """
+        Execute a SQL script with multiple statements on one connection in one
+        transaction. Changes are only committed if all statements succeed. Script
+        files are read line by line.
+
+        Args:
+            script: Path to a SQL file or SQL string with one or more statements
+                    separated by semicolons
+            batch_size: Number of statements that are sent to the server in one
+                        round trip. Timings are reported per batch, so pass 1 to
+                        time each statement. For MYSQL the statements are always
+                        sent one by one
+
+        Returns: Boolean flag denoting success of the script and the timings of
+                 all executed batches
+        """
+        timings: List[StatementTiming] = []
+        with self.engine.connect() as connection:
+            if self._is_script_file(script):
+                logger.info("Executing script %s", script)
+                with open(script, "r") as f:
+                    success = self._exec_statements(
+                        connection, split_sql_statements(f), batch_size, timings
+                    )
+            else:
+                success = self._exec_statements(
+                    connection,
+                    split_sql_statements(str(script).splitlines(keepends=True)),
+                    batch_size,
+                    timings,
+                )
+            if success:
+                connection.commit()
+            else:
+                connection.rollback()
+
+        logger.info(
+            "Executed %s statements in %.3f s",
+            sum(t.n_statements for t in timings),
+            sum(t.seconds for t in timings),
+        )
+        return success, timings
+
+    @staticmethod
+    def _is_script_file(script: Union[str, Path]) -> bool:
+        if isinstance(script, Path):
+            return True
+        if "\n" in script or ";" in script:
+            return False
+        try:
+            return Path(script).is_file()
+        except OSError:
+            return False
+
+    @staticmethod
+    def _exec_statements(
+        connection: Connection,
+        statements: Iterable[str],
+        batch_size: int,
+        timings: List[StatementTiming],
+    ) -> bool:
+        """
+        Execute the statements in batches of batch_size. Only one batch is held in
+        memory at a time. Returns False on the first error. The MYSQL driver does not accept multiple
+        statements in one execute, so they are executed one by one.
+        """
+        if connection.dialect.name == "mysql":
+            batch_size = 1
+
+        def _exec_batch(batch: List[str]) -> bool:
+            sql = ";\n".join(batch)
+            start = time.perf_counter()
+            try:
+                connection.exec_driver_sql(
+                    sql, execution_options={"no_parameters": True}
+                )
+            except DBAPIError as e:
+                logger.error(
+                    "Script failed in statement: %s", sql.replace("\n", " ")[:200]
+                )
+                logger.error("%s", str(e.orig).strip())
+                return False
+            timing = StatementTiming(sql, len(batch), time.perf_counter() - start)
+            logger.debug(
+                "%.4f s for %s statement(s): %s",
+                timing.seconds,
+                timing.n_statements,
+                sql.replace("\n", " ")[:100],
+            )
+            timings.append(timing)
+            return True
+
+        batch: List[str] = []
+        for statement in statements:
+            batch.append(statement)
+            if len(batch) >= batch_size:
+                if not _exec_batch(batch):
+                    return False
+                batch = []
+        if batch:
+            return _exec_batch(batch)
+
+        return True
+
     def query_to_df(
         self,
         sql: Union[
@@ -160,12 +542,21 @@ class DatabaseConnection:
             ClauseElement,
             QueryBuilder,
         ],
+        use_primary: bool = False,
+        schema: Optional[str] = None,
+        tables: Optional[Sequence[TableSetting]] = None,
     ) -> pd.DataFrame:
         """
         Function wrapping a SQL query using the engine
 
         Args:
           sql : Valid SQL query
+          use_primary: Run the query on the primary even if replicas are set
+          schema: Schema of the blob table with deduplicated values. Explicitly
+                  pass a schema if it is not defined in the db
+          tables: Settings of the queried tables. Result columns with the name of a
+                  deduplicated column are resolved and result columns with the name
+                  of a compressed column are decompressed
         """
         sql = self._convert_to_sqla_clause(sql)
 
@@ -174,11 +565,29 @@ class DatabaseConnection:
         except AttributeError:
             pass
 
-        with self.engine.connect() as connection:
+        with self._read_connection(use_primary) as connection:
             data: pd.DataFrame = pd.read_sql_query(sql, connection)
 
-        if data.empty:
-            raise QueryReturnedNoData
+            if data.empty:
+                raise QueryReturnedNoData
+
+            for i in self._get_deduplicated_columns(list(data.columns), tables):
+                column_data = data.iloc[:, i]
+                if column_data.map(is_blob_reference).any():
+                    payloads = self._fetch_blobs(
+                        connection,
+                        {
+                            reference_hash(v)
+                            for v in column_data
+                            if is_blob_reference(v)
+                        },
+                        schema,
+                    )
+                    data.iloc[:, i] = column_data.map(
+                        lambda v: self._resolve_blob_reference(v, payloads)
+                    )
+            for i in self._get_compressed_columns(list(data.columns), tables):
+                data.iloc[:, i] = data.iloc[:, i].map(decompress)
 
         return data
 
@@ -189,12 +598,21 @@ class DatabaseConnection:
             ClauseElement,
             QueryBuilder,
         ],
+        use_primary: bool = False,
+        schema: Optional[str] = None,
+        tables: Optional[Sequence[TableSetting]] = None,
     ) -> Tuple[List[Tuple[Any, ...]], List[str]]:
         """
         Execute the passed query.
 
         Args:
             query: Valid SQL queries as str or pypika.QueryBuilder
+            use_primary: Run the query on the primary even if replicas are set
+            schema: Schema of the blob table with deduplicated values. Explicitly
+                    pass a schema if it is not defined in the db
+            tables: Settings of the queried tables. Result columns with the name of
+                    a deduplicated column are resolved and result columns with the
+                    name of a compressed column are decompressed
 
         Returns: List of results and list of column names
         """
@@ -205,25 +623,171 @@ class DatabaseConnection:
         except AttributeError:
             pass
 
-        with self.engine.connect() as connection:
+        with self._read_connection(use_primary) as connection:
             data = connection.execute(query)
+            ret_data = self._postprocess_rows(
+                connection, list(data), list(data.keys()), tables, schema
+            )
             connection.commit()
-        ret_data = [tuple(d) for d in list(data)]
         if not ret_data:
             raise QueryReturnedNoData
 
         return ret_data, data.keys()
 
-    def query(self, query: Union[str, QueryBuilder]) -> List[Tuple[Any, ...]]:
+    def query_stream(
+        self,
+        query: Union[
+            str,
+            ClauseElement,
+            QueryBuilder,
+        ],
+        batch_size: int = 1000,
+        use_primary: bool = False,
+        schema: Optional[str] = None,
+        tables: Optional[Sequence[TableSetting]] = None,
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        Execute the passed query with a server-side cursor and return the results
+        in batches. Only one batch is held in memory at a time. BYTEA values are
+        returned as memoryview of the driver buffer (unless they are decompressed or
+        resolved).
+
+        Args:
+            query: Valid SQL queries as str or pypika.QueryBuilder
+            batch_size: Number of rows fetched from the server per batch
+            use_primary: Run the query on the primary even if replicas are set
+            schema: Schema of the blob table with deduplicated values. Explicitly
+                    pass a schema if it is not defined in the db
+            tables: Settings of the queried tables. Result columns with the name of
+                    a deduplicated column are resolved and result columns with the
+                    name of a compressed column are decompressed
+
+        Returns: Generator yielding lists of results
+        """
+        query = self._convert_to_sqla_clause(query)
+
+        try:
+            logger.debug("Query: %s", query.text.replace("\n", " "))
+        except AttributeError:
+            pass
+
+        with self._read_connection(use_primary) as connection:
+            result = connection.execution_options(
+                stream_results=True, max_row_buffer=batch_size
+            ).execute(query)
+            keys = list(result.keys())
+            for batch in result.partitions(batch_size):
+                yield self._postprocess_rows(connection, batch, keys, tables, schema)
+            connection.commit()
+
+    def _postprocess_rows(
+        self,
+        connection: Connection,
+        rows: List[Any],
+        keys: Sequence[str],
+        tables: Optional[Sequence[TableSetting]] = None,
+        schema: Optional[str] = None,
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Resolve references to the blob table (one query for all references in
+        the rows) and decompress the values. Only result columns named like a
+        deduplicated or compressed column in tables are processed.
+        """
+        deduplicated = self._get_deduplicated_columns(keys, tables)
+        hashes = {
+            reference_hash(row[i])
+            for row in rows
+            for i in deduplicated
+            if is_blob_reference(row[i])
+        }
+        if hashes:
+            payloads = self._fetch_blobs(connection, hashes, schema)
+            rows = [
+                tuple(
+                    self._resolve_blob_reference(value, payloads)
+                    if i in deduplicated
+                    else value
+                    for i, value in enumerate(row)
+                )
+                for row in rows
+            ]
+
+        return decompress_rows(rows, self._get_compressed_columns(keys, tables))
+
+    @staticmethod
+    def _get_compressed_columns(
+        keys: Sequence[str], tables: Optional[Sequence[TableSetting]]
+    ) -> List[int]:
+        """Indices of the result columns that are compressed in one of the tables"""
+        names = {
+            c.name
+            for table in tables or []
+            for c in table.columns
+            if c.compression is not None
+        }
+        return [i for i, key in enumerate(keys) if key in names]
+
+    @staticmethod
+    def _get_deduplicated_columns(
+        keys: Sequence[str], tables: Optional[Sequence[TableSetting]]
+    ) -> List[int]:
+        """Indices of the result columns that are deduplicated in one of the tables"""
+        names = {
+            c.name for table in tables or [] for c in table.columns if c.deduplicate
+        }
+        return [i for i, key in enumerate(keys) if key in names]
+
+    def _fetch_blobs(
+        self, connection: Connection, hashes: Set[bytes], schema: Optional[str] = None
+    ) -> Dict[bytes, bytes]:
+        """
+        Get the payloads with the passed hashes from the blob table. Payloads of
+        compressed columns are returned compressed.
+        """
+        blob_table = self._get_table(self.blob_table, schema).get_sql(quote_char='"')
+        result = connection.execute(
+            text(
+                f'SELECT "hash", "data" FROM {blob_table} WHERE "hash" IN :hashes'
+            ).bindparams(bindparam("hashes", expanding=True)),
+            {"hashes": list(hashes)},
+        )
+        return {bytes(h): bytes(data) for h, data in result}
+
+    @staticmethod
+    def _resolve_blob_reference(value: Any, payloads: Dict[bytes, bytes]) -> Any:
+        """Replace a reference to the blob table by the payload"""
+        if not is_blob_reference(value):
+            return value
+        digest = reference_hash(value)
+        if digest not in payloads:
+            logger.error("Referenced blob %s does not exist", digest.hex())
+            return value
+        return payloads[digest]
+
+    def query(
+        self,
+        query: Union[str, QueryBuilder],
+        use_primary: bool = False,
+        schema: Optional[str] = None,
+        tables: Optional[Sequence[TableSetting]] = None,
+    ) -> List[Tuple[Any, ...]]:
         """
         Execute the passed query.
 
         Args:
             query: Valid SQL queries as str or pypika.QueryBuilder
+            use_primary: Run the query on the primary even if replicas are set
+            schema: Schema of the blob table with deduplicated values. Explicitly
+                    pass a schema if it is not defined in the db
+            tables: Settings of the queried tables. Result columns with the name of
+                    a deduplicated column are resolved and result columns with the
+                    name of a compressed column are decompressed
 
         Returns: List of results
         """
-        data, _ = self.query_inc_keys(query)
+        data, _ = self.query_inc_keys(
+            query, use_primary=use_primary, schema=schema, tables=tables
+        )
         return data
 
     def insert_df(
@@ -264,12 +828,39 @@ class DatabaseConnection:
 
         return data_inserted, err_str
 
+    @overload
     def insert(
         self,
         table: TableSetting,
         datas: List[List[Any]],
-        schema: Optional[str] = None,
+        schema: Optional[str] = ...,
+        *,
+        returning: None = ...,
     ) -> Tuple[bool, Optional[str]]:
+        ...
+
+    @overload
+    def insert(
+        self,
+        table: TableSetting,
+        datas: List[List[Any]],
+        schema: Optional[str] = ...,
+        *,
+        returning: List[str],
+    ) -> Tuple[bool, Optional[str], List[Tuple[Any, ...]]]:
+        ...
+
+    def insert(
+        self,
+        table: TableSetting,
+        datas: List[List[Any]],
+        schema: Optional[str] = None,
+        *,
+        returning: Optional[List[str]] = None,
+    ) -> Union[
+        Tuple[bool, Optional[str]],
+        Tuple[bool, Optional[str], List[Tuple[Any, ...]]],
+    ]:
         """
         Main insert method that includes validation and processing steps against the
         passed TableSettings objects.
@@ -278,18 +869,376 @@ class DatabaseConnection:
             table: TableSetting object defining the table data is inserted into
             datas: Data to be inserted
             schema: Explicitly pass a schema if it is not defined in the db
+            returning: Columns of the inserted rows (e.g. SERIAL values) that are
+                       returned. For MYSQL only the SERIAL (AUTO_INCREMENT) column
+                       is supported. The rows are inserted one by one to get the
+                       lastrowid of each row
 
         Returns: Boolean flag denoting success of the insertion and Optional string
-                 specifying the error
+                 specifying the error. If returning is passed, additionally the
+                 returned values per inserted row
+        """
+        if returning is not None and self.backend == Backend.MYSQL:
+            serial_columns = [
+                c.name for c in table.columns if c.ctype.upper() == "SERIAL"
+            ]
+            if returning != serial_columns[:1]:
+                raise NotImplementedError(
+                    "Only the SERIAL (AUTO_INCREMENT) column can be returned for "
+                    "MYSQL. Got %s for table %s" % (returning, table.name)
+                )
+        large_objects: List[int] = []
+        if self.backend == Backend.POSTGRES:
+            datas, large_objects = self._import_large_files(table, datas)
+        try:
+            blobs: Dict[bytes, bytes] = {}
+            if any(c.deduplicate for c in table.columns):
+                datas, blobs = self._deduplicate_payloads(table, datas)
+            processed_data = self._preprocess_data_for_insert(table, datas)
+
+            if table.disable_auto_insert_columns:
+                inserted_columns = [c.name for c in table.columns]
+            else:
+                inserted_columns = [c.name for c in table.columns if c.is_inserted]
+
+            data_inserted, err_str, returned = self._insert_returning(
+                table.name,
+                inserted_columns,
+                processed_data,
+                schema=schema,
+                returning=returning,
+                blobs=blobs,
+            )
+        finally:
+            # The data was copied into the table (or the insert failed)
+            self._unlink_large_objects(large_objects)
+
+        if returning is None:
+            return data_inserted, err_str
+        return data_inserted, err_str, returned
+
+    def insert_with_relative(
+        self,
+        table: TableSetting,
+        data: List[Any],
+        rel_table: TableSetting,
+        rel_datas: List[List[Any]],
+        common_column: str,
+        schema: Optional[str] = None,
+    ) -> Tuple[bool, Optional[str], Any]:
+        """
+        Insert a row into the main table and the rows of its relative table in one
+        transaction. The rows of the relative table get the value of the common
+        column of the inserted main row (e.g. a SERIAL value). For POSTGRES both
+        inserts are sent in one statement using a data-modifying CTE.
+
+        Args:
+            table: TableSetting of the main table
+            data: Row inserted into the main table
+            rel_table: TableSetting of the relative table
+            rel_datas: Rows inserted into the relative table. The value of the
+                       common column is replaced
+            common_column: Column in both tables that relates the rows
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: Boolean flag denoting success of the insertion, Optional string
+                 specifying the error, and the value of the common column
         """
+        if rel_table.disable_auto_insert_columns:
+            rel_columns = [c.name for c in rel_table.columns]
+        else:
+            rel_columns = [c.name for c in rel_table.columns if c.is_inserted]
+        if common_column not in rel_columns:
+            raise InvalidDataException(
+                "Column %s is not inserted into %s" % (common_column, rel_table.name)
+            )
+        if table.disable_auto_insert_columns:
+            main_columns = [c.name for c in table.columns]
+        else:
+            main_columns = [c.name for c in table.columns if c.is_inserted]
+
+        datas = [data]
+        blobs: Dict[bytes, bytes] = {}
+        if any(c.deduplicate for c in table.columns):
+            datas, blobs = self._deduplicate_payloads(table, datas)
+        if any(c.deduplicate for c in rel_table.columns):
+            rel_datas, rel_blobs = self._deduplicate_payloads(rel_table, rel_datas)
+            blobs.update(rel_blobs)
         processed_data = self._preprocess_data_for_insert(table, datas)
+        processed_rel_data = self._preprocess_data_for_insert(rel_table, rel_datas)
+
+        common_index = rel_columns.index(common_column)
+        data_inserted = True
+        err_str = None
+        common_value = None
+        with self.engine.connect() as connection:
+            try:
+                self._upload_blobs(connection, blobs, schema=schema)
+                if self.backend == Backend.POSTGRES:
+                    common_value = self._insert_with_relative_cte(
+                        connection,
+                        (table.name, main_columns, processed_data[0]),
+                        (rel_table.name, rel_columns, processed_rel_data),
+                        common_column,
+                        schema,
+                    )
+                else:
+                    result = connection.execute(
+                        text(
+                            self._get_insert_statement(
+                                table.name, main_columns, processed_data, schema
+                            )
+                        )
+                    )
+                    if common_column in main_columns:
+                        common_value = data[main_columns.index(common_column)]
+                    else:
+                        common_value = result.lastrowid
+                    for rel_data in processed_rel_data:
+                        rel_data[common_index] = common_value
+                    if processed_rel_data:
+                        connection.execute(
+                            text(
+                                self._get_insert_statement(
+                                    rel_table.name,
+                                    rel_columns,
+                                    processed_rel_data,
+                                    schema,
+                                )
+                            )
+                        )
+            except IntegrityError as e:
+                logger.error("Data could not be inserted: %s", str(e))
+                data_inserted = False
+                err_str = str(e)
+                common_value = None
+                connection.rollback()
+            else:
+                connection.commit()
+
+        if data_inserted:
+            self.modified_tables.update([table.name, rel_table.name])
+
+        return data_inserted, err_str, common_value
+
+    def _insert_with_relative_cte(
+        self,
+        connection: Connection,
+        main: Tuple[str, List[str], List[Any]],
+        rel: Tuple[str, List[str], List[List[Any]]],
+        common_column: str,
+        schema: Optional[str] = None,
+    ) -> Any:
+        """
+        Insert the main row and the relative rows with one statement. The relative
+        rows select the common column from the RETURNING clause of the main insert.
+
+        Returns: Value of the common column of the inserted main row
+        """
+        main_name, main_columns, main_data = main
+        rel_name, rel_columns, rel_datas = rel
+
+        main_insert: QueryBuilder = (
+            PostgreSQLQuery.into(self._get_table(main_name, schema))
+            .columns(main_columns)
+            .insert(*main_data)
+        )
+        assert isinstance(main_insert, PostgreSQLQueryBuilder)
+        main_insert = main_insert.returning(common_column)
+        common_value = self.pypika_query.from_("main_insert").select(common_column)
+        common_index = rel_columns.index(common_column)
+        rel_insert = self.pypika_query.into(self._get_table(rel_name, schema)).columns(
+            rel_columns
+        )
+        for rel_data in rel_datas:
+            rel_insert = rel_insert.insert(
+                *rel_data[:common_index], common_value, *rel_data[common_index + 1 :]
+            )
+
+        sql = "WITH main_insert AS (%s)" % main_insert.get_sql()
+        if rel_datas:
+            sql += ", rel_insert AS (%s)" % rel_insert.get_sql()
+        sql += ' SELECT "%s" FROM main_insert' % common_column
+        if len(sql) < 200:
+            logger.debug(sql)
+
+        return connection.execute(text(sql)).scalar_one()
 
+    def _import_large_files(
+        self, table: TableSetting, datas: List[List[Any]]
+    ) -> Tuple[List[List[Any]], List[int]]:
+        """
+        Stream files passed for BYTEA columns that are larger than
+        large_file_threshold into large objects in chunks of stream_chunk_size.
+        The values are replaced by lo_get(oid), so the content is copied into the
+        table on the server and never held in memory completely. Deduplicated
+        columns are skipped because the payload needs to be hashed.
+
+        Returns: Data with the replaced values and the oids of the large objects
+        """
         if table.disable_auto_insert_columns:
-            inserted_columns = [c.name for c in table.columns]
+            insert_columns = table.columns
         else:
-            inserted_columns = [c.name for c in table.columns if c.is_inserted]
+            insert_columns = [c for c in table.columns if c.is_inserted]
+
+        lo_get = CustomFunction("lo_get", ["oid"])
+        oids: List[int] = []
+        processed_data = []
+        for data in datas:
+            this_processed_data = []
+            for column, value in zip(insert_columns, data):
+                if (
+                    column.ctype == "BYTEA"
+                    and not column.deduplicate
+                    and isinstance(value, str)
+                    and Path(value).is_file()
+                    and Path(value).stat().st_size > self.large_file_threshold
+                ):
+                    if column.compression is not None:
+                        logger.warning(
+                            "%s is streamed w/o compression because it is larger "
+                            "than %s bytes",
+                            value,
+                            self.large_file_threshold,
+                        )
+                    oid = self._import_large_object(value)
+                    oids.append(oid)
+                    value = lo_get(oid)
+                this_processed_data.append(value)
+            processed_data.append(this_processed_data)
+
+        return processed_data, oids
+
+    def _import_large_object(self, file_name: str) -> int:
+        """
+        Write the file into a new large object in chunks of stream_chunk_size
+
+        Returns: oid of the large object
+        """
+        logger.debug("Streaming %s into a large object", file_name)
+        with self.engine.connect() as connection:
+            oid = connection.execute(text("SELECT lo_create(0)")).scalar()
+            offset = 0
+            with open(file_name, "rb") as f:
+                while chunk := f.read(self.stream_chunk_size):
+                    connection.execute(
+                        text("SELECT lo_put(:oid, :offset, :chunk)"),
+                        {"oid": oid, "offset": offset, "chunk": chunk},
+                    )
+                    offset += len(chunk)
+            connection.commit()
+        logger.debug("Wrote %s bytes to large object %s", offset, oid)
+
+        return oid
+
+    def _unlink_large_objects(self, oids: List[int]) -> None:
+        """Delete the passed large objects"""
+        if not oids:
+            return
+        with self.engine.connect() as connection:
+            for oid in oids:
+                connection.execute(text("SELECT lo_unlink(:oid)"), {"oid": oid})
+            connection.commit()
+
+    def stream_bytea(
+        self,
+        table_name: str,
+        column: str,
+        key_column: str,
+        key: Any,
+        schema: Optional[str] = None,
+        use_primary: bool = False,
+        tables: Optional[Sequence[TableSetting]] = None,
+    ) -> Iterator[bytes]:
+        """
+        Read the value of a BYTEA column in chunks of stream_chunk_size, so large
+        values are never held in memory completely. Values of compressed or
+        deduplicated columns can not be read partially and are returned in one
+        chunk after they are resolved.
+
+        Args:
+            table_name: Name of the table
+            column: BYTEA column to read
+            key_column: Column identifying the row
+            key: Value of key_column of the row
+            schema: Explicitly pass a schema if it is not defined in the db
+            use_primary: Run the queries on the primary even if replicas are set
+            tables: Settings of the tables. The value is resolved and decompressed
+                    if the column of the table with table_name is deduplicated or
+                    compressed
+
+        Returns: Generator yielding the chunks of the value
+        """
+        table_sql = self._get_table(table_name, schema).get_sql(quote_char='"')
+        column_tables = [t for t in tables or [] if t.name == table_name]
+        read_complete = bool(
+            self._get_compressed_columns([column], column_tables)
+            or self._get_deduplicated_columns([column], column_tables)
+        )
+        params = {"key": key, "length": self.stream_chunk_size}
+        with self._read_connection(use_primary) as connection:
+            size = connection.execute(
+                text(
+                    f'SELECT octet_length("{column}") FROM {table_sql} '
+                    f'WHERE "{key_column}" = :key'
+                ),
+                params,
+            ).scalar()
+            if size is None:
+                return
+
+            chunk_query = text(
+                f'SELECT substring("{column}" FROM :start FOR :length) '
+                f'FROM {table_sql} WHERE "{key_column}" = :key'
+            )
+            start = 1
+            while start <= size:
+                chunk = connection.execute(
+                    chunk_query, {**params, "start": start}
+                ).scalar()
+                if start == 1 and read_complete:
+                    logger.debug("Value is compressed or deduplicated. Reading all")
+                    value = connection.execute(
+                        text(
+                            f'SELECT "{column}" FROM {table_sql} '
+                            f'WHERE "{key_column}" = :key'
+                        ),
+                        params,
+                    ).scalar()
+                    yield bytes(
+                        self._postprocess_rows(
+                            connection, [(value,)], [column], tables, schema
+                        )[0][0]
+                    )
+                    return
+                yield bytes(chunk)
+                start += self.stream_chunk_size
+            connection.commit()
+
+    def save_bytea_to_file(
+        self,
+        file_name: Union[str, Path],
+        table_name: str,
+        column: str,
+        key_column: str,
+        key: Any,
+        schema: Optional[str] = None,
+        use_primary: bool = False,
+        tables: Optional[Sequence[TableSetting]] = None,
+    ) -> int:
+        """
+        Write the value of a BYTEA column to a file using stream_bytea
+
+        Returns: Number of written bytes
+        """
+        n_bytes = 0
+        with open(file_name, "wb") as f:
+            for chunk in self.stream_bytea(
+                table_name, column, key_column, key, schema, use_primary, tables
+            ):
+                n_bytes += f.write(chunk)
 
-        return self._insert(table.name, inserted_columns, processed_data, schema=schema)
+        return n_bytes
 
     def _preprocess_data_for_insert(
         self, table: TableSetting, datas: List[List[Any]]
@@ -315,16 +1264,20 @@ class DatabaseConnection:
                     "Number of passed data does not match number of columns expected"
                 )
             for column, value in zip(insert_columns, data):
-                if column.ctype == "BYTEA" and self.backend == Backend.POSTGRES:
-                    if isinstance(value, str):
-                        # print(Path(value), Path(value).exists())
-                        if Path(value).exists():
-                            logger.debug(
-                                "Passed value for BYTEA column is a valid path. "
-                                "Assuming to read and insert content"
-                            )
-                            with open(value, "rb") as f:
-                                value = f.read()
+                # Terms are SQL expressions (e.g. lo_get for streamed files)
+                if (
+                    column.ctype == "BYTEA"
+                    and self.backend == Backend.POSTGRES
+                    and not isinstance(value, Term)
+                ):
+                    value = self._load_bytea_value(value)
+                    # Payloads of deduplicated columns are compressed in the blob table
+                    if (
+                        column.compression is not None
+                        and value is not None
+                        and not column.deduplicate
+                    ):
+                        value = compress(value, column.compression)
                     value = psycopg2.Binary(value)
                     try:
                         str(value)
@@ -338,13 +1291,119 @@ class DatabaseConnection:
 
         return processed_data
 
-    def _insert(
-        self,
-        table_name: str,
-        columns: Optional[List[str]],
-        data: List[List[Any]],
-        schema: Optional[str] = None,
-    ) -> Tuple[bool, Optional[str]]:
+    @staticmethod
+    def _load_bytea_value(value: Any) -> Any:
+        """If the value for a BYTEA column is a path to a file, read the file"""
+        if isinstance(value, str):
+            if Path(value).exists():
+                logger.debug(
+                    "Passed value for BYTEA column is a valid path. "
+                    "Assuming to read and insert content"
+                )
+                with open(value, "rb") as f:
+                    value = f.read()
+        return value
+
+    def _deduplicate_payloads(
+        self, table: TableSetting, datas: List[List[Any]]
+    ) -> Tuple[List[List[Any]], Dict[bytes, bytes]]:
+        """
+        Replace the values of deduplicated columns by references to the blob
+        table.
+
+        Args:
+            table: TableSetting object defining the table data is inserted into
+            datas: Data to be processed
+
+        Returns: Data with references and hash -> payload (compressed if set for the
+                 column) of all referenced blobs. The hash is computed from the
+                 stored payload, so compressed and uncompressed columns never
+                 share a blob
+        """
+        if table.disable_auto_insert_columns:
+            insert_columns = table.columns
+        else:
+            insert_columns = [c for c in table.columns if c.is_inserted]
+
+        blobs: Dict[bytes, bytes] = {}
+        # (hash of the raw payload, codec) -> hash of the stored payload
+        digests: Dict[Tuple[bytes, Optional[str]], bytes] = {}
+        processed_data = []
+        for data in datas:
+            this_processed_data = []
+            for column, value in zip(insert_columns, data):
+                if column.deduplicate and value is not None:
+                    value = self._load_bytea_value(value)
+                    if isinstance(value, (bytes, bytearray, memoryview)):
+                        payload = bytes(value)
+                        key = (content_hash(payload), column.compression)
+                        if key not in digests:
+                            if column.compression is not None:
+                                payload = compress(payload, column.compression)
+                            digests[key] = content_hash(payload)
+                            blobs[digests[key]] = payload
+                        value = make_reference(digests[key])
+                this_processed_data.append(value)
+            processed_data.append(this_processed_data)
+
+        return processed_data, blobs
+
+    def _upload_blobs(
+        self,
+        connection: Connection,
+        blobs: Dict[bytes, bytes],
+        schema: Optional[str] = None,
+    ) -> int:
+        """
+        Insert the payloads that are not yet in the blob table. Existing hashes are
+        looked up in one query, so only unseen payloads are sent to the database.
+        Nothing is committed. The blobs are written on the connection of the insert
+        of the referencing rows, so they are rolled back with the rows if it fails.
+
+        Returns: Number of uploaded blobs
+        """
+        if not blobs:
+            return 0
+        blob_table = self._get_table(self.blob_table, schema).get_sql(quote_char='"')
+        existing = {
+            bytes(r[0])
+            for r in connection.execute(
+                text(
+                    f'SELECT "hash" FROM {blob_table} WHERE "hash" IN :hashes'
+                ).bindparams(bindparam("hashes", expanding=True)),
+                {"hashes": list(blobs.keys())},
+            )
+        }
+        new_blobs = [
+            {"hash": digest, "data": payload, "size": len(payload)}
+            for digest, payload in blobs.items()
+            if digest not in existing
+        ]
+        if new_blobs:
+            connection.execute(
+                text(
+                    f'INSERT INTO {blob_table} ("hash", "data", "size") '
+                    "VALUES (:hash, :data, :size) "
+                    'ON CONFLICT ("hash") DO NOTHING'
+                ),
+                new_blobs,
+            )
+        logger.debug(
+            "Uploaded %s of %s blobs (%s already stored)",
+            len(new_blobs),
+            len(blobs),
+            len(existing),
+        )
+
+        return len(new_blobs)
+
+    def _insert(
+        self,
+        table_name: str,
+        columns: Optional[List[str]],
+        data: List[List[Any]],
+        schema: Optional[str] = None,
+    ) -> Tuple[bool, Optional[str]]:
         """
         General purpose insert into database. Only using table_name and a lists
         of values.
@@ -359,35 +1418,332 @@ class DatabaseConnection:
         Returns: Boolean flag denoting success of the insertion and Optional string
                  specifying the error
         """
-        if schema is None:
-            table = Table(table_name)
-        else:
-            schema_ = Schema(schema)
-            table = schema_.__getattr__(table_name)
-
-        insert_statement = self.pypika_query.into(table)
-        if columns is not None:
-            insert_statement = insert_statement.columns(columns)
-        for d in data:
-            insert_statement = insert_statement.insert(*d)
+        data_inserted, err_str, _ = self._insert_returning(
+            table_name, columns, data, schema=schema
+        )
+        return data_inserted, err_str
 
-        sql_insert_statement = insert_statement.get_sql()
-        if len(sql_insert_statement) < 100:
-            logger.debug(sql_insert_statement)
+    def _insert_returning(
+        self,
+        table_name: str,
+        columns: Optional[List[str]],
+        data: List[List[Any]],
+        schema: Optional[str] = None,
+        returning: Optional[List[str]] = None,
+        blobs: Optional[Dict[bytes, bytes]] = None,
+    ) -> Tuple[bool, Optional[str], List[Tuple[Any, ...]]]:
+        """
+        Same as _insert but additionally returns the values of the returning
+        columns for each inserted row. For MYSQL the value is the lastrowid of
+        each row. Passed blobs are uploaded in the transaction of the insert.
+        """
+        use_lastrowid = returning is not None and self.backend == Backend.MYSQL
+        if use_lastrowid:
+            # The AUTO_INCREMENT values of a multi-row insert are not necessarily
+            # consecutive (innodb_autoinc_lock_mode). Insert the rows one by one
+            sql_insert_statements = [
+                self._get_insert_statement(table_name, columns, [d], schema)
+                for d in data
+            ]
+        else:
+            sql_insert_statements = [
+                self._get_insert_statement(
+                    table_name, columns, data, schema, returning=returning
+                )
+            ]
+        if len(sql_insert_statements[0]) < 100:
+            logger.debug(sql_insert_statements[0])
 
         data_inserted = True
         err_str = None
+        returned: List[Tuple[Any, ...]] = []
         with self.engine.connect() as connection:
             try:
-                connection.execute(text(sql_insert_statement))
+                self._upload_blobs(connection, blobs or {}, schema=schema)
+                for sql_insert_statement in sql_insert_statements:
+                    result = connection.execute(text(sql_insert_statement))
+                    if use_lastrowid:
+                        returned.append((result.lastrowid,))
+                    elif returning is not None:
+                        returned.extend(tuple(r) for r in result)
             except IntegrityError as e:
                 logger.error("Data could not be inserted: %s", str(e))
                 data_inserted = False
                 err_str = str(e)
-            connection.commit()
+                returned = []
+                connection.rollback()
+            else:
+                connection.commit()
+
+        if data_inserted:
+            self.modified_tables.add(table_name)
+
+        return data_inserted, err_str, returned
+
+    def _get_insert_statement(
+        self,
+        table_name: str,
+        columns: Optional[List[str]],
+        data: List[List[Any]],
+        schema: Optional[str] = None,
+        returning: Optional[List[str]] = None,
+    ) -> str:
+        """SQL of an INSERT statement with one row per element in data"""
+        table = self._get_table(table_name, schema)
+
+        insert_statement: QueryBuilder = self.pypika_query.into(table)
+        if columns is not None:
+            insert_statement = insert_statement.columns(columns)
+        for d in data:
+            insert_statement = insert_statement.insert(*d)
+        if returning is not None and self.backend == Backend.POSTGRES:
+            assert isinstance(insert_statement, PostgreSQLQueryBuilder)
+            insert_statement = insert_statement.returning(*returning)
+
+        return insert_statement.get_sql()
+
+    def insert_many(
+        self,
+        inserts: Sequence[Tuple[TableSetting, List[List[Any]]]],
+        batch_size: int = 1,
+        schema: Optional[str] = None,
+    ) -> bool:
+        """
+        Insert data into one or more tables on one connection in one transaction.
+        Changes are only committed if all inserts succeed. Values can be SQL
+        expressions (pypika Terms), e.g. the current value of a sequence set by a
+        previous insert.
+
+        Args:
+            inserts: TableSetting and data of each INSERT statement. The
+                     statements are executed in the passed order
+            batch_size: Number of statements that are sent to the server in one
+                        round trip. Always 1 for MYSQL
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: Boolean flag denoting success of the insertion
+        """
+        statements = []
+        blobs: Dict[bytes, bytes] = {}
+        for table, datas in inserts:
+            if any(c.deduplicate for c in table.columns):
+                datas, table_blobs = self._deduplicate_payloads(table, datas)
+                blobs.update(table_blobs)
+            if table.disable_auto_insert_columns:
+                inserted_columns = [c.name for c in table.columns]
+            else:
+                inserted_columns = [c.name for c in table.columns if c.is_inserted]
+            statements.append(
+                self._get_insert_statement(
+                    table.name,
+                    inserted_columns,
+                    self._preprocess_data_for_insert(table, datas),
+                    schema=schema,
+                )
+            )
+
+        timings: List[StatementTiming] = []
+        with self.engine.connect() as connection:
+            self._upload_blobs(connection, blobs, schema=schema)
+            success = self._exec_statements(connection, statements, batch_size, timings)
+            if success:
+                connection.commit()
+            else:
+                connection.rollback()
+
+        if success:
+            self.modified_tables.update(table.name for table, _ in inserts)
+            logger.debug(
+                "Executed %s inserts in %.3f s",
+                len(statements),
+                sum(t.seconds for t in timings),
+            )
+
+        return success
+
+    def copy(
+        self,
+        table: TableSetting,
+        datas: List[List[Any]],
+        schema: Optional[str] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Bulk load data with COPY FROM STDIN. Values are processed like in insert
+        (except streaming of large files) but sent to the server in one text stream
+        instead of an INSERT statement.
+
+        Args:
+            table: TableSetting object defining the table data is inserted into
+            datas: Data to be inserted
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: Boolean flag denoting success of the insertion and Optional string
+                 specifying the error
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError("COPY is only supported for POSTGRES")
+
+        blobs: Dict[bytes, bytes] = {}
+        if any(c.deduplicate for c in table.columns):
+            datas, blobs = self._deduplicate_payloads(table, datas)
+        processed_data = self._preprocess_data_for_insert(table, datas)
+
+        if table.disable_auto_insert_columns:
+            inserted_columns = [c.name for c in table.columns]
+        else:
+            inserted_columns = [c.name for c in table.columns if c.is_inserted]
+
+        buffer = io.StringIO()
+        for data in processed_data:
+            buffer.write("\t".join(self._format_copy_value(v) for v in data))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        copy_statement = "COPY %s (%s) FROM STDIN" % (
+            self._get_table(table.name, schema).get_sql(quote_char='"'),
+            ", ".join(f'"{c}"' for c in inserted_columns),
+        )
+        logger.debug(copy_statement)
+
+        data_inserted = True
+        err_str = None
+        try:
+            # The blobs and the copied rows are committed in one transaction
+            with self.engine.begin() as connection:
+                self._upload_blobs(connection, blobs, schema=schema)
+                with connection.connection.cursor() as cursor:
+                    cursor.copy_expert(copy_statement, buffer)
+        except psycopg2.Error as e:
+            logger.error("Data could not be copied: %s", str(e))
+            data_inserted = False
+            err_str = str(e)
+
+        if data_inserted:
+            self.modified_tables.add(table.name)
 
         return data_inserted, err_str
 
+    @staticmethod
+    def _format_copy_value(value: Any) -> str:
+        """Format a value for the text format of COPY"""
+        if value is None:
+            return "\\N"
+        if isinstance(value, psycopg2.extensions.Binary):
+            value = value.adapted
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            # Hex format of BYTEA. The backslash is escaped for the text format
+            return "\\\\x" + bytes(value).hex()
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+
+    def prepare(
+        self,
+        name: str,
+        query: Union[str, QueryBuilder],
+        types: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Register a query as server-side prepared statement. The statement is
+        prepared lazily on each pooled connection on the first execution and reused
+        on that connection afterwards.
+
+        Args:
+            name: Name of the prepared statement. Must be a valid SQL identifier
+            query: Query using positional parameters ($1, $2, ...)
+            types: Optional list of SQL types of the parameters
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError(
+                "Prepared statements are only supported for POSTGRES"
+            )
+        if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name) is None:
+            raise ValueError("%s is not a valid name for a prepared statement" % name)
+
+        if isinstance(query, QueryBuilder):
+            query = query.get_sql()
+
+        type_str = "" if not types else "(%s)" % ", ".join(types)
+        self.prepared_statements[name] = f"PREPARE {name}{type_str} AS {query}"
+        self.prepared_statement_stats.setdefault(name, PreparedStatementStats())
+
+    def execute_prepared(
+        self,
+        name: str,
+        params: Sequence[Any] = (),
+        read_only: bool = False,
+        use_primary: bool = False,
+        schema: Optional[str] = None,
+        tables: Optional[Sequence[TableSetting]] = None,
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Execute a statement registered with prepare.
+
+        Args:
+            name: Name of the prepared statement
+            params: Values for the positional parameters
+            read_only: Set to True if the statement only reads data. Enables
+                       routing the statement to a read replica
+            use_primary: Run a read_only statement on the primary
+            schema: Schema of the blob table with deduplicated values. Explicitly
+                    pass a schema if it is not defined in the db
+            tables: Settings of the queried tables. Result columns with the name of
+                    a deduplicated column are resolved and result columns with the
+                    name of a compressed column are decompressed
+
+        Returns: List of results. Empty if the statement does not return rows
+        """
+        if name not in self.prepared_statements:
+            raise KeyError("Statement %s was not prepared" % name)
+        prepare_sql = self.prepared_statements[name]
+        stats = self.prepared_statement_stats[name]
+
+        bind_names = [f"p{i}" for i in range(len(params))]
+        if params:
+            execute_sql = "EXECUTE %s(%s)" % (
+                name,
+                ", ".join(f":{b}" for b in bind_names),
+            )
+        else:
+            execute_sql = f"EXECUTE {name}"
+
+        start = time.perf_counter()
+        with (
+            self._read_connection(use_primary) if read_only else self.engine.connect()
+        ) as connection:
+            # The info dict lives as long as the DBAPI connection. So are prepared
+            # statements on the server side.
+            prepared_on_conn = connection.info.setdefault("prepared_statements", {})
+            if prepared_on_conn.get(name) != prepare_sql:
+                if name in prepared_on_conn:
+                    connection.exec_driver_sql(f"DEALLOCATE {name}")
+                logger.debug("Preparing statement %s on connection", name)
+                connection.exec_driver_sql(
+                    prepare_sql, execution_options={"no_parameters": True}
+                )
+                prepared_on_conn[name] = prepare_sql
+                stats.prepares += 1
+
+            result = connection.execute(
+                text(execute_sql), dict(zip(bind_names, params))
+            )
+            data = (
+                self._postprocess_rows(
+                    connection, list(result), list(result.keys()), tables, schema
+                )
+                if result.returns_rows
+                else []
+            )
+            connection.commit()
+        stats.executions += 1
+        stats.total_time += time.perf_counter() - start
+
+        return data
+
     def has_table(self, table_name: str, schema: Optional[str] = None) -> bool:
         """
         Check if the passed table exits in the active connection
@@ -406,6 +1762,17 @@ class DatabaseConnection:
         else:
             return False
 
+    def _get_table(self, table_name: str, schema: Optional[str] = None) -> Table:
+        if schema is None:
+            return Table(table_name)
+        else:
+            schema_ = Schema(schema)
+            return schema_.__getattr__(table_name)
+
+    @property
+    def _quote_char(self) -> str:
+        return "`" if self.backend == Backend.MYSQL else '"'
+
     def create_table_from_table_info(
         self,
         creation_settings: List[TableSetting],
@@ -413,7 +1780,8 @@ class DatabaseConnection:
         schema: Optional[str] = None,
     ) -> None:
         """
-        Creates a table based on the passed settings.
+        Creates a table based on the passed settings. Indexes defined in the
+        settings are created together with the table.
 
         Args:
             creation_settings: Nested dictionary containing the information to create
@@ -422,66 +1790,969 @@ class DatabaseConnection:
             schema: Explicitly pass a schema if it is not defined in the db
         """
         for table_info in creation_settings:
-            create_columns = []
-            unique_columns = []
-            primary_columns = []
-            for column_info in table_info.columns:
-                create_columns.append(
-                    Column(
-                        column_name=column_info.name,
-                        column_type=column_info.ctype,
-                        nullable=column_info.is_nullable,
+            logger.info("Creating table %s", table_info.name)
+            statements = self._get_create_table_statements(
+                table_info, foreign_key_settings, schema
+            )
+            with self.engine.connect() as connection:
+                for statement in statements:
+                    logger.debug(statement)
+                    connection.execute(text(statement))
+                connection.commit()
+
+    def provision(
+        self,
+        config: Union[OrganizerConfig, Dict[str, TableSetting]],
+        schema: Optional[str] = None,
+        batch_size: int = 100,
+        views: Optional[Dict[str, ViewSetting]] = None,
+    ) -> List[str]:
+        """
+        Create all tables defined in the config that do not exist yet. Tables are
+        ordered so main tables are created before their rel_table (with foreign keys
+        if rel_table_common_column_as_foreign_key is set). Materialized views are
+        created after all tables. Everything is created in one transaction, so either
+        all or none of the missing tables and views are created.
+
+        Args:
+            config: Config with tables or dict with config table name -> TableSetting
+            schema: Explicitly pass a schema if it is not defined in the db
+            batch_size: Number of statements sent to the server in one round trip
+                        (always 1 for MYSQL)
+            views: Materialized views to create. Defaults to the views of the config
+                   if a OrganizerConfig is passed
+
+        Returns: Names of the created tables and views
+
+        Raises:
+            ProvisioningException if the tables could not be ordered or created
+        """
+        if isinstance(config, OrganizerConfig):
+            tables = config.tables
+            if views is None:
+                views = config.views
+        else:
+            tables = config
+        if not tables and not views:
+            logger.info("No tables to provision")
+            return []
+
+        try:
+            creation_order = get_creation_order(tables) if tables else []
+        except CycleError as e:
+            raise ProvisioningException(
+                "rel_table relations contain a cycle: %s" % e.args[1]
+            )
+        foreign_key_settings = get_foreign_key_settings(tables) if tables else {}
+
+        with self.engine.connect() as connection:
+            existing_tables = set(inspect(connection).get_table_names(schema))
+
+            statements = []
+            created = []
+            for table_key in creation_order:
+                table_info = tables[table_key]
+                if table_info.name in existing_tables:
+                    logger.debug("Table %s already exists", table_info.name)
+                    continue
+                statements.extend(
+                    self._get_create_table_statements(
+                        table_info, foreign_key_settings, schema
+                    )
+                )
+                created.append(table_info.name)
+
+            if views:
+                existing_views = self._get_materialized_view_names(connection, schema)
+                for view in views.values():
+                    if view.name in existing_views:
+                        logger.debug("View %s already exists", view.name)
+                        continue
+                    statements.extend(
+                        self._get_create_view_statements(view, schema=schema)
                     )
+                    created.append(view.name)
+
+            if not statements:
+                logger.info("All tables already exist")
+                return []
+
+            timings: List[StatementTiming] = []
+            if not self._exec_statements(connection, statements, batch_size, timings):
+                connection.rollback()
+                raise ProvisioningException(
+                    "Provisioning failed. No tables were created"
                 )
-                if column_info.is_unique:
-                    unique_columns.append(column_info.name)
-                if column_info.is_primary:
-                    primary_columns.append(column_info.name)
+            connection.commit()
 
-            if schema is None:
-                table = Table(table_info.name)
-            else:
-                schema_ = Schema(schema)
-                table = schema_.__getattr__(table_info.name)
+        logger.info(
+            "Created %s tables/views in %.3f s",
+            len(created),
+            sum(t.seconds for t in timings),
+        )
+        return created
+
+    def _get_materialized_view_names(
+        self, connection: Connection, schema: Optional[str] = None
+    ) -> Set[str]:
+        """Get the names of all materialized views in the (current) schema"""
+        if self.backend != Backend.POSTGRES:
+            return set()
+        result = connection.execute(
+            text(
+                "SELECT matviewname FROM pg_matviews "
+                "WHERE schemaname = COALESCE(:schema, current_schema())"
+            ),
+            {"schema": schema},
+        )
+        return {row[0] for row in result}
+
+    def _get_create_view_statements(
+        self, view: ViewSetting, schema: Optional[str] = None
+    ) -> List[str]:
+        """
+        Get the statements creating a materialized view and the unique index that
+        is required to refresh the view concurrently.
+
+        Args:
+            view: Settings of the materialized view
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: List of statements
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError("Materialized views only supported for POSTGRES")
+        view_table = self._get_table(view.name, schema).get_sql(
+            quote_char=self._quote_char
+        )
+        index_name = f"{view.name}_unique_idx"[:63]
+        return [
+            "CREATE MATERIALIZED VIEW IF NOT EXISTS %s AS %s WITH DATA"
+            % (view_table, view.query.strip().rstrip(";")),
+            "CREATE UNIQUE INDEX IF NOT EXISTS %s ON %s (%s)"
+            % (
+                f'"{index_name}"',
+                view_table,
+                ", ".join(f'"{c}"' for c in view.unique_columns),
+            ),
+        ]
+
+    def refresh_views(
+        self,
+        views: Union[OrganizerConfig, Dict[str, ViewSetting], List[ViewSetting]],
+        concurrently: bool = True,
+        only_if_sources_changed: bool = False,
+        schema: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Refresh materialized views. Refreshing concurrently does not lock out reads
+        on the view while the query is rerun.
 
-            create_statement = (
-                CreateQueryBuilder(dialect=self.dialect)
-                .create_table(table)
-                .columns(*create_columns)
+        Args:
+            views: Config with views, dict with config view name -> ViewSetting or
+                   list of ViewSetting
+            concurrently: If True, refresh with REFRESH MATERIALIZED VIEW
+                          CONCURRENTLY. This requires the view to be populated
+            only_if_sources_changed: If True, only views with a source table that
+                                     received inserts through this connection since
+                                     the last refresh are refreshed
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: Names of the refreshed views
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError("Materialized views only supported for POSTGRES")
+        view_settings: List[ViewSetting]
+        if isinstance(views, OrganizerConfig):
+            view_settings = list(views.views.values())
+        elif isinstance(views, dict):
+            view_settings = list(views.values())
+        else:
+            view_settings = views
+
+        refreshed = []
+        consumed_tables: Set[str] = set()
+        with self.engine.connect() as connection:
+            for view in view_settings:
+                if only_if_sources_changed and not self.modified_tables.intersection(
+                    view.source_tables
+                ):
+                    logger.debug("Sources of view %s unchanged", view.name)
+                    continue
+                view_table = self._get_table(view.name, schema).get_sql(
+                    quote_char=self._quote_char
+                )
+                statement = "REFRESH MATERIALIZED VIEW %s%s" % (
+                    "CONCURRENTLY " if concurrently else "",
+                    view_table,
+                )
+                logger.info(statement)
+                start = time.perf_counter()
+                connection.execute(text(statement))
+                connection.commit()
+                logger.debug(
+                    "Refreshed %s in %.3f s", view.name, time.perf_counter() - start
+                )
+                refreshed.append(view.name)
+                consumed_tables.update(view.source_tables)
+
+        self.modified_tables.difference_update(consumed_tables)
+        return refreshed
+
+    def _get_create_table_statements(
+        self,
+        table_info: TableSetting,
+        foreign_key_settings: Dict[str, TableSetting] = {},
+        schema: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Get all statements required to create the table defined in the passed
+        settings.
+
+        Args:
+            table_info: Settings of the table
+            foreign_key_settings: Table name -> Settings of the referenced table
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: List of SQL statements
+        """
+        create_columns = []
+        unique_columns = []
+        primary_columns = []
+        for column_info in table_info.columns:
+            create_columns.append(
+                Column(
+                    column_name=column_info.name,
+                    column_type=column_info.ctype,
+                    nullable=column_info.is_nullable,
+                )
             )
-            if unique_columns:
-                create_statement = create_statement.unique(*unique_columns)
-            if primary_columns:
-                create_statement = create_statement.primary_key(*primary_columns)
+            if column_info.is_unique:
+                unique_columns.append(column_info.name)
+            if column_info.is_primary:
+                primary_columns.append(column_info.name)
 
-            if table_info.name in foreign_key_settings:
-                reference_table = foreign_key_settings[table_info.name]
+        table = self._get_table(table_info.name, schema)
 
-                if schema is None:
-                    ref_table_obj = Table(reference_table.name)
-                else:
-                    schema_ = Schema(schema)
-                    ref_table_obj = schema_.__getattr__(reference_table.name)
+        create_statement = (
+            CreateQueryBuilder(dialect=self.dialect)
+            .create_table(table)
+            .columns(*create_columns)
+        )
+        if unique_columns:
+            create_statement = create_statement.unique(*unique_columns)
+        if primary_columns:
+            create_statement = create_statement.primary_key(*primary_columns)
 
-                create_statement = create_statement.foreign_key(
-                    columns=[Column(reference_table.rel_table_common_column)],
-                    reference_table=ref_table_obj,
-                    reference_columns=[Column(reference_table.rel_table_common_column)],
+        if table_info.name in foreign_key_settings:
+            reference_table = foreign_key_settings[table_info.name]
+
+            ref_table_obj = self._get_table(reference_table.name, schema)
+
+            create_statement = create_statement.foreign_key(
+                columns=[Column(reference_table.rel_table_common_column)],
+                reference_table=ref_table_obj,
+                reference_columns=[Column(reference_table.rel_table_common_column)],
+            )
+
+        create_sql = create_statement.get_sql()
+        if table_info.partition is not None:
+            if self.backend != Backend.POSTGRES:
+                raise NotImplementedError(
+                    "Partitioned tables are only supported for POSTGRES"
                 )
+            create_sql += ' PARTITION BY %s ("%s")' % (
+                table_info.partition.method.upper(),
+                table_info.partition.column,
+            )
 
-            logger.info("Creating table %s", table_info.name)
-            logger.debug(create_statement.get_sql())
+        statements = []
+        if any(c.deduplicate for c in table_info.columns):
+            statements.append(self._get_create_blob_table_statement(schema))
+        statements.append(create_sql)
+        for column_info in table_info.columns:
+            storage = column_info.column_storage
+            if storage is not None and self.backend == Backend.POSTGRES:
+                statements.append(
+                    'ALTER TABLE %s ALTER COLUMN "%s" SET STORAGE %s'
+                    % (table.get_sql(quote_char='"'), column_info.name, storage)
+                )
+        if table_info.partition is not None:
+            statements.extend(
+                self._get_create_partition_statements(table_info, schema=schema)
+            )
+        for index in table_info.indexes:
+            statements.append(
+                self._get_create_index_statement(table_info, index, schema)
+            )
 
-            with self.engine.connect() as connection:
-                connection.execute(text(create_statement.get_sql()))
+        return statements
+
+    def _get_create_blob_table_statement(self, schema: Optional[str] = None) -> str:
+        """Get the statement creating the blob table for deduplicated columns"""
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError(
+                "Deduplicated columns are only supported for POSTGRES"
+            )
+        blob_table = self._get_table(self.blob_table, schema).get_sql(quote_char='"')
+        return (
+            f"CREATE TABLE IF NOT EXISTS {blob_table} "
+            '("hash" BYTEA PRIMARY KEY, "data" BYTEA NOT NULL, "size" BIGINT NOT NULL)'
+        )
+
+    def _get_create_partition_statements(
+        self,
+        table_info: TableSetting,
+        reference: Optional[date] = None,
+        ahead: Optional[int] = None,
+        schema: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Get the statements creating the child partitions of a partitioned table.
+        For RANGE partitions these are the partitions from the start set in the
+        settings (or the reference date) up to ahead periods after the reference.
+        For LIST partitions one partition per entry in values is created.
+
+        Args:
+            table_info: Settings of the partitioned table
+            reference: Reference date for RANGE partitions. Defaults to today
+            ahead: Number of RANGE partitions created after the reference
+                   period. Defaults to premake in the settings
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: List of SQL statements
+        """
+        partition = table_info.partition
+        if partition is None:
+            raise ValueError("Table %s is not partitioned" % table_info.name)
+
+        parent_sql = self._get_table(table_info.name, schema).get_sql(quote_char='"')
+        bounds: List[Tuple[str, str]] = []
+        if partition.is_range:
+            for suffix, lower, upper in partition.get_premade_range_partitions(
+                date.today() if reference is None else reference, ahead
+            ):
+                bounds.append(
+                    (
+                        suffix,
+                        "FOR VALUES FROM (%s) TO (%s)"
+                        % (
+                            ValueWrapper(lower.isoformat()).get_sql(),
+                            ValueWrapper(upper.isoformat()).get_sql(),
+                        ),
+                    )
+                )
+        else:
+            for suffix, values in partition.values.items():
+                bounds.append(
+                    (
+                        suffix,
+                        "FOR VALUES IN (%s)"
+                        % ",".join(ValueWrapper(v).get_sql() for v in values),
+                    )
+                )
+        if partition.default_partition:
+            bounds.append(("default", "DEFAULT"))
+
+        statements = []
+        for suffix, bound_sql in bounds:
+            child_sql = self._get_table(
+                f"{table_info.name}_p{suffix}"[:63], schema
+            ).get_sql(quote_char='"')
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {child_sql} "
+                f"PARTITION OF {parent_sql} {bound_sql}"
+            )
+
+        return statements
+
+    def create_partitions(
+        self,
+        table_info: TableSetting,
+        ahead: Optional[int] = None,
+        reference: Optional[date] = None,
+        schema: Optional[str] = None,
+    ) -> None:
+        """
+        Create the child partitions of a partitioned table ahead of time. Existing
+        partitions are skipped. Intended to be called periodically (e.g. daily) so
+        that partitions for upcoming RANGE periods exist before data arrives.
+
+        Args:
+            table_info: Settings of the partitioned table
+            ahead: Number of RANGE partitions created after the reference period.
+                   Defaults to premake in the settings
+            reference: Reference date for RANGE partitions. Defaults to today
+            schema: Explicitly pass a schema if it is not defined in the db
+        """
+        statements = self._get_create_partition_statements(
+            table_info, reference=reference, ahead=ahead, schema=schema
+        )
+        logger.info("Creating partitions for %s", table_info.name)
+        with self.engine.connect() as connection:
+            for statement in statements:
+                logger.debug(statement)
+                connection.execute(text(statement))
+            connection.commit()
+
+    def _get_create_index_statement(
+        self,
+        table_info: TableSetting,
+        index: IndexSetting,
+        schema: Optional[str] = None,
+        concurrently: bool = False,
+    ) -> str:
+        """
+        Get the CREATE INDEX statement for the passed index.
+
+        Args:
+            table_info: Settings of the indexed table
+            index: Settings of the index
+            schema: Explicitly pass a schema if it is not defined in the db
+            concurrently: Build the index without locking writes to the table
+
+        Returns: SQL statement
+        """
+        quote_char = self._quote_char
+        index_name = index.get_name(table_info.name)
+        table_sql = self._get_table(table_info.name, schema).get_sql(
+            quote_char=quote_char
+        )
+        column_sql = ",".join(
+            f"({column})"
+            if index.is_expression(column)
+            else f"{quote_char}{column}{quote_char}"
+            for column in index.columns
+        )
+        unique_sql = "UNIQUE " if index.is_unique else ""
+
+        if self.backend == Backend.MYSQL:
+            if (
+                index.method not in ["btree", "hash"]
+                or index.where is not None
+                or concurrently
+            ):
+                raise NotImplementedError(
+                    "Only btree and hash indexes w/o where are supported for MYSQL"
+                )
+            return (
+                f"CREATE {unique_sql}INDEX {quote_char}{index_name}{quote_char} "
+                f"ON {table_sql} ({column_sql}) USING {index.method.upper()}"
+            )
+
+        concurrently_sql = "CONCURRENTLY " if concurrently else ""
+        statement = (
+            f"CREATE {unique_sql}INDEX {concurrently_sql}IF NOT EXISTS "
+            f'"{index_name}" ON {table_sql} USING {index.method} ({column_sql})'
+        )
+        if index.where is not None:
+            statement += f" WHERE {index.where}"
+
+        return statement
+
+    def _get_index_names(
+        self, connection: Connection, table_name: str, schema: Optional[str] = None
+    ) -> Set[str]:
+        """Get the names of all indexes of the table in the (current) schema"""
+        if self.backend == Backend.POSTGRES:
+            statement = (
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table "
+                "AND schemaname = COALESCE(:schema, current_schema())"
+            )
+        else:
+            # MYSQL does not support CREATE INDEX IF NOT EXISTS
+            statement = (
+                "SELECT DISTINCT index_name FROM information_schema.statistics "
+                "WHERE table_name = :table "
+                "AND table_schema = COALESCE(:schema, DATABASE())"
+            )
+        result = connection.execute(
+            text(statement), {"table": table_name, "schema": schema}
+        )
+        return {row[0] for row in result}
+
+    def create_indexes(
+        self,
+        table_info: TableSetting,
+        schema: Optional[str] = None,
+        concurrently: bool = False,
+    ) -> None:
+        """
+        Create the indexes defined in the table settings on an existing table.
+        Indexes with a name that already exists on the table are skipped.
+
+        Args:
+            table_info: Settings of the table
+            schema: Explicitly pass a schema if it is not defined in the db
+            concurrently: Build the indexes with CREATE INDEX CONCURRENTLY (POSTGRES
+                          only). Writes to the table are not blocked during the
+                          build. The indexes are created in autocommit mode, so
+                          each index is kept even if a later one fails. A failed
+                          build leaves an invalid index that has to be dropped
+                          before retrying. Not supported for partitioned tables
+
+        Raises:
+            NotImplementedError if concurrently is set for a partitioned table
+        """
+        if not table_info.indexes:
+            logger.info("No indexes defined for %s", table_info.name)
+            return
+        if concurrently and table_info.partition is not None:
+            raise NotImplementedError(
+                "Indexes on the partitioned table %s can not be created "
+                "concurrently" % table_info.name
+            )
+
+        with self.engine.connect() as connection:
+            if concurrently:
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            existing_indexes = self._get_index_names(
+                connection, table_info.name, schema
+            )
+            for index in table_info.indexes:
+                if index.get_name(table_info.name) in existing_indexes:
+                    logger.debug(
+                        "Index %s already exists", index.get_name(table_info.name)
+                    )
+                    continue
+                statement = self._get_create_index_statement(
+                    table_info, index, schema, concurrently=concurrently
+                )
+                logger.info(
+                    "Creating index %s on %s",
+                    index.get_name(table_info.name),
+                    table_info.name,
+                )
+                logger.debug(statement)
+                connection.execute(text(statement))
+            if not concurrently:
                 connection.commit()
 
-    def add_column_to_table(self, table_name: str, new_column: ColumnSetting) -> None:
+    def add_column_to_table(
+        self,
+        table_name: str,
+        new_column: ColumnSetting,
+        schema: Optional[str] = None,
+        backfill: Optional[str] = None,
+        key_column: Optional[str] = None,
+        batch_size: int = 10000,
+        throttle: float = 0.0,
+        lock_timeout: str = "5s",
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
         """
-        Add a new column to an existing table
+        Add a new column to an existing table without locking the table for longer
+        than necessary. Steps:
+
+        1. The column is added as nullable w/o default (no table rewrite)
+        2. Existing rows are backfilled in batches (keyset pagination over
+           key_column). Each batch is committed separately
+        3. The default is set and rows inserted during the backfill are filled
+        4. NOT NULL is set via a validated CHECK constraint so no full table scan
+           is required while holding an exclusive lock
+
+        All DDL statements use a lock_timeout and are retried if the lock can not
+        be acquired, so concurrent writes are not queued behind the migration.
 
         Args:
             table_name: Name of the table
             new_column: Settings for the now column
+            schema: Explicitly pass a schema if it is not defined in the db
+            backfill: SQL expression used to fill existing rows (e.g. computed from
+                      other columns). Defaults to the default of the column
+            key_column: Unique column used to paginate the backfill. Defaults to the
+                        primary key of the table
+            batch_size: Number of rows updated per batch
+            throttle: Seconds to sleep between batches
+            lock_timeout: Lock timeout for the DDL statements
+            progress: Function called after each batch with the number of
+                      backfilled rows and the estimated number of rows in the table
+
+        Returns: Number of backfilled rows
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError("Online migrations only supported for POSTGRES")
+        if new_column.is_primary or new_column.ctype.upper() == "SERIAL":
+            raise NotImplementedError(
+                "Adding primary key or SERIAL columns requires a table rewrite"
+            )
+
+        default = new_column.typed_default
+        if isinstance(default, str) and default.upper() == "NULL":
+            default = None
+        if backfill is None and default is not None:
+            backfill = ValueWrapper(default).get_sql()
+        if not new_column.is_nullable and backfill is None:
+            raise ValueError(
+                "Column %s is not nullable. Set a default or pass backfill"
+                % new_column.name
+            )
+
+        table_sql = self._get_table(table_name, schema).get_sql(quote_char='"')
+        column_sql = f'"{new_column.name}"'
+
+        logger.info("Adding column %s to %s", new_column.name, table_name)
+        self._exec_ddl(
+            f"ALTER TABLE {table_sql} ADD COLUMN IF NOT EXISTS {column_sql} "
+            f"{new_column.ctype}",
+            lock_timeout,
+        )
+
+        n_backfilled = 0
+        if backfill is not None:
+            if key_column is None:
+                with self.engine.connect() as connection:
+                    pk_columns = inspect(connection).get_pk_constraint(
+                        table_name, schema
+                    )["constrained_columns"]
+                if len(pk_columns) != 1:
+                    raise ValueError(
+                        "Table %s has no single column primary key. Pass key_column"
+                        % table_name
+                    )
+                key_column = pk_columns[0]
+
+            n_backfilled = self._backfill_column(
+                table_sql,
+                column_sql,
+                f'"{key_column}"',
+                backfill,
+                batch_size,
+                throttle,
+                progress,
+            )
+            if default is not None:
+                self._exec_ddl(
+                    f"ALTER TABLE {table_sql} ALTER COLUMN {column_sql} SET DEFAULT "
+                    f"{ValueWrapper(default).get_sql()}",
+                    lock_timeout,
+                )
+            # Catch rows that were inserted w/o value during the backfill
+            n_backfilled += self._backfill_column(
+                table_sql,
+                column_sql,
+                f'"{key_column}"',
+                backfill,
+                batch_size,
+                throttle,
+                None,
+            )
+
+        if not new_column.is_nullable:
+            logger.info("Setting %s NOT NULL", new_column.name)
+            constraint_sql = f'"{table_name}_{new_column.name}_not_null"'
+            self._exec_ddl(
+                f"ALTER TABLE {table_sql} ADD CONSTRAINT {constraint_sql} "
+                f"CHECK ({column_sql} IS NOT NULL) NOT VALID",
+                lock_timeout,
+            )
+            # Only requires a SHARE UPDATE EXCLUSIVE lock -> Table stays writable
+            self._exec_ddl(
+                f"ALTER TABLE {table_sql} VALIDATE CONSTRAINT {constraint_sql}", None
+            )
+            # Uses the valid constraint instead of scanning the table
+            self._exec_ddl(
+                f"ALTER TABLE {table_sql} ALTER COLUMN {column_sql} SET NOT NULL",
+                lock_timeout,
+            )
+            self._exec_ddl(
+                f"ALTER TABLE {table_sql} DROP CONSTRAINT {constraint_sql}",
+                lock_timeout,
+            )
+
+        if new_column.is_unique:
+            index_name = f"{table_name}_{new_column.name}_key"[:63]
+            logger.info("Adding unique constraint on %s", new_column.name)
+            with self.engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+                    text(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+                        f'"{index_name}" ON {table_sql} ({column_sql})'
+                    )
+                )
+            self._exec_ddl(
+                f'ALTER TABLE {table_sql} ADD CONSTRAINT "{index_name}" '
+                f'UNIQUE USING INDEX "{index_name}"',
+                lock_timeout,
+            )
+
+        return n_backfilled
+
+    def _exec_ddl(
+        self, statement: str, lock_timeout: Optional[str], retries: int = 5
+    ) -> None:
+        """
+        Execute a DDL statement with a lock_timeout. If the lock could not be
+        acquired the statement is retried with exponential backoff.
+        """
+        for attempt in range(retries + 1):
+            logger.debug(statement)
+            try:
+                with self.engine.connect() as connection:
+                    if lock_timeout is not None:
+                        connection.execute(
+                            text(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+                        )
+                    connection.execute(text(statement))
+                    connection.commit()
+                return
+            except OperationalError as e:
+                if (
+                    getattr(e.orig, "pgcode", None) != "55P03"  # lock_not_available
+                    or attempt == retries
+                ):
+                    raise
+                logger.warning("Could not acquire lock. Retrying (%s)", attempt + 1)
+                time.sleep(2**attempt)
+
+    def _backfill_column(
+        self,
+        table_sql: str,
+        column_sql: str,
+        key_sql: str,
+        backfill: str,
+        batch_size: int,
+        throttle: float,
+        progress: Optional[Callable[[int, int], None]],
+    ) -> int:
+        """
+        Fill NULL values of a column in batches using keyset pagination. Each
+        batch is committed separately.
+
+        Returns: Number of updated rows
+        """
+        with self.engine.connect() as connection:
+            n_total = connection.execute(
+                text(
+                    "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class "
+                    "WHERE oid = CAST(:table AS regclass)"
+                ),
+                {"table": table_sql},
+            ).scalar()
+
+        n_done = 0
+        last_key = None
+        while True:
+            key_condition = "" if last_key is None else f"AND {key_sql} > :last_key"
+            statement = text(
+                f"""
+                WITH batch AS (
+                    SELECT {key_sql} FROM {table_sql}
+                    WHERE {column_sql} IS NULL {key_condition}
+                    ORDER BY {key_sql}
+                    LIMIT :batch_size
+                )
+                UPDATE {table_sql} AS t SET {column_sql} = {backfill}
+                FROM batch WHERE t.{key_sql} = batch.{key_sql}
+                RETURNING t.{key_sql}
+                """
+            )
+            params: Dict[str, Any] = {"batch_size": batch_size}
+            if last_key is not None:
+                params["last_key"] = last_key
+            with self.engine.connect() as connection:
+                updated_keys = [r[0] for r in connection.execute(statement, params)]
+                connection.commit()
+
+            if not updated_keys:
+                break
+            n_done += len(updated_keys)
+            last_key = max(updated_keys)
+            logger.info("Backfilled %s/~%s rows", n_done, n_total)
+            if progress is not None:
+                progress(n_done, n_total)
+            if throttle > 0:
+                time.sleep(throttle)
+
+        return n_done
+
+    def apply_retention(
+        self,
+        table_info: TableSetting,
+        schema: Optional[str] = None,
+        today: Optional[date] = None,
+        lock_timeout: str = "5s",
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """
+        Remove the rows of a table that are older than the retention defined in
+        the settings of the table. Depending on the action, expired rows are deleted
+        or moved to the archive table/file.
+
+        Rows are removed in batches of batch_size, each in its own transaction, so
+        no long locks are held and autovacuum can reclaim the space between
+        batches. If the table is RANGE partitioned on the retention column, fully
+        expired partitions are detached (and dropped) instead of deleting their
+        rows. This is not done when archiving to a file.
+
+        Args:
+            table_info: Settings of the table. Requires retention to be set
+            schema: Explicitly pass a schema if it is not defined in the db
+            today: Reference date for the retention. Defaults to today
+            lock_timeout: lock_timeout of the DETACH PARTITION statements
+            progress: Optional callable called with the number of removed rows
+                      after each batch
+
+        Returns: Number of removed rows
+        """
+        if self.backend != Backend.POSTGRES:
+            raise NotImplementedError("Retention only supported for POSTGRES")
+        retention = table_info.retention
+        if retention is None:
+            raise ValueError("No retention defined for table %s" % table_info.name)
+
+        cutoff = retention.cutoff(date.today() if today is None else today)
+        table_sql = self._get_table(table_info.name, schema).get_sql(quote_char='"')
+        column_sql = f'"{retention.column}"'
+        archive_sql = None
+        if retention.action == "archive" and retention.archive_table is not None:
+            archive_sql = self._get_table(retention.archive_table, schema).get_sql(
+                quote_char='"'
+            )
+            with self.engine.connect() as connection:
+                connection.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {archive_sql} "
+                        f"(LIKE {table_sql} INCLUDING DEFAULTS)"
+                    )
+                )
+                connection.commit()
+
+        logger.info(
+            "Removing rows of %s with %s before %s",
+            table_info.name,
+            retention.column,
+            cutoff,
+        )
+        n_removed = 0
+        partition = table_info.partition
+        if (
+            partition is not None
+            and partition.is_range
+            and partition.column == retention.column
+            and retention.archive_file is None
+        ):
+            n_removed += self._remove_expired_partitions(
+                table_info, table_sql, cutoff, archive_sql, lock_timeout, schema
+            )
+            if progress is not None:
+                progress(n_removed)
+
+        # Tuples are identified by tableoid and ctid, so this works for partitioned
+        # tables as well
+        delete_sql = f"""
+            DELETE FROM {table_sql}
+            WHERE (tableoid, ctid) IN (
+                SELECT tableoid, ctid FROM {table_sql}
+                WHERE {column_sql} < :cutoff
+                LIMIT :batch_size
+            )
         """
-        raise NotImplementedError
+        if archive_sql is not None:
+            statement = text(
+                f"WITH expired AS ({delete_sql} RETURNING *) "
+                f"INSERT INTO {archive_sql} SELECT * FROM expired"
+            )
+        elif retention.archive_file is not None:
+            statement = text(f"{delete_sql} RETURNING *")
+        else:
+            statement = text(delete_sql)
+
+        params = {"cutoff": cutoff, "batch_size": retention.batch_size}
+        while True:
+            with self.engine.connect() as connection:
+                result = connection.execute(statement, params)
+                if retention.archive_file is not None:
+                    rows = result.fetchall()
+                    n_batch = len(rows)
+                    if rows:
+                        self._archive_rows_to_file(
+                            retention.archive_file, list(result.keys()), rows
+                        )
+                else:
+                    n_batch = result.rowcount
+                connection.commit()
+
+            if n_batch == 0:
+                break
+            n_removed += n_batch
+            logger.debug("Removed %s rows from %s", n_removed, table_info.name)
+            if progress is not None:
+                progress(n_removed)
+            if retention.throttle > 0:
+                time.sleep(retention.throttle)
+
+        logger.info("Removed %s rows from %s", n_removed, table_info.name)
+        return n_removed
+
+    def _remove_expired_partitions(
+        self,
+        table_info: TableSetting,
+        table_sql: str,
+        cutoff: date,
+        archive_sql: Optional[str],
+        lock_timeout: str,
+        schema: Optional[str],
+    ) -> int:
+        """
+        Detach and drop all RANGE partitions that only contain expired rows. If
+        archive_sql is passed, the rows of the partitions are copied there first.
+
+        Returns: Number of removed rows
+        """
+        partition = table_info.partition
+        assert partition is not None
+        with self.engine.connect() as connection:
+            children = [
+                r[0]
+                for r in connection.execute(
+                    text(
+                        "SELECT c.relname FROM pg_inherits i "
+                        "JOIN pg_class c ON c.oid = i.inhrelid "
+                        "WHERE i.inhparent = CAST(:table AS regclass)"
+                    ),
+                    {"table": table_sql},
+                )
+            ]
+
+        n_removed = 0
+        prefix = f"{table_info.name}_p"
+        for child in sorted(children):
+            if not child.startswith(prefix):
+                continue
+            start = partition.period_from_suffix(child[len(prefix) :])
+            if start is None or partition.next_period_start(start) > cutoff:
+                continue
+            child_sql = self._get_table(child, schema).get_sql(quote_char='"')
+            logger.info("Partition %s is expired", child)
+            self._exec_ddl(
+                f"ALTER TABLE {table_sql} DETACH PARTITION {child_sql}", lock_timeout
+            )
+            # The partition is no longer visible in the table. Only the detached
+            # table is accessed from here on
+            with self.engine.connect() as connection:
+                if archive_sql is not None:
+                    n_removed += connection.execute(
+                        text(f"INSERT INTO {archive_sql} SELECT * FROM {child_sql}")
+                    ).rowcount
+                else:
+                    n_removed += connection.execute(
+                        text(f"SELECT count(*) FROM {child_sql}")
+                    ).scalar()
+                connection.execute(text(f"DROP TABLE {child_sql}"))
+                connection.commit()
+
+        return n_removed
+
+    @staticmethod
+    def _archive_rows_to_file(
+        file_name: str, columns: List[str], rows: Sequence[Sequence[Any]]
+    ) -> None:
+        """Append rows to a csv file (gzip compressed if it ends with .gz)"""
+        is_new = not os.path.exists(file_name)
+        opener: Callable = gzip.open if file_name.endswith(".gz") else open
+        with opener(file_name, "at", newline="") as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(columns)
+            writer.writerows(rows)
@@ -12,3 +12,7 @@ class InvalidDataException(Exception):
 
 class BinaryDataException(Exception):
     pass
+
+
+class ProvisioningException(Exception):
+    pass
@@ -0,0 +1,387 @@
+"""
+Compare the tables defined in the config with the live database and plan the
+migration steps required to bring the database in line with the config.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from pypika.terms import ValueWrapper
+from sqlalchemy import inspect, text
+from sqlalchemy.engine.reflection import Inspector
+
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.model import (
+    ColumnSetting,
+    TableSetting,
+    get_creation_order,
+    get_foreign_key_settings,
+)
+
+logger = logging.getLogger(__name__)
+
+_type_aliases = {
+    "int": "integer",
+    "int4": "integer",
+    "integer": "integer",
+    "serial": "integer",
+    "serial4": "integer",
+    "bigint": "bigint",
+    "int8": "bigint",
+    "bigserial": "bigint",
+    "smallint": "smallint",
+    "int2": "smallint",
+    "float": "double precision",
+    "float8": "double precision",
+    "double": "double precision",
+    "double precision": "double precision",
+    "real": "real",
+    "float4": "real",
+    "varchar": "character varying",
+    "character varying": "character varying",
+    "char": "character",
+    "character": "character",
+    "text": "text",
+    "bytea": "bytea",
+    "date": "date",
+    "time": "time without time zone",
+    "time without time zone": "time without time zone",
+    "timetz": "time with time zone",
+    "time with time zone": "time with time zone",
+    "timestamp": "timestamp without time zone",
+    "timestamp without time zone": "timestamp without time zone",
+    "timestamptz": "timestamp with time zone",
+    "timestamp with time zone": "timestamp with time zone",
+    "datetime": "timestamp without time zone",
+    "interval": "interval",
+    "bool": "boolean",
+    "boolean": "boolean",
+    "json": "json",
+    "jsonb": "jsonb",
+    "uuid": "uuid",
+    "numeric": "numeric",
+    "decimal": "numeric",
+}
+
+
+def normalize_type(ctype: str, length: Optional[int] = None) -> str:
+    """
+    Normalize a type as used in the config or as reported by the database so they
+    can be compared. Types w/o alias are returned in lower case.
+
+    Args:
+        ctype: Type name. Can contain a length, e.g. VARCHAR(20)
+        length: Optional length of the type (e.g. character_maximum_length)
+
+    Returns: Normalized type
+    """
+    match = re.fullmatch(r"\s*([^(]+?)\s*(?:\((.*)\))?\s*", ctype.lower())
+    if match is None:
+        return ctype.lower()
+    base_type, type_args = match.groups()
+    normalized = _type_aliases.get(base_type, base_type)
+    if normalized == "numeric":
+        # Precision and scale are not compared
+        return normalized
+    if type_args is None and length is not None:
+        type_args = str(length)
+    if type_args is not None and normalized in ["character varying", "character"]:
+        return f"{normalized}({type_args.replace(' ', '')})"
+
+    return normalized
+
+
+@dataclass
+class LiveTable:
+    """Reflected state of a table in the database"""
+
+    name: str
+    columns: Dict[str, str] = field(default_factory=dict)
+    indexes: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class SchemaDiff:
+    """Differences between the config and the database"""
+
+    missing_tables: List[str] = field(default_factory=list)
+    missing_columns: Dict[str, List[str]] = field(default_factory=dict)
+    extra_columns: Dict[str, List[str]] = field(default_factory=dict)
+    type_changes: Dict[str, List[Tuple[str, str, str]]] = field(default_factory=dict)
+    missing_indexes: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def is_empty(self) -> bool:
+        """True if the config matches the database (extra columns are ignored)"""
+        return not (
+            self.missing_tables
+            or self.missing_columns
+            or self.type_changes
+            or self.missing_indexes
+        )
+
+
+@dataclass
+class MigrationStep:
+    """One step of a migration plan"""
+
+    description: str
+    statements: List[str]
+
+
+class SchemaPlanner:
+    """
+    Planner comparing TableSettings (e.g. OrganizerConfig.tables) with the live
+    database. The database schema is reflected once with a few catalog queries
+    (independent of the number of tables) and cached.
+    """
+
+    def __init__(self, db: DatabaseConnection, schema: Optional[str] = None):
+        """
+        Args:
+            db: Connection to the database
+            schema: Explicitly pass a schema if it is not defined in the db
+        """
+        self.db = db
+        self.schema = schema
+        self._live_tables: Optional[Dict[str, LiveTable]] = None
+
+    def reflect(self, refresh: bool = False) -> Dict[str, LiveTable]:
+        """
+        Reflect tables, columns, and indexes of the schema. The result is cached.
+
+        Args:
+            refresh: Discard the cached result
+
+        Returns: Table name -> Reflected table
+        """
+        if self._live_tables is not None and not refresh:
+            return self._live_tables
+
+        schema_func = (
+            "current_schema()" if self.db.backend == Backend.POSTGRES else "DATABASE()"
+        )
+        live_tables: Dict[str, LiveTable] = {}
+        with self.db.engine.connect() as connection:
+            inspector: Inspector = inspect(connection)
+            for table_name in inspector.get_table_names(self.schema):
+                live_tables[table_name] = LiveTable(table_name)
+
+            columns = connection.execute(
+                text(
+                    f"""
+                    SELECT table_name, column_name, data_type,
+                           character_maximum_length
+                    FROM information_schema.columns
+                    WHERE table_schema = COALESCE(:schema, {schema_func})
+                    ORDER BY table_name, ordinal_position
+                    """
+                ),
+                {"schema": self.schema},
+            )
+            for table_name, column_name, data_type, length in columns:
+                if table_name in live_tables:
+                    live_tables[table_name].columns[column_name] = normalize_type(
+                        data_type, length
+                    )
+
+            if self.db.backend == Backend.POSTGRES:
+                indexes = connection.execute(
+                    text(
+                        f"""
+                        SELECT tablename, indexname FROM pg_indexes
+                        WHERE schemaname = COALESCE(:schema, {schema_func})
+                        """
+                    ),
+                    {"schema": self.schema},
+                )
+                for table_name, index_name in indexes:
+                    if table_name in live_tables:
+                        live_tables[table_name].indexes.add(index_name)
+            else:
+                for table_name, live_table in live_tables.items():
+                    live_table.indexes = {
+                        index["name"]
+                        for index in inspector.get_indexes(table_name, self.schema)
+                    }
+
+        logger.info("Reflected %s tables", len(live_tables))
+        self._live_tables = live_tables
+        return live_tables
+
+    def diff(self, tables: Dict[str, TableSetting]) -> SchemaDiff:
+        """
+        Compare the passed tables with the database.
+
+        Args:
+            tables: Config table name -> TableSetting (e.g. OrganizerConfig.tables)
+
+        Returns: Differences between config and database
+        """
+        live_tables = self.reflect()
+        diff = SchemaDiff()
+        for table in tables.values():
+            if table.name not in live_tables:
+                diff.missing_tables.append(table.name)
+                continue
+            live_table = live_tables[table.name]
+
+            for column in table.columns:
+                if column.name not in live_table.columns:
+                    diff.missing_columns.setdefault(table.name, []).append(column.name)
+                    continue
+                config_type = normalize_type(column.ctype)
+                live_type = live_table.columns[column.name]
+                if config_type != live_type:
+                    diff.type_changes.setdefault(table.name, []).append(
+                        (column.name, live_type, config_type)
+                    )
+
+            config_columns = [c.name for c in table.columns]
+            extra_columns = [c for c in live_table.columns if c not in config_columns]
+            if extra_columns:
+                diff.extra_columns[table.name] = extra_columns
+
+            for index in table.indexes:
+                if index.get_name(table.name) not in live_table.indexes:
+                    diff.missing_indexes.setdefault(table.name, []).append(
+                        index.get_name(table.name)
+                    )
+
+        return diff
+
+    def plan(self, tables: Dict[str, TableSetting]) -> List[MigrationStep]:
+        """
+        Create an ordered migration plan for the differences between the passed
+        tables and the database: Missing tables are created first, then missing
+        columns are added, column types are changed, and missing indexes are
+        created. Extra columns in the database are not dropped.
+
+        Args:
+            tables: Config table name -> TableSetting (e.g. OrganizerConfig.tables)
+
+        Returns: List of migration steps
+
+        Raises:
+            ValueError if a missing column is not nullable and has no default. Add
+            such columns with DatabaseConnection.add_column_to_table and backfill
+        """
+        if self.db.backend != Backend.POSTGRES:
+            raise NotImplementedError("Migration plans are only supported for POSTGRES")
+
+        diff = self.diff(tables)
+        settings = {table.name: table for table in tables.values()}
+        table_sql = {
+            name: self.db._get_table(name, self.schema).get_sql(quote_char='"')
+            for name in settings.keys()
+        }
+        steps: List[MigrationStep] = []
+
+        foreign_key_settings = get_foreign_key_settings(tables)
+        for table_key in get_creation_order(tables):
+            table_name = tables[table_key].name
+            if table_name not in diff.missing_tables:
+                continue
+            steps.append(
+                MigrationStep(
+                    f"Create table {table_name}",
+                    self.db._get_create_table_statements(
+                        settings[table_name], foreign_key_settings, self.schema
+                    ),
+                )
+            )
+
+        for table_name, column_names in diff.missing_columns.items():
+            for column_name in column_names:
+                column = self._get_column(settings[table_name], column_name)
+                if not column.is_nullable and not self._has_default(column):
+                    raise ValueError(
+                        "Column %s of %s is not nullable and has no default. Set a "
+                        "default or add it with add_column_to_table and backfill"
+                        % (column_name, table_name)
+                    )
+                steps.append(
+                    MigrationStep(
+                        f"Add column {column_name} to {table_name}",
+                        [
+                            f"ALTER TABLE {table_sql[table_name]} ADD COLUMN "
+                            f"{self._get_column_definition(column)}"
+                        ],
+                    )
+                )
+
+        for table_name, changes in diff.type_changes.items():
+            for column_name, live_type, config_type in changes:
+                column = self._get_column(settings[table_name], column_name)
+                ctype = self._get_alter_type(column)
+                steps.append(
+                    MigrationStep(
+                        f"Change type of {table_name}.{column_name} from "
+                        f"{live_type} to {config_type}",
+                        [
+                            f"ALTER TABLE {table_sql[table_name]} ALTER COLUMN "
+                            f'"{column_name}" TYPE {ctype} '
+                            f'USING "{column_name}"::{ctype}'
+                        ],
+                    )
+                )
+
+        for table_name, index_names in diff.missing_indexes.items():
+            table = settings[table_name]
+            for index in table.indexes:
+                if index.get_name(table_name) in index_names:
+                    steps.append(
+                        MigrationStep(
+                            f"Create index {index.get_name(table_name)}",
+                            [
+                                self.db._get_create_index_statement(
+                                    table, index, self.schema
+                                )
+                            ],
+                        )
+                    )
+
+        return steps
+
+    @staticmethod
+    def _get_column(table: TableSetting, column_name: str) -> ColumnSetting:
+        return [c for c in table.columns if c.name == column_name][0]
+
+    @staticmethod
+    def _get_alter_type(column: ColumnSetting) -> str:
+        # SERIAL is only a shorthand on creation and can not be used in ALTER
+        return {"SERIAL": "INTEGER", "BIGSERIAL": "BIGINT"}.get(
+            column.ctype.upper(), column.ctype
+        )
+
+    @staticmethod
+    def _has_default(column: ColumnSetting) -> bool:
+        return column.default is not None and str(column.default).upper() != "NULL"
+
+    @classmethod
+    def _get_column_definition(cls, column: ColumnSetting) -> str:
+        definition = f'"{column.name}" {column.ctype}'
+        if cls._has_default(column):
+            definition += " DEFAULT %s" % ValueWrapper(column.typed_default).get_sql()
+        if not column.is_nullable:
+            definition += " NOT NULL"
+        return definition
+
+    def apply(self, plan: List[MigrationStep]) -> None:
+        """
+        Apply the migration plan in one transaction. If a statement fails, all
+        changes are rolled back and the error is raised.
+
+        Args:
+            plan: Migration steps as returned by plan
+        """
+        with self.db.engine.connect() as connection:
+            for step in plan:
+                logger.info("%s", step.description)
+                for statement in step.statements:
+                    logger.debug(statement)
+                    connection.execute(text(statement))
+            connection.commit()
+        # The database changed, so the cached reflection is outdated
+        self._live_tables = None
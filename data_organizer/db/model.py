@@ -1,10 +1,24 @@
+import re
 from dataclasses import make_dataclass
-from typing import Dict, List, Optional, Union
+from datetime import date, datetime, timedelta
+from graphlib import TopologicalSorter
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from pydantic import BaseModel
 
 ColumnConfigType = Dict[str, Union[str, bool]]
 
+# Keys of a table in the config that do not define a column
+table_options = [
+    "name",
+    "rel_table",
+    "rel_table_common_column",
+    "rel_table_common_column_as_foreign_key",
+    "indexes",
+    "partition",
+    "retention",
+]
+
 
 class ColumnSetting(BaseModel):
     """Object holding information on columns"""
@@ -16,6 +30,21 @@ class ColumnSetting(BaseModel):
     is_unique: bool = False
     is_inserted: bool = True
     default: Optional[str] = None
+    compression: Optional[str] = None
+    storage: Optional[str] = None
+    deduplicate: bool = False
+
+    @property
+    def column_storage(self) -> Optional[str]:
+        """
+        Storage of the column. Compressed columns default to EXTERNAL so the
+        already compressed data is not compressed again by TOAST
+        """
+        if self.storage is not None:
+            return self.storage.upper()
+        if self.compression is not None:
+            return "EXTERNAL"
+        return None
 
     @property
     def typed_default(self):
@@ -46,11 +75,156 @@ class ColumnSetting(BaseModel):
             return base_type
 
 
+class IndexSetting(BaseModel):
+    """
+    Object holding the information on an index. Expressions in columns (e.g.
+    'lower("name")') and the where condition are inserted verbatim into the
+    statement, so column names in them have to be quoted like in plain SQL if they
+    are not lower case.
+    """
+
+    columns: List[str]
+    name: Optional[str] = None
+    method: str = "btree"
+    is_unique: bool = False
+    where: Optional[str] = None
+
+    @staticmethod
+    def is_expression(column: str) -> bool:
+        """Elements of columns that are not plain column names are expressions"""
+        return re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", column) is None
+
+    def get_name(self, table_name: str) -> str:
+        """
+        Name of the index. If no name is set, it is generated from the table name
+        and the columns (truncated to the maximum identifier length of Postgres).
+        """
+        if self.name is not None:
+            return self.name
+        column_part = "_".join(
+            re.sub(r"\W+", "_", column).strip("_") for column in self.columns
+        )
+        return f"{table_name}_{column_part}_idx"[:63]
+
+
+class PartitionSetting(BaseModel):
+    """Object holding the information on the partitioning of a table"""
+
+    column: str
+    method: str = "RANGE"
+    interval: str = "month"
+    premake: int = 3
+    start: Optional[date] = None
+    values: Dict[str, List[Any]] = {}
+    default_partition: bool = False
+
+    @property
+    def is_range(self) -> bool:
+        return self.method.upper() == "RANGE"
+
+    @property
+    def suffix_format(self) -> str:
+        """Date format of the name suffix of RANGE partitions"""
+        return {"day": "%Y_%m_%d", "month": "%Y_%m", "year": "%Y"}[self.interval]
+
+    def period_start(self, day: date) -> date:
+        """Start of the RANGE partition containing the passed day"""
+        if self.interval == "day":
+            return day
+        elif self.interval == "month":
+            return day.replace(day=1)
+        elif self.interval == "year":
+            return date(day.year, 1, 1)
+        else:
+            raise NotImplementedError("Interval %s not supported" % self.interval)
+
+    def next_period_start(self, start: date) -> date:
+        """Start of the RANGE partition following the one starting at start"""
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        elif self.interval == "month":
+            return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        elif self.interval == "year":
+            return date(start.year + 1, 1, 1)
+        else:
+            raise NotImplementedError("Interval %s not supported" % self.interval)
+
+    def period_suffix(self, start: date) -> str:
+        """Suffix of the name of the RANGE partition starting at start"""
+        return start.strftime(self.suffix_format)
+
+    def period_from_suffix(self, suffix: str) -> Optional[date]:
+        """
+        Start of the RANGE partition with the passed name suffix. None if the
+        suffix is not one of a RANGE partition (e.g. the default partition)
+        """
+        try:
+            return datetime.strptime(suffix, self.suffix_format).date()
+        except ValueError:
+            return None
+
+    def get_range_partitions(
+        self, first_day: date, last_day: date
+    ) -> List[Tuple[str, date, date]]:
+        """
+        Get the RANGE partitions covering the passed interval
+
+        Args:
+            first_day: First day that needs to be covered
+            last_day: Last day that needs to be covered
+
+        Returns: List of partition suffix, lower bound (inclusive), and upper bound
+                 (exclusive)
+        """
+        partitions = []
+        start = self.period_start(first_day)
+        while start <= last_day:
+            end = self.next_period_start(start)
+            partitions.append((self.period_suffix(start), start, end))
+            start = end
+
+        return partitions
+
+    def get_premade_range_partitions(
+        self, reference: date, ahead: Optional[int] = None
+    ) -> List[Tuple[str, date, date]]:
+        """
+        Get the RANGE partitions from start (or the period of the reference) to
+        ahead (defaults to premake) periods after the period of the reference.
+        """
+        ahead = self.premake if ahead is None else ahead
+        last_day = self.period_start(reference)
+        for _ in range(ahead):
+            last_day = self.next_period_start(last_day)
+        first_day = reference if self.start is None else min(self.start, reference)
+
+        return self.get_range_partitions(first_day, last_day)
+
+
+class RetentionSetting(BaseModel):
+    """Object holding the information on the retention of rows in a table"""
+
+    column: str
+    keep_days: int
+    action: str = "delete"
+    archive_table: Optional[str] = None
+    archive_file: Optional[str] = None
+    batch_size: int = 5000
+    throttle: float = 0.0
+
+    def cutoff(self, today: date) -> date:
+        """Rows with a value in column before the cutoff are expired"""
+        return today - timedelta(days=self.keep_days)
+
+
 class TableSetting(BaseModel):
     """Object holding the information for a table"""
 
     name: str
     columns: List[ColumnSetting]
+    indexes: List[IndexSetting] = []
+    partition: Optional[PartitionSetting] = None
+    retention: Optional[RetentionSetting] = None
     rel_table: Optional[str] = None
     rel_table_common_column: Optional[str] = None
     rel_table_common_column_as_foreign_key: bool = False
@@ -70,6 +244,15 @@ class TableSetting(BaseModel):
         return make_dataclass(cls_name=self.name, fields=fields)
 
 
+class ViewSetting(BaseModel):
+    """Object holding the information for a materialized view"""
+
+    name: str
+    query: str
+    unique_columns: List[str]
+    source_tables: List[str] = []
+
+
 def get_table_setting_from_dict(
     data: Dict[str, Union[str, ColumnConfigType]]
 ) -> TableSetting:
@@ -87,7 +270,7 @@ def get_table_setting_from_dict(
     column_data: Dict[str, ColumnConfigType] = {
         key: item  # type: ignore
         for key, item in data.items()
-        if isinstance(data[key], dict)
+        if isinstance(data[key], dict) and key not in table_options
     }
 
     return TableSetting(
@@ -98,7 +281,64 @@ def get_table_setting_from_dict(
             if "rel_table_common_column" in data.keys()
             else None
         ),
+        rel_table_common_column_as_foreign_key=data.get(
+            "rel_table_common_column_as_foreign_key", False  # type: ignore
+        ),
         columns=[
             ColumnSetting(name=key, **items) for key, items in column_data.items()
         ],
+        indexes=[
+            IndexSetting(**index) for index in data.get("indexes", [])  # type: ignore
+        ],
+        partition=(
+            PartitionSetting(**data["partition"])  # type: ignore
+            if "partition" in data.keys()
+            else None
+        ),
+        retention=(
+            RetentionSetting(**data["retention"])  # type: ignore
+            if "retention" in data.keys()
+            else None
+        ),
     )
+
+
+def get_creation_order(tables: Dict[str, TableSetting]) -> List[str]:
+    """
+    Order the tables so that each main table is created before its rel_table.
+
+    Args:
+        tables: Config table name -> TableSetting (e.g. OrganizerConfig.tables)
+
+    Returns: Config table names in creation order
+
+    Raises:
+        graphlib.CycleError if the rel_table relations contain a cycle
+    """
+    dependencies: Dict[str, List[str]] = {name: [] for name in tables.keys()}
+    for name, table in tables.items():
+        if table.rel_table is not None and table.rel_table in tables:
+            dependencies[table.rel_table].append(name)
+
+    return list(TopologicalSorter(dependencies).static_order())
+
+
+def get_foreign_key_settings(
+    tables: Dict[str, TableSetting]
+) -> Dict[str, TableSetting]:
+    """
+    Get the foreign_key_settings for create_table_from_table_info from the
+    rel_table relations with rel_table_common_column_as_foreign_key set.
+
+    Args:
+        tables: Config table name -> TableSetting (e.g. OrganizerConfig.tables)
+
+    Returns: Name of the referencing table -> Settings of the referenced table
+    """
+    return {
+        tables[table.rel_table].name: table
+        for table in tables.values()
+        if table.rel_table is not None
+        and table.rel_table in tables
+        and table.rel_table_common_column_as_foreign_key
+    }
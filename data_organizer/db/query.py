@@ -0,0 +1,17 @@
+"""
+Helpers for building pypika queries.
+"""
+from typing import Any
+
+from pypika.terms import Criterion
+
+
+class SqlCriterion(Criterion):
+    """Condition passed as SQL string (e.g. a --where option of the CLIs)"""
+
+    def __init__(self, sql: str):
+        super().__init__()
+        self.sql = sql
+
+    def get_sql(self, **kwargs: Any) -> str:
+        return f"({self.sql})"
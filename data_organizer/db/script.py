@@ -0,0 +1,117 @@
+"""
+Utilities for executing SQL scripts with multiple statements.
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+_DOLLAR_TAG = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+
+
+@dataclass
+class StatementTiming:
+    """Execution time of one or more statements sent in one round trip"""
+
+    statement: str
+    n_statements: int
+    seconds: float
+
+
+def split_sql_statements(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Split SQL into statements on semicolons. Semicolons in string literals
+    (including escape strings like E'it\\'s'), quoted identifiers, dollar-quoted
+    strings (e.g. function bodies), and comments are ignored. Comments are removed from the returned statements. Lines are
+    processed one at a time, so an open file object can be passed to split large
+    scripts without reading them into memory completely.
+
+    Args:
+        lines: Iterable of SQL lines (e.g. an open file)
+
+    Returns: Generator yielding the stripped statements without the semicolon
+    """
+    buffer: List[str] = []
+    # Closing sequence of the currently open quote/comment
+    closing: Optional[str] = None
+    # The open literal is an escape string (backslashes escape the next char)
+    escape_string = False
+    for line in lines:
+        pos = 0
+        while pos < len(line):
+            if closing is not None:
+                if escape_string:
+                    end = _find_escape_string_end(line, pos)
+                else:
+                    end = line.find(closing, pos)
+                if end == -1:
+                    if closing != "*/":
+                        buffer.append(line[pos:])
+                    pos = len(line)
+                    continue
+                if closing in ("'", '"') and line.startswith(closing * 2, end):
+                    # Escaped quote ('' or "") -> Still in the literal
+                    buffer.append(line[pos : end + 2])
+                    pos = end + 2
+                    continue
+                if closing != "*/":
+                    buffer.append(line[pos : end + len(closing)])
+                pos = end + len(closing)
+                closing = None
+                escape_string = False
+                continue
+
+            char = line[pos]
+            if line.startswith("--", pos):
+                buffer.append("\n")
+                pos = len(line)
+            elif line.startswith("/*", pos):
+                closing = "*/"
+                pos += 2
+            elif char in ("'", '"'):
+                closing = char
+                escape_string = char == "'" and _is_escape_string_prefix(line, pos)
+                buffer.append(char)
+                pos += 1
+            elif char == "$" and _DOLLAR_TAG.match(line, pos):
+                tag = _DOLLAR_TAG.match(line, pos).group(0)  # type: ignore
+                closing = tag
+                buffer.append(tag)
+                pos += len(tag)
+            elif char == ";":
+                statement = "".join(buffer).strip()
+                if statement:
+                    yield statement
+                buffer = []
+                pos += 1
+            else:
+                buffer.append(char)
+                pos += 1
+
+    statement = "".join(buffer).strip()
+    if statement:
+        yield statement
+
+
+def _is_escape_string_prefix(line: str, pos: int) -> bool:
+    """Check if the quote at pos opens a Postgres escape string (E'...')"""
+    if pos == 0 or line[pos - 1] not in "eE":
+        return False
+    # The E has to be a separate token and not the end of an identifier
+    return pos == 1 or not (line[pos - 2].isalnum() or line[pos - 2] in "_$")
+
+
+def _find_escape_string_end(line: str, pos: int) -> int:
+    """
+    Position of the quote closing an escape string in line (starting at pos) or -1
+    if the string does not end in this line
+    """
+    while pos < len(line):
+        if line[pos] == "\\":
+            pos += 2
+        elif line[pos] == "'" and line.startswith("''", pos):
+            pos += 2
+        elif line[pos] == "'":
+            return pos
+        else:
+            pos += 1
+    return -1
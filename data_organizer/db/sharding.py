@@ -0,0 +1,305 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum, auto
+from functools import reduce
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+import pandas as pd
+from pypika.queries import QueryBuilder
+from sqlalchemy.sql import ClauseElement
+
+from data_organizer.config import OrganizerConfig
+from data_organizer.db.connection import DatabaseConnection
+from data_organizer.db.exceptions import QueryReturnedNoData
+from data_organizer.db.model import TableSetting
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+QueryType = Union[str, ClauseElement, QueryBuilder]
+RowType = Tuple[Any, ...]
+
+
+class MergeStrategy(Enum):
+    CONCAT = auto()
+    ORDERED = auto()
+    REDUCE = auto()
+
+
+class ShardedDatabaseConnection:
+    """
+    Wrapper for multiple databases with the same tables (e.g. one database per
+    region). Queries are executed on all shards concurrently and the results are
+    merged. Inserted rows are routed to a shard by a key function.
+    """
+
+    def __init__(
+        self,
+        shards: Dict[str, DatabaseConnection],
+        shard_key: Optional[Callable[[List[Any]], str]] = None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            shards: Shard name -> Connection to the shard
+            shard_key: Function returning the shard name for a row that is inserted
+            max_workers: Number of threads used for the fan-out. Defaults to the
+                         number of shards
+        """
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards = shards
+        self.shard_key = shard_key
+        self.max_workers = max_workers if max_workers is not None else len(shards)
+
+    @classmethod
+    def from_config(
+        cls,
+        config: OrganizerConfig,
+        shard_key: Optional[Callable[[List[Any]], str]] = None,
+        name: str = "DataOrganizer",
+    ) -> "ShardedDatabaseConnection":
+        """
+        Create the connections from the shards section of the config. Each shard
+        overwrites the settings in the db section. E.g.
+
+            [shards.eu]
+            host="db-eu.local"
+            [shards.us]
+            host="db-us.local"
+
+        Args:
+            config: Config with db and shards section
+            shard_key: Function returning the shard name for a row that is inserted
+            name: Application name set on the connections
+
+        Returns: Connection to all shards
+        """
+        shard_settings = config.settings.get("shards")
+        if not shard_settings:
+            raise ValueError("No shards defined in the config")
+
+        db_settings = config.settings.db.to_dict()
+        shards = {}
+        for shard_name, overwrites in shard_settings.items():
+            shards[shard_name] = DatabaseConnection(
+                **{**db_settings, **overwrites.to_dict()},
+                name=f"{name}-{shard_name}",
+            )
+
+        return cls(shards, shard_key=shard_key)
+
+    def close(self) -> None:
+        """Close the connections to all shards"""
+        for db in self.shards.values():
+            db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _fan_out(
+        self,
+        func: Callable[[str, DatabaseConnection], T],
+        shard_names: Optional[List[str]] = None,
+    ) -> Dict[str, T]:
+        """
+        Run the passed function with the connection of each shard concurrently
+
+        Args:
+            func: Function called with the name and connection of each shard
+            shard_names: Optional subset of shards. Defaults to all shards
+
+        Returns: Shard name -> Return value of the function
+        """
+        if shard_names is None:
+            shard_names = list(self.shards.keys())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                shard_name: executor.submit(func, shard_name, self.shards[shard_name])
+                for shard_name in shard_names
+            }
+            return {
+                shard_name: future.result() for shard_name, future in futures.items()
+            }
+
+    def query_inc_keys(
+        self,
+        query: QueryType,
+        merge: MergeStrategy = MergeStrategy.CONCAT,
+        order_key: Optional[Callable[[RowType], Any]] = None,
+        reverse: bool = False,
+        reducer: Optional[Callable[[RowType, RowType], RowType]] = None,
+        group_key: Optional[Callable[[RowType], Any]] = None,
+        use_primary: bool = False,
+    ) -> Tuple[List[RowType], List[str]]:
+        """
+        Execute the passed query on all shards and merge the results.
+
+        Args:
+            query: Valid SQL queries as str or pypika.QueryBuilder
+            merge: Strategy used to merge the results of the shards.
+                   CONCAT - Results are concatenated in the order of the shards
+                   ORDERED - Results are merged by order_key. The results of each
+                             shard need to be sorted by the same key (ORDER BY)
+                   REDUCE - Rows are combined with the reducer function. If
+                            group_key is passed, rows are combined per group
+            order_key: Key of the rows used for the ORDERED merge
+            reverse: Set to True if the shard results are sorted descending
+            reducer: Function combining two rows used for the REDUCE merge
+            group_key: Key of the rows used to group rows for the REDUCE merge
+            use_primary: Run the query on the primary of each shard
+
+        Returns: List of merged results and list of column names
+        """
+        if merge == MergeStrategy.ORDERED and order_key is None:
+            raise ValueError("order_key is required for the ORDERED merge")
+        if merge == MergeStrategy.REDUCE and reducer is None:
+            raise ValueError("reducer is required for the REDUCE merge")
+
+        def _query(_: str, db: DatabaseConnection):
+            try:
+                return db.query_inc_keys(query, use_primary=use_primary)
+            except QueryReturnedNoData:
+                return None
+
+        shard_results = [r for r in self._fan_out(_query).values() if r is not None]
+        if not shard_results:
+            raise QueryReturnedNoData
+        keys = list(shard_results[0][1])
+        datas = [data for data, _ in shard_results]
+
+        if merge == MergeStrategy.CONCAT:
+            merged = [row for data in datas for row in data]
+        elif merge == MergeStrategy.ORDERED:
+            merged = list(heapq.merge(*datas, key=order_key, reverse=reverse))
+        else:
+            merged = self._reduce(datas, reducer, group_key)  # type: ignore
+
+        return merged, keys
+
+    @staticmethod
+    def _reduce(
+        datas: List[List[RowType]],
+        reducer: Callable[[RowType, RowType], RowType],
+        group_key: Optional[Callable[[RowType], Any]],
+    ) -> List[RowType]:
+        rows = [row for data in datas for row in data]
+        if group_key is None:
+            return [reduce(reducer, rows)]
+
+        groups: Dict[Any, RowType] = {}
+        for row in rows:
+            key = group_key(row)
+            groups[key] = reducer(groups[key], row) if key in groups else row
+
+        return list(groups.values())
+
+    def query(self, query: QueryType, **kwargs) -> List[RowType]:
+        """
+        Execute the passed query on all shards and merge the results. See
+        query_inc_keys for the supported keyword arguments.
+
+        Returns: List of merged results
+        """
+        data, _ = self.query_inc_keys(query, **kwargs)
+        return data
+
+    def query_to_df(
+        self,
+        sql: QueryType,
+        shard_column: Optional[str] = None,
+        use_primary: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Execute the passed query on all shards and concatenate the results.
+
+        Args:
+            sql: Valid SQL query
+            shard_column: If passed, a column with this name containing the shard
+                          name is added
+            use_primary: Run the query on the primary of each shard
+
+        Returns: Concatenated results of all shards
+        """
+
+        def _query(_: str, db: DatabaseConnection):
+            try:
+                return db.query_to_df(sql, use_primary=use_primary)
+            except QueryReturnedNoData:
+                return None
+
+        dfs = []
+        for shard_name, data in self._fan_out(_query).items():
+            if data is None:
+                continue
+            if shard_column is not None:
+                data[shard_column] = shard_name
+            dfs.append(data)
+
+        if not dfs:
+            raise QueryReturnedNoData
+
+        return pd.concat(dfs, ignore_index=True)
+
+    def insert(
+        self,
+        table: TableSetting,
+        datas: List[List[Any]],
+        shard_key: Optional[Callable[[List[Any]], str]] = None,
+        schema: Optional[str] = None,
+    ) -> Dict[str, Tuple[bool, Optional[str]]]:
+        """
+        Insert the passed data. Each row is routed to the shard returned by the
+        shard_key function.
+
+        Args:
+            table: TableSetting object defining the table data is inserted into
+            datas: Data to be inserted
+            shard_key: Function returning the shard name for a row. Defaults to the
+                       shard_key passed on init
+            schema: Explicitly pass a schema if it is not defined in the db
+
+        Returns: Shard name -> Return value of DatabaseConnection.insert for all
+                 shards that received data
+        """
+        shard_key = shard_key if shard_key is not None else self.shard_key
+        if shard_key is None:
+            raise ValueError("A shard_key is required for inserting data")
+
+        shard_datas: Dict[str, List[List[Any]]] = {}
+        for data in datas:
+            shard_name = shard_key(data)
+            if shard_name not in self.shards:
+                raise KeyError("Row routed to unknown shard %s" % shard_name)
+            shard_datas.setdefault(shard_name, []).append(data)
+
+        for shard_name, this_datas in shard_datas.items():
+            logger.debug("Inserting %s rows into shard %s", len(this_datas), shard_name)
+
+        return self._fan_out(
+            lambda shard_name, db: db.insert(
+                table, shard_datas[shard_name], schema=schema
+            ),
+            shard_names=list(shard_datas.keys()),
+        )
+
+    def create_table_from_table_info(
+        self,
+        creation_settings: List[TableSetting],
+        foreign_key_settings: Dict[str, TableSetting] = {},
+        schema: Optional[str] = None,
+    ) -> None:
+        """
+        Creates the tables on all shards. See
+        DatabaseConnection.create_table_from_table_info
+        """
+        self._fan_out(
+            lambda _, db: db.create_table_from_table_info(
+                creation_settings, foreign_key_settings, schema=schema
+            )
+        )
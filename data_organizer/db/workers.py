@@ -0,0 +1,78 @@
+"""
+Helpers for using a DatabaseConnection in multiprocessing workers. Engines and
+their connection pools can not be shared between processes, so each worker
+builds its own connection from the (picklable) connection spec.
+
+Example:
+
+    with worker_pool(db, processes=4) as pool:
+        results = pool.map(process_track, track_ids)
+
+where process_track uses get_worker_connection() to access the database.
+"""
+import logging
+import multiprocessing
+from multiprocessing.pool import Pool
+from multiprocessing.util import Finalize
+from typing import Any, Dict, Optional
+
+from data_organizer.db.connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+_worker_connection: Optional[DatabaseConnection] = None
+
+
+def init_worker_connection(spec: Dict[str, Any]) -> None:
+    """
+    Initializer for worker processes. Creates one connection per worker that is
+    closed when the worker exits.
+
+    Args:
+        spec: Connection spec as returned by DatabaseConnection.connection_spec
+    """
+    global _worker_connection
+    _worker_connection = DatabaseConnection.from_spec(spec)
+    logger.debug("Initialized worker connection")
+    Finalize(_worker_connection, _worker_connection.close, exitpriority=10)
+
+
+def get_worker_connection() -> DatabaseConnection:
+    """
+    Get the connection of the current worker process.
+
+    Raises:
+        RuntimeError if the process was not initialized with init_worker_connection
+    """
+    if _worker_connection is None:
+        raise RuntimeError(
+            "No worker connection initialized. Use worker_pool or pass "
+            "init_worker_connection as initializer"
+        )
+    return _worker_connection
+
+
+def worker_pool(
+    db: DatabaseConnection,
+    processes: Optional[int] = None,
+    start_method: Optional[str] = None,
+    **kwargs,
+) -> Pool:
+    """
+    Create a process pool with one DatabaseConnection per worker.
+
+    Args:
+        db: Connection whose settings are used in the workers
+        processes: Number of worker processes. Defaults to os.cpu_count()
+        start_method: Optional multiprocessing start method (fork, spawn, ...)
+        kwargs: Passed to multiprocessing.Pool
+
+    Returns: Pool object. Use it as context manager.
+    """
+    context = multiprocessing.get_context(start_method)
+    return context.Pool(
+        processes,
+        initializer=init_worker_connection,
+        initargs=(db.connection_spec,),
+        **kwargs,
+    )
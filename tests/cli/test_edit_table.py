@@ -0,0 +1,131 @@
+from unittest.mock import MagicMock
+
+import click
+import pytest
+from pypika import PostgreSQLQuery
+
+from data_organizer.cli.edit_table import edit_from_file, insert_relative
+from data_organizer.config import OrganizerConfig
+from data_organizer.db.connection import Backend
+
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db.schema = None
+    db.has_table.return_value = True
+    db.insert_many.return_value = True
+    return db
+
+
+@pytest.fixture
+def get_config(monkeypatch):
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", "abcd")
+
+    def _get_config(table_config):
+        return OrganizerConfig(
+            "CONFIGTEST",
+            config_dir_base="tests/conf",
+            secrets="",
+            additional_configs=[table_config],
+        )
+
+    return _get_config
+
+
+def test_edit_from_file(db, get_config, tmp_path):
+    config = get_config("test_table_good_w_rel.toml")
+    file_name = tmp_path / "rows.csv"
+    file_name.write_text(
+        "id_table,value,table_rel_to_1.id_table_rel,table_rel_to_1.value\n"
+        "1,10,100,1000\n"
+        "2,20,,\n"
+        "3,30,300,3000\n"
+    )
+
+    assert edit_from_file(config, db, "table_1", str(file_name), batch_size=2) == 0
+
+    db.insert_many.assert_called_once()
+    inserts = db.insert_many.call_args.args[0]
+    assert [(t.name, rows) for t, rows in inserts] == [
+        (config.tables["table_1"].name, [[1, 10], [2, 20]]),
+        (config.tables["table_1"].name, [[3, 30]]),
+        (config.tables["table_rel_to_1"].name, [[100, 1, 1000], [300, 3, 3000]]),
+    ]
+
+
+def test_edit_from_file_serial(db, get_config, tmp_path):
+    config = get_config("test_table_good_serial_w_rel.toml")
+    file_name = tmp_path / "rows.jsonl"
+    file_name.write_text(
+        '{"date": "2022-01-01", "duration": "1:30", "ride_notes.note": "Rain"}\n'
+        '{"date": "2022-01-02", "duration": null}\n'
+    )
+
+    assert edit_from_file(config, db, "rides", str(file_name)) == 0
+
+    inserts = db.insert_many.call_args.args[0]
+    assert [t.name for t, _ in inserts] == ["rides", "ride_notes", "rides"]
+    assert inserts[0][1] == [["2022-01-01", "1:30"]]
+    assert inserts[2][1] == [["2022-01-02", None]]
+    # The common column references the value generated by the previous insert
+    id_ride, note = inserts[1][1][0]
+    assert note == "Rain"
+    assert PostgreSQLQuery.select(id_ride).get_sql() == (
+        """SELECT currval(pg_get_serial_sequence('"rides"','id_ride'))"""
+    )
+
+
+def test_edit_from_file_invalid(db, get_config, tmp_path):
+    config = get_config("test_table_good_serial_w_rel.toml")
+    file_name = tmp_path / "rows.csv"
+    file_name.write_text(
+        "date,duration\n2022-01-01,1:30\n2022-13-01,\n2022-01-03,1:75\n"
+    )
+
+    assert edit_from_file(config, db, "rides", str(file_name)) == 1
+    db.insert_many.assert_not_called()
+
+
+def test_edit_from_file_failed_insert(db, get_config, tmp_path):
+    config = get_config("test_table_good_serial_w_rel.toml")
+    db.insert_many.return_value = False
+    file_name = tmp_path / "rows.csv"
+    file_name.write_text("date,duration\n2022-01-01,1:30\n")
+
+    assert edit_from_file(config, db, "rides", str(file_name)) == 1
+
+
+def test_insert_relative(db, get_config, monkeypatch):
+    config = get_config("test_table_good_serial_w_rel.toml")
+    db.insert_with_relative.return_value = (True, None, 5)
+    monkeypatch.setattr(click, "confirm", lambda *args, **kwargs: True)
+    monkeypatch.setattr(click, "prompt", lambda *args, **kwargs: "Rain")
+
+    success, _ = insert_relative(
+        config, db, "rides", {"date": "2022-01-01", "duration": None}
+    )
+
+    assert success
+    db.insert.assert_not_called()
+    args = db.insert_with_relative.call_args.args
+    assert args[0] == config.tables["rides"]
+    assert args[1] == ["2022-01-01", None]
+    assert args[2] == config.tables["ride_notes"]
+    assert args[3][0][1] == "Rain"
+    assert args[4] == "id_ride"
+
+
+def test_insert_relative_declined(db, get_config, monkeypatch):
+    config = get_config("test_table_good_serial_w_rel.toml")
+    db.insert.return_value = (True, None)
+    monkeypatch.setattr(click, "confirm", lambda *args, **kwargs: False)
+
+    success, _ = insert_relative(
+        config, db, "rides", {"date": "2022-01-01", "duration": None}
+    )
+
+    assert success
+    db.insert.assert_called_once_with(config.tables["rides"], [["2022-01-01", None]])
+    db.insert_with_relative.assert_not_called()
@@ -0,0 +1,146 @@
+import gzip
+from datetime import date
+from unittest.mock import MagicMock
+
+import click
+import pytest
+from pypika import PostgreSQLQuery
+
+from data_organizer.cli.export_table import (
+    NULL_PARTITION,
+    export,
+    get_partition_name,
+    infer_format,
+)
+from data_organizer.db.model import get_table_setting_from_dict
+
+
+@pytest.fixture
+def table():
+    return get_table_setting_from_dict(
+        {
+            "name": "rides",
+            "id": {"ctype": "INT", "is_primary": True},
+            "date": {"ctype": "DATE", "is_nullable": True},
+            "distance": {"ctype": "FLOAT"},
+            "track": {"ctype": "BYTEA", "is_nullable": True},
+        }
+    )
+
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.pypika_query = PostgreSQLQuery
+    return db
+
+
+def test_infer_format():
+    assert infer_format("rides.csv.gz") == "csv"
+    assert infer_format("rides.parquet") == "parquet"
+    with pytest.raises(click.BadParameter):
+        infer_format("rides.csv")
+
+
+@pytest.mark.parametrize(
+    ("value", "partition_format", "exp_name"),
+    [
+        (date(2022, 3, 4), None, "date=2022-03-04"),
+        (date(2022, 3, 4), "%Y-%m", "date=2022-03"),
+        ("a/b", "%Y-%m", "date=a_b"),
+        (None, None, f"date={NULL_PARTITION}"),
+    ],
+)
+def test_get_partition_name(value, partition_format, exp_name):
+    assert get_partition_name("date", value, partition_format) == exp_name
+
+
+def test_export_csv(db, table, tmp_path):
+    db.query_stream.return_value = iter(
+        [
+            [(1, date(2022, 1, 1), 1.5, b"\x00\x01"), (2, None, 2.0, None)],
+            [(3, date(2022, 1, 3), 3.0, memoryview(b"\xff"))],
+        ]
+    )
+
+    status_code = export(
+        db, table, str(tmp_path / "rides.csv.gz"), where="distance > 1"
+    )
+
+    assert status_code == 0
+    query = db.query_stream.call_args.args[0]
+    assert query.get_sql() == (
+        'SELECT "id","date","distance","track" FROM "rides" WHERE (distance > 1)'
+    )
+    with gzip.open(tmp_path / "rides.csv.gz", "rt") as f:
+        assert f.read().splitlines() == [
+            "id,date,distance,track",
+            "1,2022-01-01,1.5,\\x0001",
+            "2,,2.0,",
+            "3,2022-01-03,3.0,\\xff",
+        ]
+
+
+def test_export_partitioned(db, table, tmp_path):
+    db.query_stream.return_value = iter(
+        [
+            [(1, 1.5, date(2022, 1, 1)), (3, 3.0, date(2022, 1, 3))],
+            [(2, 2.0, date(2022, 2, 1)), (5, 5.0, date(2023, 1, 1)), (4, 4.0, None)],
+        ]
+    )
+
+    status_code = export(
+        db,
+        table,
+        str(tmp_path),
+        output_format="csv",
+        columns=["id", "distance"],
+        partition_by="date",
+        partition_format="%m",
+    )
+
+    assert status_code == 0
+    query = db.query_stream.call_args.args[0]
+    assert query.get_sql() == (
+        'SELECT "id","distance","date" FROM "rides" ORDER BY "date"'
+    )
+    files = sorted(p.relative_to(tmp_path) for p in tmp_path.rglob("*.csv.gz"))
+    # Rows of 01 are not consecutive, so they are written into a second file
+    assert [str(p) for p in files] == [
+        "date=01/part-000.csv.gz",
+        "date=01/part-001.csv.gz",
+        "date=02/part-000.csv.gz",
+        f"date={NULL_PARTITION}/part-000.csv.gz",
+    ]
+    with gzip.open(tmp_path / "date=01" / "part-000.csv.gz", "rt") as f:
+        assert f.read().splitlines() == ["id,distance", "1,1.5", "3,3.0"]
+    with gzip.open(tmp_path / "date=01" / "part-001.csv.gz", "rt") as f:
+        assert f.read().splitlines() == ["id,distance", "5,5.0"]
+
+
+def test_export_parquet(db, table, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    db.query_stream.return_value = iter(
+        [
+            [(1, date(2022, 1, 1), 1.5, b"\x00\x01"), (2, None, 2.0, None)],
+            [(3, date(2022, 1, 3), 3.0, memoryview(b"\xff"))],
+        ]
+    )
+
+    assert export(db, table, str(tmp_path / "rides.parquet")) == 0
+
+    parquet_file = pq.ParquetFile(tmp_path / "rides.parquet")
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.schema_arrow.field("id").type == pa.int32()
+    assert parquet_file.read().to_pydict() == {
+        "id": [1, 2, 3],
+        "date": [date(2022, 1, 1), None, date(2022, 1, 3)],
+        "distance": [1.5, 2.0, 3.0],
+        "track": [b"\x00\x01", None, b"\xff"],
+    }
+
+
+def test_export_unknown_column(db, table, tmp_path):
+    with pytest.raises(click.BadParameter):
+        export(db, table, str(tmp_path / "rides.csv.gz"), columns=["id", "speed"])
@@ -0,0 +1,257 @@
+import tarfile
+import zipfile
+from unittest.mock import MagicMock
+
+import click
+import pytest
+from pypika import PostgreSQLQuery, Table
+
+from data_organizer.cli.extract_byte_to_file import (
+    MANIFEST_NAME,
+    ArchiveWriter,
+    FileWriterPool,
+    Manifest,
+    extract,
+    get_shard_criterion,
+    parse_shard,
+)
+from data_organizer.db.connection import Backend
+
+
+def test_file_writer_pool(tmp_path):
+    payloads = {f"file_{i}.bin": bytes([i]) * (i + 1) for i in range(20)}
+
+    with FileWriterPool(workers=4, queue_size=2) as writer:
+        for name, data in payloads.items():
+            writer.submit(str(tmp_path / name), memoryview(data))
+
+    assert writer.summary.n_files == 20
+    assert writer.summary.n_bytes == sum(len(d) for d in payloads.values())
+    assert not writer.summary.errors
+    for name, data in payloads.items():
+        assert (tmp_path / name).read_bytes() == data
+
+
+def test_file_writer_pool_aggregates_errors(tmp_path):
+    with FileWriterPool(workers=2) as writer:
+        writer.submit(str(tmp_path / "missing_dir" / "a.bin"), b"a")
+        writer.submit(str(tmp_path / "b.bin"), b"b")
+        writer.submit(str(tmp_path / "missing_dir" / "c.bin"), b"c")
+
+    assert writer.summary.n_files == 1
+    assert sorted(e[0] for e in writer.summary.errors) == [
+        str(tmp_path / "missing_dir" / "a.bin"),
+        str(tmp_path / "missing_dir" / "c.bin"),
+    ]
+
+
+def test_manifest(tmp_path):
+    manifest = Manifest.load(tmp_path / MANIFEST_NAME)
+    assert manifest.files == {}
+    assert manifest.watermark is None
+
+    (tmp_path / "a.bin").write_bytes(b"a")
+    manifest.update(str(tmp_path / "a.bin"), 1, "hash_a")
+    manifest.watermark = "2022-01-01"
+    manifest.watermark_key = ["3"]
+    manifest.save()
+
+    loaded = Manifest.load(tmp_path / MANIFEST_NAME)
+    assert loaded.watermark == "2022-01-01"
+    assert loaded.watermark_key == ["3"]
+    assert loaded.is_unchanged(str(tmp_path / "a.bin"), 1, "hash_a")
+    assert not loaded.is_unchanged(str(tmp_path / "a.bin"), 1, "hash_b")
+    # File removed from the output path
+    (tmp_path / "a.bin").unlink()
+    assert not loaded.is_unchanged(str(tmp_path / "a.bin"), 1, "hash_a")
+
+
+def test_file_writer_pool_skips_unchanged(tmp_path):
+    manifest = Manifest(tmp_path / MANIFEST_NAME)
+    with FileWriterPool(manifest=manifest) as writer:
+        writer.submit(str(tmp_path / "a.bin"), b"a")
+        writer.submit(str(tmp_path / "b.bin"), b"b")
+    assert writer.summary.n_files == 2
+
+    with FileWriterPool(manifest=manifest) as writer:
+        writer.submit(str(tmp_path / "a.bin"), b"a")
+        writer.submit(str(tmp_path / "b.bin"), b"changed")
+    assert writer.summary.n_files == 1
+    assert writer.summary.n_skipped == 1
+    assert (tmp_path / "b.bin").read_bytes() == b"changed"
+
+
+def test_extract_incremental_watermark(tmp_path):
+    db = MagicMock()
+    db.pypika_query = PostgreSQLQuery
+    db.query_stream.return_value = [
+        [(b"a", 1, 10), (b"c", 3, 11)],
+        [(b"b", 2, 12), (b"d", 4, 12)],
+    ]
+
+    kwargs = dict(
+        path=str(tmp_path),
+        prefix="track",
+        file_ext="gpx",
+        data_column="data",
+        columns=["id"],
+        table="tracks",
+        join_tables=[],
+        join_on=[],
+        join_columns=[],
+        incremental=True,
+        watermark_column="updated",
+    )
+    assert extract(db, **kwargs) == 0
+
+    assert (tmp_path / "track_1.gpx").read_bytes() == b"a"
+    assert (tmp_path / "track_3.gpx").read_bytes() == b"c"
+    manifest = Manifest.load(tmp_path / MANIFEST_NAME)
+    assert manifest.watermark == "12"
+    assert manifest.watermark_key == ["4"]
+    query = db.query_stream.call_args[0][0].get_sql()
+    assert "WHERE" not in query
+    assert query.endswith('ORDER BY "updated","id"')
+
+    # Continue after the last row. Rows with the same watermark and a larger key
+    # (e.g. cut off by the limit) are fetched
+    db.query_stream.return_value = []
+    assert extract(db, **kwargs, limit=10) == 0
+    query = db.query_stream.call_args[0][0].get_sql()
+    assert query.endswith(
+        """WHERE ("updated","id")>('12','4') ORDER BY "updated","id" LIMIT 10"""
+    )
+
+    # Manifest w/o key. All rows of the watermark are fetched again
+    manifest.watermark_key = None
+    manifest.save()
+    assert extract(db, **kwargs) == 0
+    query = db.query_stream.call_args[0][0].get_sql()
+    assert """WHERE "updated">='12'""" in query
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.xz", ".zip"])
+def test_archive_writer(tmp_path, suffix):
+    archive = ArchiveWriter(tmp_path / f"out{suffix}")
+    assert archive.write("a.bin", memoryview(b"a" * 10)) == 10
+    archive.write("b.bin", b"b")
+    archive.close()
+
+    assert archive.parts == [tmp_path / f"out{suffix}"]
+    if suffix == ".zip":
+        with zipfile.ZipFile(archive.parts[0]) as f:
+            assert f.namelist() == ["a.bin", "b.bin"]
+            assert f.read("a.bin") == b"a" * 10
+    else:
+        with tarfile.open(archive.parts[0]) as f:
+            assert f.getnames() == ["a.bin", "b.bin"]
+            assert f.extractfile("a.bin").read() == b"a" * 10
+
+
+def test_archive_writer_split(tmp_path):
+    archive = ArchiveWriter(tmp_path / "out.tar", max_size=6000)
+    for i in range(4):
+        archive.write(f"{i}.bin", bytes([i]) * 2000)
+    archive.close()
+
+    assert [p.name for p in archive.parts] == ["out_000.tar", "out_001.tar"]
+    names = []
+    for part in archive.parts:
+        with tarfile.open(part) as f:
+            names.extend(f.getnames())
+    assert names == ["0.bin", "1.bin", "2.bin", "3.bin"]
+
+
+def test_archive_writer_invalid_extension(tmp_path):
+    with pytest.raises(click.BadParameter):
+        ArchiveWriter(tmp_path / "out.rar")
+
+
+def test_extract_archive(tmp_path):
+    db = MagicMock()
+    db.pypika_query = PostgreSQLQuery
+    db.query_stream.return_value = [[(b"a", 1), (b"b", 2)], [(b"c", 3)]]
+
+    status = extract(
+        db,
+        path=str(tmp_path),
+        prefix="track",
+        file_ext="gpx",
+        data_column="data",
+        columns=["id"],
+        table="tracks",
+        join_tables=[],
+        join_on=[],
+        join_columns=[],
+        archive="tracks.tar.gz",
+        workers=4,
+    )
+
+    assert status == 0
+    assert [p.name for p in tmp_path.iterdir()] == ["tracks.tar.gz"]
+    with tarfile.open(tmp_path / "tracks.tar.gz") as f:
+        assert f.getnames() == ["track_1.gpx", "track_2.gpx", "track_3.gpx"]
+
+
+@pytest.mark.parametrize(
+    ("value", "exp_shard"), [(None, None), ("0/4", (0, 4)), ("3/4", (3, 4))]
+)
+def test_parse_shard(value, exp_shard):
+    assert parse_shard(None, None, value) == exp_shard
+
+
+@pytest.mark.parametrize("value", ["4/4", "-1/4", "1", "a/b", "0/0"])
+def test_parse_shard_error(value):
+    with pytest.raises(click.BadParameter):
+        parse_shard(None, None, value)
+
+
+@pytest.mark.parametrize(
+    ("backend", "method", "exp_sql"),
+    [
+        (
+            Backend.POSTGRES,
+            "hash",
+            'MOD(MOD(CAST(hashtext(CAST("id" AS TEXT)) AS BIGINT),4)+4,4)=1',
+        ),
+        (Backend.MYSQL, "hash", 'MOD(MOD(CRC32("id"),4)+4,4)=1'),
+        (Backend.POSTGRES, "modulo", 'MOD(MOD("id",4)+4,4)=1'),
+    ],
+)
+def test_get_shard_criterion(backend, method, exp_sql):
+    db = MagicMock()
+    db.backend = backend
+
+    criterion = get_shard_criterion(db, Table("tracks").id, 1, 4, method)
+
+    assert criterion.get_sql(quote_char='"') == exp_sql
+
+
+def test_extract_filtered_and_sharded(tmp_path):
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db.pypika_query = PostgreSQLQuery
+    db.query_stream.return_value = []
+
+    extract(
+        db,
+        path=str(tmp_path),
+        prefix="track",
+        file_ext="gpx",
+        data_column="data",
+        columns=["id"],
+        table="tracks",
+        join_tables=[],
+        join_on=[],
+        join_columns=[],
+        where="year = 2022",
+        limit=10,
+        shard=(1, 4),
+        shard_method="modulo",
+    )
+
+    query = db.query_stream.call_args[0][0].get_sql()
+    assert query == (
+        'SELECT "data","id" FROM "tracks" WHERE (year = 2022) '
+        'AND MOD(MOD("id",4)+4,4)=1 LIMIT 10'
+    )
@@ -0,0 +1,154 @@
+import re
+from unittest.mock import MagicMock
+
+import click
+import pytest
+
+from data_organizer.cli import import_bytes
+from data_organizer.cli.import_bytes import (
+    collect_files,
+    get_row_template,
+    import_files,
+)
+from data_organizer.db.connection import Backend
+from data_organizer.db.model import get_table_setting_from_dict
+
+
+@pytest.fixture
+def table():
+    return get_table_setting_from_dict(
+        {
+            "name": "tracks",
+            "id": {"ctype": "INT", "is_primary": True},
+            "kind": {"ctype": "VARCHAR(10)", "default": "gpx"},
+            "comment": {"ctype": "TEXT", "is_nullable": True},
+            "data": {"ctype": "BYTEA"},
+        }
+    )
+
+
+@pytest.fixture
+def source(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for i in range(5):
+        (tmp_path / f"track_{i}.gpx").write_bytes(bytes([i]) * (i + 1))
+    (tmp_path / "sub" / "track_5.gpx").write_bytes(b"five")
+    (tmp_path / "notes.txt").write_bytes(b"notes")
+    return tmp_path
+
+
+def test_collect_files(source):
+    assert len(collect_files(str(source))) == 7
+    assert len(collect_files(str(source / "*.gpx"))) == 5
+    assert len(collect_files(str(source / "**" / "*.gpx"))) == 6
+
+
+def test_get_row_template(table):
+    assert get_row_template(table, "data", ["id"]) == [None, "gpx", None, None]
+
+    with pytest.raises(click.BadParameter):
+        get_row_template(table, "data", [])
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_import_files(table, source, resume):
+    db = MagicMock()
+    db.large_file_threshold = 1024
+    db.query_stream.return_value = iter([[(1,), (3,)]])
+    db.insert.return_value = (True, None)
+
+    status_code = import_files(
+        db,
+        table=table,
+        source=str(source),
+        data_column="data",
+        pattern=re.compile(r"track_(?P<id>\d+)\.gpx"),
+        resume=resume,
+        batch_size=2,
+        workers=2,
+    )
+
+    assert status_code == 0
+    inserted = [row for call in db.insert.call_args_list for row in call.args[1]]
+    expected_ids = [0, 2, 4, 5] if resume else [0, 1, 2, 3, 4, 5]
+    assert sorted(row[0] for row in inserted) == expected_ids
+    assert all(row[1] == "gpx" and row[2] is None for row in inserted)
+    assert {row[0]: row[3] for row in inserted}[5] == b"five"
+
+
+def test_import_files_failed_insert(table, source):
+    db = MagicMock()
+    db.large_file_threshold = 1024
+    db.insert.return_value = (False, "Error")
+
+    status_code = import_files(
+        db,
+        table=table,
+        source=str(source),
+        data_column="data",
+        pattern=re.compile(r"track_(?P<id>\d+)\.gpx"),
+    )
+
+    assert status_code == 1
+
+
+def test_import_files_copy(table, source):
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db.large_file_threshold = 4
+    db.copy.return_value = (True, None)
+    db.insert.return_value = (True, None)
+
+    status_code = import_files(
+        db,
+        table=table,
+        source=str(source),
+        data_column="data",
+        pattern=re.compile(r"track_(?P<id>\d+)\.gpx"),
+        batch_size=3,
+    )
+
+    assert status_code == 0
+    # Batches w/ files larger than large_file_threshold are inserted
+    copied = [row[0] for call in db.copy.call_args_list for row in call.args[1]]
+    inserted = [row[0] for call in db.insert.call_args_list for row in call.args[1]]
+    assert sorted(copied) == [0, 1, 5]
+    assert sorted(inserted) == [2, 3, 4]
+
+
+def test_import_files_resume_wo_pattern(table, source):
+    with pytest.raises(click.BadParameter):
+        import_files(
+            MagicMock(),
+            table=table,
+            source=str(source),
+            data_column="data",
+            resume=True,
+        )
+
+
+def test_import_files_read_error(table, source, monkeypatch):
+    read_file = import_bytes.read_file
+
+    def _read_file(file_name, large_file_threshold):
+        if file_name.name == "track_2.gpx":
+            raise PermissionError("Permission denied")
+        return read_file(file_name, large_file_threshold)
+
+    monkeypatch.setattr(import_bytes, "read_file", _read_file)
+    db = MagicMock()
+    db.large_file_threshold = 1024
+    db.insert.return_value = (True, None)
+
+    status_code = import_files(
+        db,
+        table=table,
+        source=str(source),
+        data_column="data",
+        pattern=re.compile(r"track_(?P<id>\d+)\.gpx"),
+        batch_size=2,
+    )
+
+    assert status_code == 1
+    inserted = [row[0] for call in db.insert.call_args_list for row in call.args[1]]
+    assert sorted(inserted) == [0, 1, 3, 4, 5]
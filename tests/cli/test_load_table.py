@@ -0,0 +1,116 @@
+from unittest.mock import MagicMock
+
+import click
+import pandas as pd
+import pytest
+from sqlalchemy.exc import DataError
+
+from data_organizer.cli.load_table import load_file
+from data_organizer.db.connection import Backend
+from data_organizer.db.model import get_table_setting_from_dict
+
+
+@pytest.fixture
+def table():
+    return get_table_setting_from_dict(
+        {
+            "name": "rides",
+            "id": {"ctype": "INT", "is_primary": True},
+            "date": {"ctype": "DATE"},
+            "distance": {"ctype": "FLOAT", "is_nullable": True},
+            "kind": {"ctype": "VARCHAR(10)", "default": "bike"},
+        }
+    )
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    file_name = tmp_path / "rides.csv"
+    file_name.write_text(
+        "id,date,distance,kind,comment\n"
+        "1,2022-01-01,10.5,run,A\n"
+        "2,2022-01-02,,,B\n"
+        "X,2022-01-03,1,bike,C\n"
+        "4,2022-13-01,1,bike,D\n"
+        "5,2022-01-05,2.5,bike,E\n"
+    )
+    return file_name
+
+
+def test_load_file_unknown_format(table, tmp_path):
+    file_name = tmp_path / "data.txt"
+    file_name.write_text("id\n1\n")
+    with pytest.raises(click.BadParameter):
+        load_file(MagicMock(), table, str(file_name))
+
+
+@pytest.mark.parametrize("method", ["copy", "insert"])
+def test_load_file(table, csv_file, method):
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db.copy.return_value = (True, None)
+    db.insert.return_value = (True, None)
+
+    n_rejected = load_file(db, table, str(csv_file), method=method, chunk_size=3)
+
+    assert n_rejected == 2
+    load = db.copy if method == "copy" else db.insert
+    rows = [row for call in load.call_args_list for row in call.args[1]]
+    assert rows == [
+        [1, "2022-01-01", 10.5, "run"],
+        [2, "2022-01-02", None, "bike"],
+        [5, "2022-01-05", 2.5, "bike"],
+    ]
+    rejected = pd.read_csv(f"{csv_file}.rejected.csv", dtype=str)
+    assert rejected["id"].to_list() == ["X", "4"]
+    assert rejected["error"].notna().all()
+
+
+def test_load_file_rejected_by_db(table, csv_file, tmp_path):
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db.copy.return_value = (False, "Error")
+
+    def _insert(_, rows):
+        if rows[0][0] == 5:
+            raise DataError("INSERT", {}, Exception("value too long"))
+        return (False, "Duplicate") if rows[0][0] == 2 else (True, None)
+
+    db.insert.side_effect = _insert
+
+    n_rejected = load_file(
+        db, table, str(csv_file), rejected=str(tmp_path / "rejected.csv")
+    )
+
+    assert n_rejected == 4
+    assert db.insert.call_count == 3
+    rejected = pd.read_csv(tmp_path / "rejected.csv", dtype=str)
+    # Columns of the table, independent of the first rejected record
+    assert rejected.columns.to_list() == ["id", "date", "distance", "kind", "error"]
+    assert rejected["id"].to_list() == ["X", "4", "2", "5"]
+    assert rejected["error"].to_list()[-2:] == ["Duplicate", "value too long"]
+
+
+def test_load_file_chunk_raises(table, csv_file, tmp_path):
+    db = MagicMock()
+    db.backend = Backend.MYSQL
+
+    def _insert(_, rows):
+        if len(rows) > 1 or rows[0][0] == 2:
+            raise DataError("INSERT", {}, Exception("value too long"))
+        return True, None
+
+    db.insert.side_effect = _insert
+
+    n_rejected = load_file(
+        db,
+        table,
+        str(csv_file),
+        method="insert",
+        rejected=str(tmp_path / "rejected.csv"),
+    )
+
+    assert n_rejected == 3
+    rejected = pd.read_csv(tmp_path / "rejected.csv", dtype=str)
+    assert rejected["id"].to_list() == ["X", "4", "2"]
+    assert rejected["error"].to_list()[-1] == "value too long"
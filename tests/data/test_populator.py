@@ -1,10 +1,19 @@
+import json
 from dataclasses import dataclass
+from datetime import datetime
 from typing import List, Optional
 from unittest.mock import MagicMock
 
 import pytest
 
-from data_organizer.data.populator import get_table_data_df_from_user_input
+from data_organizer.data.populator import (
+    coerce_value,
+    get_table_data_df_from_user_input,
+    infer_format,
+    parse_column_value,
+    read_chunks,
+)
+from data_organizer.db.model import ColumnSetting
 
 
 @dataclass
@@ -118,3 +127,87 @@ def test_get_table_data_from_user_input_pre_set():
 
     assert mock_prompt_func.call_count == 0
     assert result["TestColumn"].iloc[0] == 200
+
+
+@pytest.mark.parametrize(
+    ("value", "ctype", "is_nullable", "default", "exp_result"),
+    [
+        ("1", "INT", False, None, 1),
+        ("", "INT", False, "5", 5),
+        ("NULL", "DATE", True, None, None),
+        ("2022-01-01", "DATE", False, None, "2022-01-01"),
+        (" 11:22 ", "INTERVAL", False, None, "11:22"),
+    ],
+)
+def test_parse_column_value(value, ctype, is_nullable, default, exp_result):
+    column = ColumnSetting(
+        name="A", ctype=ctype, is_nullable=is_nullable, default=default
+    )
+    assert parse_column_value(column, value) == exp_result
+
+
+def test_parse_column_value_error_hint():
+    column = ColumnSetting(name="A", ctype="DATE")
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        parse_column_value(column, "2022_01_01")
+
+
+@pytest.mark.parametrize(
+    ("file_name", "exp_format"),
+    [
+        ("data.csv", "csv"),
+        ("data.CSV.gz", "csv"),
+        ("data.2022.jsonl", "jsonl"),
+        ("data.ndjson.xz", "jsonl"),
+        ("data.parquet", "parquet"),
+    ],
+)
+def test_infer_format(file_name, exp_format):
+    assert infer_format(file_name) == exp_format
+
+
+def test_infer_format_unknown():
+    with pytest.raises(ValueError, match="can not be inferred"):
+        infer_format("data.txt")
+
+
+def test_read_chunks(tmp_path):
+    csv_file = tmp_path / "rides.csv"
+    csv_file.write_text("id,distance\n1,10.5\n2,\nX,1\n4,1\n5,2.5\n")
+    chunks = list(read_chunks(str(csv_file), "csv", 2))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert chunks[0]["id"].to_list() == ["1", "2"]
+
+    jsonl_file = tmp_path / "rides.jsonl"
+    jsonl_file.write_text(
+        "\n".join(json.dumps({"id": i, "distance": None}) for i in range(3))
+    )
+    chunks = list(read_chunks(str(jsonl_file), "jsonl", 2))
+    assert [len(c) for c in chunks] == [2, 1]
+
+
+@pytest.mark.parametrize(
+    ("ctype", "is_nullable", "value", "exp_value"),
+    [
+        ("INT", False, "1", 1),
+        ("INT", False, 1, 1),
+        ("INT", False, 1.0, 1),
+        ("FLOAT", False, 1, 1.0),
+        ("FLOAT", True, float("nan"), None),
+        ("TEXT", True, None, None),
+        ("DATE", False, datetime(2022, 1, 1), "2022-01-01"),
+        ("BYTEA", False, b"\x00\x01", b"\x00\x01"),
+    ],
+)
+def test_coerce_value(ctype, is_nullable, value, exp_value):
+    column = ColumnSetting(name="A", ctype=ctype, is_nullable=is_nullable)
+    assert coerce_value(column, value) == exp_value
+
+
+@pytest.mark.parametrize(
+    ("ctype", "value"), [("INT", None), ("INT", 1.5), ("DATE", "2022-13-01")]
+)
+def test_coerce_value_error(ctype, value):
+    column = ColumnSetting(name="A", ctype=ctype)
+    with pytest.raises(ValueError):  # noqa: PT011
+        coerce_value(column, value)
@@ -0,0 +1,38 @@
+import hashlib
+
+import pytest
+
+from data_organizer.db.blobs import (
+    REFERENCE_MAGIC,
+    content_hash,
+    is_blob_reference,
+    make_reference,
+    reference_hash,
+)
+
+
+def test_reference_roundtrip():
+    payload = b"<gpx></gpx>"
+    digest = content_hash(payload)
+    reference = make_reference(digest)
+
+    assert digest == hashlib.sha256(payload).digest()
+    assert reference.startswith(REFERENCE_MAGIC)
+    assert is_blob_reference(reference)
+    assert is_blob_reference(memoryview(reference))
+    assert reference_hash(reference) == digest
+    assert reference_hash(memoryview(reference)) == digest
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        b"<gpx></gpx>",
+        REFERENCE_MAGIC + 10 * b"a",
+        32 * b"a" + REFERENCE_MAGIC,
+        "text",
+        None,
+    ],
+)
+def test_is_blob_reference_false(value):
+    assert not is_blob_reference(value)
@@ -0,0 +1,50 @@
+import pytest
+
+from data_organizer.db.compression import (
+    MAGIC,
+    compress,
+    decompress,
+    decompress_rows,
+    is_compressed,
+)
+
+RAW = b"<gpx>" + 100 * b"<trkpt lat='48.1' lon='11.5'></trkpt>" + b"</gpx>"
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma", "zstd"])
+def test_compress_roundtrip(codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    compressed = compress(RAW, codec)
+
+    assert compressed.startswith(MAGIC)
+    assert len(compressed) < len(RAW)
+    assert is_compressed(compressed)
+    assert is_compressed(memoryview(compressed))
+    assert decompress(compressed) == RAW
+    assert decompress(memoryview(compressed)) == RAW
+    assert decompress(memoryview(compressed).cast("c")) == RAW
+
+
+def test_compress_invalid_codec():
+    with pytest.raises(NotImplementedError):
+        compress(RAW, "snappy")
+
+
+@pytest.mark.parametrize(
+    "value", [RAW, memoryview(RAW), "text", 1, None, MAGIC, MAGIC + b"\xff"]
+)
+def test_decompress_uncompressed(value):
+    assert not is_compressed(value)
+    assert decompress(value) is value
+
+
+def test_decompress_rows():
+    rows = [(1, compress(RAW, "zlib"), compress(RAW, "zlib")), (2, RAW, None)]
+
+    # Only the passed columns are decompressed
+    assert decompress_rows(rows, [1]) == [
+        (1, RAW, compress(RAW, "zlib")),
+        (2, RAW, None),
+    ]
+    assert decompress_rows(rows, []) == rows
@@ -1,23 +1,35 @@
 import os
+import pickle
 import uuid
+from datetime import date
 from typing import Dict, Tuple, Union
+from unittest.mock import MagicMock
 
 import pandas as pd
 import psycopg2
 import pytest
-from pypika import Table
+from pypika import CustomFunction, Table
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
-from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.exc import IntegrityError, InternalError, ProgrammingError
 
+from data_organizer.db.blobs import is_blob_reference
 from data_organizer.db.connection import Backend, DatabaseConnection
 from data_organizer.db.exceptions import (
     BinaryDataException,
     InvalidDataException,
+    ProvisioningException,
     QueryReturnedNoData,
     TableNotExists,
 )
-from data_organizer.db.model import ColumnSetting, TableSetting
+from data_organizer.db.model import (
+    ColumnSetting,
+    IndexSetting,
+    PartitionSetting,
+    RetentionSetting,
+    TableSetting,
+    ViewSetting,
+)
 from data_organizer.utils import init_logging
 
 init_logging("DEBUG")
@@ -620,6 +632,20 @@ def test_query_inc_keys(db, test_table_create_drop):
     assert set(keys) == {"id", "col1"}
 
 
+def test_query_stream(db, test_table_create_drop):
+    batches = list(
+        db.query_stream(
+            f"SELECT id, col1 FROM {test_table_create_drop} ORDER BY id", batch_size=3
+        )
+    )
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert [r[0] for batch in batches for r in batch] == ["A", "B", "C", "D"]
+    assert (
+        list(db.query_stream(f"SELECT * FROM {test_table_create_drop} LIMIT 0")) == []
+    )
+
+
 def test_query_pypika(db, test_table_create_drop):
     db.pypika_query.from_(test_table_create_drop).select("*")
 
@@ -659,3 +685,919 @@ def test_exec_arbitrary_w_update_data_error(db, test_table_create_drop):
     update_succ = db.exec_arbitrary(query_update)
 
     assert not update_succ
+
+
+def test_read_replica_round_robin(test_table_create_drop):
+    db = DatabaseConnection(
+        USER, PW, DBNAME, replicas=[{"host": SERVER}, {"host": SERVER}]
+    )
+
+    assert len(db.replica_engines) == 2
+
+    assert db._get_read_engine() is db.replica_engines[0]
+    assert db._get_read_engine() is db.replica_engines[1]
+    assert db._get_read_engine() is db.replica_engines[0]
+    assert db._get_read_engine(use_primary=True) is db.engine
+
+    assert len(db.query(f"SELECT * FROM {test_table_create_drop}")) > 0
+
+    db.close()
+
+
+def test_read_replica_health_check_fallback(test_table_create_drop):
+    db = DatabaseConnection(
+        USER, PW, DBNAME, replicas=[{"database": "BOGUSNAME"}, {"host": SERVER}]
+    )
+
+    # No probe when selecting the engine
+    assert db._get_read_engine() is db.replica_engines[0]
+    assert not db._unhealthy_replicas
+
+    # Failing replica is marked unhealthy and the next one is used
+    db._next_replica = 0
+    assert (
+        sum(len(b) for b in db.query_stream(f"SELECT * FROM {test_table_create_drop}"))
+        > 0
+    )
+    assert 0 in db._unhealthy_replicas
+    # Unhealthy replica is skipped until replica_retry_interval has passed
+    assert db._get_read_engine() is db.replica_engines[1]
+    assert db._get_read_engine() is db.replica_engines[1]
+
+    db.close()
+
+    db = DatabaseConnection(USER, PW, DBNAME, replicas=[{"database": "BOGUSNAME"}])
+
+    assert (
+        sum(len(b) for b in db.query_stream(f"SELECT * FROM {test_table_create_drop}"))
+        > 0
+    )
+    assert db._get_read_engine() is db.engine
+
+    db.close()
+
+
+def test_read_replica_query_error_keeps_replica_healthy(test_table_create_drop):
+    db = DatabaseConnection(USER, PW, DBNAME, replicas=[{"host": SERVER}])
+
+    with pytest.raises(ProgrammingError):
+        db.query(f"SELECT not_a_column FROM {test_table_create_drop}")
+
+    assert not db._unhealthy_replicas
+    assert db._get_read_engine() is db.replica_engines[0]
+
+    db.close()
+
+
+def test_connection_pickle_rebuilds_engine(db):
+    unpickled_db = pickle.loads(pickle.dumps(db))
+
+    assert unpickled_db.connection_spec == db.connection_spec
+    assert unpickled_db.engine is not db.engine
+    assert unpickled_db.query("SELECT 1")[0][0] == 1
+
+    worker_db = db.for_worker()
+    assert worker_db.engine is not db.engine
+    assert worker_db.query("SELECT 1")[0][0] == 1
+
+    unpickled_db.close()
+    worker_db.close()
+
+
+def test_connection_fork_detection(mocker):
+    db = DatabaseConnection(USER, PW, DBNAME)
+    db.query("SELECT 1")
+    parent_pool = db._engine.pool
+
+    mocker.patch("os.getpid", return_value=db._pid + 1)
+    assert db.engine.pool is not parent_pool
+    assert db._pid == os.getpid()
+    assert db.query("SELECT 1")[0][0] == 1
+
+    db.close()
+
+
+def test_prepared_statement(test_table_create_drop):
+    db = DatabaseConnection(USER, PW, DBNAME)
+
+    db.prepare(
+        "get_col1",
+        f"SELECT col1 FROM {test_table_create_drop} WHERE id = $1",
+        types=["varchar"],
+    )
+
+    assert db.execute_prepared("get_col1", ["A"]) == [(1.0,)]
+    assert db.execute_prepared("get_col1", ["D"]) == [(32.0,)]
+    assert db.execute_prepared("get_col1", ["XYZ"]) == []
+
+    stats = db.prepared_statement_stats["get_col1"]
+    # Connection is reused from the pool, so only prepared once
+    assert stats.prepares == 1
+    assert stats.executions == 3
+
+    db.prepare(
+        "update_col1", f"UPDATE {test_table_create_drop} SET col1 = $2 WHERE id = $1"
+    )
+    assert db.execute_prepared("update_col1", ["A", 42.0]) == []
+    assert db.execute_prepared("get_col1", ["A"]) == [(42.0,)]
+
+    db.close()
+
+
+def test_prepared_statement_errors(db):
+    with pytest.raises(ValueError, match="valid name"):
+        db.prepare("bogus name; DROP", "SELECT 1")
+
+    with pytest.raises(KeyError):
+        db.execute_prepared("not_prepared")
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 10, 100])
+def test_exec_script(db, test_table_create_drop, tmp_path, batch_size):
+    script = f"""
+        -- Update some values; and insert new ones
+        UPDATE {test_table_create_drop} SET col1 = 11.0 WHERE id = 'A';
+        INSERT INTO {test_table_create_drop} VALUES ('E', 5.0, 5.0);
+        INSERT INTO {test_table_create_drop} VALUES ('F;G', 6.0, 6.0);
+    """
+    script_file = tmp_path / "script.sql"
+    script_file.write_text(script)
+
+    success, timings = db.exec_script(script_file, batch_size=batch_size)
+
+    assert success
+    assert sum(t.n_statements for t in timings) == 3
+    assert len(timings) == -(-3 // batch_size)
+
+    ids = [r[0] for r in db.query(f"SELECT id FROM {test_table_create_drop}")]
+    assert "E" in ids
+    assert "F;G" in ids
+
+
+def test_exec_script_rollback(db, test_table_create_drop):
+    script = f"""
+        INSERT INTO {test_table_create_drop} VALUES ('E', 5.0, 5.0);
+        INSERT INTO {test_table_create_drop} VALUES ('A', 6.0, 6.0);
+    """
+
+    success, timings = db.exec_script(script, batch_size=1)
+
+    assert not success
+    assert len(timings) == 1
+
+    success, timings = db.exec_script(script)
+
+    assert not success
+    assert len(timings) == 0
+
+    ids = [r[0] for r in db.query(f"SELECT id FROM {test_table_create_drop}")]
+    assert "E" not in ids
+
+
+@pytest.mark.parametrize(
+    ("dialect", "batch_size", "exp_calls"),
+    [("postgresql", 100, 1), ("postgresql", 2, 2), ("mysql", 100, 3)],
+)
+def test_exec_statements_batches(dialect, batch_size, exp_calls):
+    connection = MagicMock()
+    connection.dialect.name = dialect
+    timings = []
+
+    assert DatabaseConnection._exec_statements(
+        connection, ["SELECT 1", "SELECT 2", "SELECT 3"], batch_size, timings
+    )
+    # pymysql does not accept multiple statements in one execute
+    assert connection.exec_driver_sql.call_count == exp_calls
+    assert sum(t.n_statements for t in timings) == 3
+
+
+@pytest.mark.parametrize("concurrently", [False, True])
+def test_create_table_from_table_info_w_indexes(db, concurrently):
+    cols = {
+        "A": {"ctype": "INT", "is_primary": True},
+        "B": {"ctype": "TEXT"},
+        "C": {"ctype": "TIMESTAMP"},
+        "D": {"ctype": "JSONB"},
+    }
+    indexes = [
+        IndexSetting(columns=["B", "C"]),
+        IndexSetting(columns=["C"], method="brin"),
+        IndexSetting(columns=['lower("B")'], where='"A" > 10'),
+        IndexSetting(
+            columns=["B"], method="hash", name="hash_idx_" + str(uuid.uuid4())[:8]
+        ),
+        IndexSetting(columns=["D"], method="gin"),
+    ]
+    table_setting = TableSetting(
+        name="table_from_info_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[ColumnSetting(name=name, **info) for name, info in cols.items()],
+        indexes=indexes,
+    )
+
+    if concurrently:
+        db.create_table_from_table_info([table_setting.copy(update={"indexes": []})])
+        db.create_indexes(table_setting, concurrently=True)
+    else:
+        db.create_table_from_table_info([table_setting])
+
+    created_indexes = db.query(
+        f"SELECT indexname FROM pg_indexes WHERE tablename = '{table_setting.name}'"
+    )
+    assert {index.get_name(table_setting.name) for index in indexes} <= {
+        r[0] for r in created_indexes
+    }
+
+    # Existing indexes are skipped
+    db.create_indexes(table_setting, concurrently=concurrently)
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_create_indexes_skips_existing():
+    db = MagicMock()
+    db._get_create_index_statement.return_value = "CREATE INDEX"
+    connection = db.engine.connect.return_value.__enter__.return_value
+    indexes = [IndexSetting(columns=["A"]), IndexSetting(columns=["B"])]
+    table_setting = TableSetting(
+        name="table_w_indexes",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="DATE", is_primary=True),
+        ],
+        indexes=indexes,
+    )
+    db._get_index_names.return_value = {indexes[0].get_name(table_setting.name)}
+
+    DatabaseConnection.create_indexes(db, table_setting)
+
+    # MYSQL has no CREATE INDEX IF NOT EXISTS
+    assert connection.execute.call_count == 1
+
+    with pytest.raises(NotImplementedError):
+        DatabaseConnection.create_indexes(
+            db,
+            table_setting.copy(update={"partition": PartitionSetting(column="B")}),
+            concurrently=True,
+        )
+
+
+def test_create_table_from_table_info_w_range_partition(db):
+    cols = {
+        "A": {"ctype": "INT", "is_primary": True},
+        "ts": {"ctype": "DATE", "is_primary": True},
+    }
+    table_setting = TableSetting(
+        name="table_from_info_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[ColumnSetting(name=name, **info) for name, info in cols.items()],
+        partition=PartitionSetting(column="ts", premake=1, default_partition=True),
+    )
+
+    db.create_table_from_table_info([table_setting])
+
+    def get_partitions():
+        return {
+            r[0]
+            for r in db.query(
+                f"""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = '{table_setting.name}'
+                """
+            )
+        }
+
+    assert len(get_partitions()) == 3
+
+    db.create_partitions(table_setting, ahead=3)
+    assert len(get_partitions()) == 5
+
+    success, _ = db.insert(table_setting, [[1, date.today().isoformat()]])
+    assert success
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_create_table_from_table_info_w_list_partition(db):
+    cols = {
+        "region": {"ctype": "TEXT"},
+        "value": {"ctype": "INT"},
+    }
+    table_setting = TableSetting(
+        name="table_from_info_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[ColumnSetting(name=name, **info) for name, info in cols.items()],
+        partition=PartitionSetting(
+            column="region", method="LIST", values={"eu": ["de", "fr"], "us": ["us"]}
+        ),
+    )
+
+    db.create_table_from_table_info([table_setting])
+    db._insert(table_setting.name, None, [["de", 1], ["us", 2]])
+
+    assert db.query(f"SELECT value FROM {table_setting.name}_peu") == [(1,)]
+    assert db.query(f"SELECT value FROM {table_setting.name}_pus") == [(2,)]
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+@pytest.mark.parametrize(
+    ("new_column", "backfill", "exp_values"),
+    [
+        (
+            ColumnSetting(name="col3", ctype="FLOAT", is_nullable=True),
+            None,
+            [None, None, None, None],
+        ),
+        (
+            ColumnSetting(name="col3", ctype="FLOAT", default="5.5"),
+            None,
+            [5.5, 5.5, 5.5, 5.5],
+        ),
+        (
+            ColumnSetting(name="col3", ctype="FLOAT"),
+            "col1 + col2",
+            [3.0, 5.0, 7.0, 34.0],
+        ),
+    ],
+)
+def test_add_column_to_table(
+    db, test_table_create_drop, new_column, backfill, exp_values
+):
+    progress = []
+
+    n_backfilled = db.add_column_to_table(
+        test_table_create_drop,
+        new_column,
+        backfill=backfill,
+        batch_size=3,
+        progress=lambda done, total: progress.append(done),
+    )
+
+    assert n_backfilled == (0 if exp_values[0] is None else 4)
+    if n_backfilled:
+        assert progress == [3, 4]
+
+    data = db.query(f"SELECT col3 FROM {test_table_create_drop} ORDER BY id")
+    assert [r[0] for r in data] == exp_values
+
+    columns = db.query(
+        f"""
+        SELECT is_nullable, column_default FROM information_schema.columns
+        WHERE table_name = '{test_table_create_drop}' AND column_name = 'col3'
+        """
+    )
+    assert columns[0][0] == ("YES" if new_column.is_nullable else "NO")
+    if new_column.default is not None:
+        success, _ = db._insert(test_table_create_drop, ["id"], [["X"]])
+        assert success
+
+
+def test_add_column_to_table_errors(db, test_table_create_drop):
+    with pytest.raises(ValueError, match="not nullable"):
+        db.add_column_to_table(
+            test_table_create_drop, ColumnSetting(name="col3", ctype="INT")
+        )
+    with pytest.raises(NotImplementedError):
+        db.add_column_to_table(
+            test_table_create_drop, ColumnSetting(name="col3", ctype="SERIAL")
+        )
+
+
+def test_provision(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    base_table_setting, rel_table_setting = get_foreign_key_test_settings(test_uuid)
+    # rel_table refers to the key in the config
+    base_table_setting.rel_table = "rel"
+    tables = {"rel": rel_table_setting, "base": base_table_setting}
+
+    db.create_table_from_table_info([base_table_setting])
+
+    created_tables = db.provision(tables)
+
+    assert created_tables == [rel_table_setting.name]
+    assert db.has_table(rel_table_setting.name)
+    # Foreign key was created
+    success, _ = db._insert(rel_table_setting.name, None, [[1, 2, 3]])
+    assert not success
+
+    assert db.provision(tables) == []
+
+    db.exec_arbitrary(f"DROP TABLE {rel_table_setting.name}")
+    db.exec_arbitrary(f"DROP TABLE {base_table_setting.name}")
+
+
+def test_provision_rollback(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    base_table_setting, rel_table_setting = get_foreign_key_test_settings(test_uuid)
+    rel_table_setting.columns[0].ctype = "BOGUS_TYPE"
+    base_table_setting.rel_table = "rel"
+
+    with pytest.raises(ProvisioningException):
+        db.provision({"rel": rel_table_setting, "base": base_table_setting})
+
+    assert not db.has_table(base_table_setting.name)
+
+
+def test_provision_and_refresh_views(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    table_setting = TableSetting(
+        name=f"view_source_{test_uuid}",
+        columns=[
+            ColumnSetting(name="day", ctype="DATE", is_primary=True),
+            ColumnSetting(name="value", ctype="INT"),
+        ],
+    )
+    view_setting = ViewSetting(
+        name=f"view_{test_uuid}",
+        query=f"SELECT day, sum(value) AS total FROM {table_setting.name} GROUP BY day",
+        unique_columns=["day"],
+        source_tables=[table_setting.name],
+    )
+
+    created = db.provision({"source": table_setting}, views={"view": view_setting})
+    assert created == [table_setting.name, view_setting.name]
+    assert db.provision({"source": table_setting}, views={"view": view_setting}) == []
+
+    # Nothing was inserted through this connection yet
+    assert db.refresh_views([view_setting], only_if_sources_changed=True) == []
+
+    db.insert(table_setting, [[date(2022, 1, 1), 1], [date(2022, 1, 2), 3]])
+    with pytest.raises(QueryReturnedNoData):
+        db.query(f"SELECT * FROM {view_setting.name}")
+
+    assert db.refresh_views([view_setting], only_if_sources_changed=True) == [
+        view_setting.name
+    ]
+    assert len(db.query(f"SELECT * FROM {view_setting.name}")) == 2
+    assert table_setting.name not in db.modified_tables
+
+    assert db.refresh_views({"view": view_setting}, concurrently=False) == [
+        view_setting.name
+    ]
+
+    db.exec_arbitrary(f"DROP MATERIALIZED VIEW {view_setting.name}")
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+@pytest.mark.parametrize("action", ["delete", "archive_table", "archive_file"])
+def test_apply_retention(db, tmp_path, action):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    retention = RetentionSetting(column="ts", keep_days=10, batch_size=2)
+    if action == "archive_table":
+        retention.action = "archive"
+        retention.archive_table = f"archive_{test_uuid}"
+    elif action == "archive_file":
+        retention.action = "archive"
+        retention.archive_file = str(tmp_path / "archive.csv.gz")
+    table_setting = TableSetting(
+        name=f"retention_{test_uuid}",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="ts", ctype="DATE"),
+        ],
+        retention=retention,
+    )
+    db.create_table_from_table_info([table_setting])
+    db.insert(
+        table_setting,
+        [[i, date(2022, 5, 1 + i).isoformat()] for i in range(20)],
+    )
+
+    progress = []
+    n_removed = db.apply_retention(
+        table_setting, today=date(2022, 5, 20), progress=progress.append
+    )
+
+    # Rows before 2022-05-10 are expired
+    assert n_removed == 9
+    assert progress == [2, 4, 6, 8, 9]
+    assert db.query(f"SELECT min(ts) FROM {table_setting.name}") == [
+        (date(2022, 5, 10),)
+    ]
+    if action == "archive_table":
+        assert len(db.query(f"SELECT * FROM {retention.archive_table}")) == 9
+        db.exec_arbitrary(f"DROP TABLE {retention.archive_table}")
+    elif action == "archive_file":
+        archived = pd.read_csv(retention.archive_file)
+        assert list(archived.columns) == ["A", "ts"]
+        assert len(archived) == 9
+
+    assert db.apply_retention(table_setting, today=date(2022, 5, 20)) == 0
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_apply_retention_partitioned(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    table_setting = TableSetting(
+        name=f"retention_{test_uuid}",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="ts", ctype="DATE", is_primary=True),
+        ],
+        partition=PartitionSetting(column="ts", start=date(2022, 3, 1), premake=0),
+        retention=RetentionSetting(column="ts", keep_days=15),
+    )
+    db.create_table_from_table_info([table_setting])
+    db.create_partitions(table_setting, reference=date(2022, 5, 20), ahead=0)
+    db.insert(
+        table_setting,
+        [
+            [1, "2022-03-10"],
+            [2, "2022-04-01"],
+            [3, "2022-04-30"],
+            [4, "2022-05-02"],
+            [5, "2022-05-10"],
+        ],
+    )
+
+    n_removed = db.apply_retention(table_setting, today=date(2022, 5, 20))
+
+    assert n_removed == 4
+    # Expired partitions are dropped
+    assert not db.has_table(f"{table_setting.name}_p2022_03")
+    assert not db.has_table(f"{table_setting.name}_p2022_04")
+    assert db.query(f'SELECT "A" FROM {table_setting.name}') == [(5,)]
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_insert_compressed_bytea(db):
+    raw = b"<gpx>" + 100 * b"<trkpt lat='48.1' lon='11.5'></trkpt>" + b"</gpx>"
+    table_setting = TableSetting(
+        name="table_compressed_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="BYTEA", compression="zlib"),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+    db.insert(table_setting, [[1, raw]])
+
+    # Stored compressed
+    stored_size = db.query(f'SELECT octet_length("B") FROM {table_setting.name}')
+    assert stored_size[0][0] < len(raw)
+    assert db.query(
+        "SELECT attstorage FROM pg_attribute WHERE "
+        f"attrelid = '{table_setting.name}'::regclass AND attname = 'B'"
+    ) == [("e",)]
+
+    # Decompressed on read if the table is passed
+    query = f'SELECT "B" FROM {table_setting.name}'
+    assert db.query(query, tables=[table_setting]) == [(raw,)]
+    assert list(db.query_stream(query, tables=[table_setting])) == [[(raw,)]]
+    assert db.query(query)[0][0] != raw
+    assert (
+        b"".join(
+            db.stream_bytea(table_setting.name, "B", "A", 1, tables=[table_setting])
+        )
+        == raw
+    )
+    df = db.query_to_df(
+        f'SELECT "A", "B" FROM {table_setting.name}', tables=[table_setting]
+    )
+    assert df["B"][0] == raw
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_insert_deduplicated_bytea(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    payload_1 = (
+        f"<gpx><name>{test_uuid}</name>".encode()
+        + 100 * b"<trkpt lat='48.1' lon='11.5'></trkpt>"
+        + b"</gpx>"
+    )
+    payload_2 = f"<gpx><name>{test_uuid}</name></gpx>".encode()
+    table_setting = TableSetting(
+        name=f"table_dedup_{test_uuid}",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="BYTEA", deduplicate=True),
+            ColumnSetting(
+                name="C", ctype="BYTEA", deduplicate=True, compression="zlib"
+            ),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+
+    def n_blobs():
+        return db.query(f"SELECT count(*) FROM {db.blob_table}")[0][0]
+
+    n_blobs_before = n_blobs()
+    db.insert(
+        table_setting,
+        [[1, payload_1, payload_1], [2, payload_1, payload_2]],
+    )
+    # Each payload is stored once per codec (B uncompressed, C with zlib)
+    assert n_blobs() - n_blobs_before == 3
+    n_blobs_before = n_blobs()
+    db.insert(table_setting, [[3, payload_2, payload_1]])
+    assert n_blobs() - n_blobs_before == 1
+    db.insert(table_setting, [[4, payload_2, payload_2]])
+    assert n_blobs() - n_blobs_before == 1
+
+    # Only references are stored in the table
+    assert db.query(f'SELECT max(octet_length("B")) FROM {table_setting.name}') == [
+        (36,)
+    ]
+
+    query = f'SELECT * FROM {table_setting.name} ORDER BY "A"'
+    assert db.query(query, tables=[table_setting]) == [
+        (1, payload_1, payload_1),
+        (2, payload_1, payload_2),
+        (3, payload_2, payload_1),
+        (4, payload_2, payload_2),
+    ]
+    # References are only resolved for columns configured with deduplicate
+    assert all(is_blob_reference(v) for v in db.query(query)[0][1:])
+    assert (
+        b"".join(
+            db.stream_bytea(table_setting.name, "C", "A", 2, tables=[table_setting])
+        )
+        == payload_2
+    )
+    df = db.query_to_df(query, tables=[table_setting])
+    assert list(df["C"]) == [payload_1, payload_2, payload_1, payload_2]
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+@pytest.mark.parametrize("method", ["insert", "copy"])
+def test_insert_deduplicated_bytea_failed(db, method):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    table_setting = TableSetting(
+        name=f"table_dedup_{test_uuid}",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="BYTEA", deduplicate=True),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+    db.insert(table_setting, [[1, f"{test_uuid}_1".encode()]])
+    blob_query = f'SELECT count(*) FROM {db.blob_table} WHERE "size" = %s' % len(
+        f"{test_uuid}_2".encode()
+    )
+    n_blobs_before = db.query(blob_query)[0][0]
+
+    # Duplicate primary key. The blob of the new payload is rolled back as well
+    success, _ = getattr(db, method)(
+        table_setting, [[2, f"{test_uuid}_2".encode()], [1, b"other"]]
+    )
+
+    assert not success
+    assert db.query(blob_query)[0][0] == n_blobs_before
+    assert db.query(f"SELECT count(*) FROM {table_setting.name}") == [(1,)]
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_insert_deduplicated_bytea_w_schema(db):
+    schema = "test_schema_for_dedup"
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    payload = f"<gpx><name>{test_uuid}</name></gpx>".encode()
+    table_setting = TableSetting(
+        name=f"table_dedup_{test_uuid}",
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="BYTEA", deduplicate=True),
+        ],
+    )
+    with db.engine.connect() as connection:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        connection.commit()
+    db.create_table_from_table_info([table_setting], schema=schema)
+
+    success, _ = db.insert(table_setting, [[1, payload]], schema=schema)
+
+    assert success
+    query = f'SELECT * FROM {schema}.{table_setting.name} ORDER BY "A"'
+    tables = [table_setting]
+    assert db.query(query, schema=schema, tables=tables) == [(1, payload)]
+    assert list(db.query_stream(query, schema=schema, tables=tables)) == [
+        [(1, payload)]
+    ]
+    assert (
+        b"".join(
+            db.stream_bytea(
+                table_setting.name, "B", "A", 1, schema=schema, tables=tables
+            )
+        )
+        == payload
+    )
+
+    with db.engine.connect() as connection:
+        connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        connection.commit()
+
+
+def test_insert_and_stream_large_file(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "large_file_threshold", 100)
+    monkeypatch.setattr(db, "stream_chunk_size", 64)
+    content = bytes(range(256)) * 4
+    in_file = tmp_path / "large.bin"
+    in_file.write_bytes(content)
+    table_setting = TableSetting(
+        name="table_large_file_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="BYTEA"),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+
+    def n_large_objects():
+        return db.query("SELECT count(*) FROM pg_largeobject_metadata")[0][0]
+
+    n_large_objects_before = n_large_objects()
+    success, _ = db.insert(table_setting, [[1, str(in_file)], [2, b"small"]])
+
+    assert success
+    # Large objects are removed after the insert
+    assert n_large_objects() == n_large_objects_before
+
+    chunks = list(db.stream_bytea(table_setting.name, "B", "A", 1))
+    assert len(chunks) == 16
+    assert b"".join(chunks) == content
+    assert list(db.stream_bytea(table_setting.name, "B", "A", 2)) == [b"small"]
+    assert list(db.stream_bytea(table_setting.name, "B", "A", 3)) == []
+
+    out_file = tmp_path / "out.bin"
+    assert db.save_bytea_to_file(out_file, table_setting.name, "B", "A", 1) == len(
+        content
+    )
+    assert out_file.read_bytes() == content
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_copy(db):
+    table_setting = TableSetting(
+        name="table_copy_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[
+            ColumnSetting(name="A", ctype="INT", is_primary=True),
+            ColumnSetting(name="B", ctype="TEXT", is_nullable=True),
+            ColumnSetting(name="C", ctype="BYTEA", compression="zlib"),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+
+    data = [[1, "tab\tnew\nline\\", b"\x00\x01"], [2, None, b"<gpx></gpx>" * 10]]
+    success, _ = db.copy(table_setting, data)
+    assert success
+    assert db.query(
+        f'SELECT "A", "B", "C" FROM {table_setting.name} ORDER BY "A"',
+        tables=[table_setting],
+    ) == [tuple(d) for d in data]
+
+    # Duplicate primary key
+    success, err = db.copy(table_setting, [[1, None, b""]])
+    assert not success
+    assert err is not None
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_insert_many(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    main_table = TableSetting(
+        name=f"table_main_{test_uuid}",
+        columns=[
+            ColumnSetting(
+                name="id", ctype="SERIAL", is_primary=True, is_inserted=False
+            ),
+            ColumnSetting(name="A", ctype="INT"),
+        ],
+    )
+    rel_table = TableSetting(
+        name=f"table_rel_{test_uuid}",
+        columns=[
+            ColumnSetting(name="id", ctype="INT"),
+            ColumnSetting(name="B", ctype="INT", is_unique=True),
+        ],
+    )
+    db.create_table_from_table_info([main_table, rel_table])
+    currval = CustomFunction("currval", ["sequence"])(f"{main_table.name}_id_seq")
+
+    success = db.insert_many(
+        [
+            (main_table, [[1]]),
+            (rel_table, [[currval, 10]]),
+            (main_table, [[2], [3]]),
+            (rel_table, [[currval, 30]]),
+        ],
+        batch_size=3,
+    )
+    assert success
+    assert db.query(f'SELECT "id", "B" FROM {rel_table.name} ORDER BY "B"') == [
+        (1, 10),
+        (3, 30),
+    ]
+
+    # Nothing is inserted if one statement fails
+    success = db.insert_many(
+        [(main_table, [[4]]), (rel_table, [[currval, 10]])], batch_size=2
+    )
+    assert not success
+    assert db.query(f"SELECT count(*) FROM {main_table.name}") == [(3,)]
+
+    db.exec_arbitrary(f"DROP TABLE {rel_table.name}")
+    db.exec_arbitrary(f"DROP TABLE {main_table.name}")
+
+
+def test_insert_returning(db):
+    table_setting = TableSetting(
+        name="table_returning_" + str(uuid.uuid4()).replace("-", "_"),
+        columns=[
+            ColumnSetting(
+                name="id", ctype="SERIAL", is_primary=True, is_inserted=False
+            ),
+            ColumnSetting(name="A", ctype="INT"),
+        ],
+    )
+    db.create_table_from_table_info([table_setting])
+
+    success, err, returned = db.insert(
+        table_setting, [[10], [20]], returning=["id", "A"]
+    )
+    assert success
+    assert err is None
+    assert returned == [(1, 10), (2, 20)]
+    assert db.insert(table_setting, [[30]]) == (True, None)
+
+    db.exec_arbitrary(f"DROP TABLE {table_setting.name}")
+
+
+def test_insert_returning_mysql():
+    db = MagicMock()
+    db.backend = Backend.MYSQL
+    db._get_insert_statement.return_value = "INSERT"
+    connection = db.engine.connect.return_value.__enter__.return_value
+    # AUTO_INCREMENT values are not necessarily consecutive
+    connection.execute.side_effect = [MagicMock(lastrowid=5), MagicMock(lastrowid=9)]
+    table_setting = TableSetting(
+        name="table_returning",
+        columns=[
+            ColumnSetting(
+                name="id", ctype="SERIAL", is_primary=True, is_inserted=False
+            ),
+            ColumnSetting(name="A", ctype="INT"),
+        ],
+    )
+
+    with pytest.raises(NotImplementedError):
+        DatabaseConnection.insert(db, table_setting, [[10]], returning=["A"])
+
+    assert DatabaseConnection._insert_returning(
+        db, table_setting.name, ["A"], [[10], [20]], returning=["id"]
+    ) == (True, None, [(5,), (9,)])
+    assert connection.execute.call_count == 2
+
+
+def test_insert_with_relative(db):
+    test_uuid = str(uuid.uuid4()).replace("-", "_")
+    main_table = TableSetting(
+        name=f"table_main_{test_uuid}",
+        columns=[
+            ColumnSetting(
+                name="id", ctype="SERIAL", is_primary=True, is_inserted=False
+            ),
+            ColumnSetting(name="A", ctype="DATE"),
+        ],
+    )
+    rel_table = TableSetting(
+        name=f"table_rel_{test_uuid}",
+        columns=[
+            ColumnSetting(name="id", ctype="INT"),
+            ColumnSetting(name="B", ctype="INT", is_unique=True),
+        ],
+    )
+    db.create_table_from_table_info([main_table, rel_table])
+
+    success, _, common_value = db.insert_with_relative(
+        main_table, ["2022-01-01"], rel_table, [[None, 1], [None, 2]], "id"
+    )
+    assert success
+    assert common_value == 1
+    success, _, common_value = db.insert_with_relative(
+        main_table, ["2022-01-02"], rel_table, [], "id"
+    )
+    assert success
+    assert common_value == 2
+    assert db.query(f'SELECT "id", "B" FROM {rel_table.name} ORDER BY "B"') == [
+        (1, 1),
+        (1, 2),
+    ]
+
+    # Main row is not inserted if a relative row fails
+    success, err, common_value = db.insert_with_relative(
+        main_table, ["2022-01-03"], rel_table, [[None, 1]], "id"
+    )
+    assert not success
+    assert err is not None
+    assert common_value is None
+    assert db.query(f"SELECT count(*) FROM {main_table.name}") == [(2,)]
+
+    db.exec_arbitrary(f"DROP TABLE {rel_table.name}")
+    db.exec_arbitrary(f"DROP TABLE {main_table.name}")
@@ -0,0 +1,129 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from data_organizer.db.connection import Backend, DatabaseConnection
+from data_organizer.db.migration import LiveTable, SchemaPlanner, normalize_type
+from data_organizer.db.model import ColumnSetting, IndexSetting, TableSetting
+
+
+@pytest.mark.parametrize(
+    ("ctype", "length", "exp_type"),
+    [
+        ("INT", None, "integer"),
+        ("SERIAL", None, "integer"),
+        ("integer", None, "integer"),
+        ("FLOAT", None, "double precision"),
+        ("double precision", None, "double precision"),
+        ("VARCHAR(20)", None, "character varying(20)"),
+        ("character varying", 20, "character varying(20)"),
+        ("VARCHAR", None, "character varying"),
+        ("TIME", None, "time without time zone"),
+        ("TIMESTAMP", None, "timestamp without time zone"),
+        ("NUMERIC(10, 2)", None, "numeric"),
+        ("BYTEA", None, "bytea"),
+        ("CUSTOM_TYPE", None, "custom_type"),
+    ],
+)
+def test_normalize_type(ctype, length, exp_type):
+    assert normalize_type(ctype, length) == exp_type
+
+
+@pytest.fixture
+def planner():
+    db = MagicMock()
+    db.backend = Backend.POSTGRES
+    db._get_table = lambda name, schema: DatabaseConnection._get_table(db, name, schema)
+    db._get_create_table_statements.return_value = ["CREATE TABLE new_table ()"]
+    db._get_create_index_statement.return_value = "CREATE INDEX"
+    planner = SchemaPlanner(db)
+    planner._live_tables = {
+        "table_1": LiveTable(
+            "table_1",
+            columns={
+                "A": "integer",
+                "B": "character varying(10)",
+                "X": "text",
+            },
+            indexes={"table_1_pkey"},
+        )
+    }
+    return planner
+
+
+@pytest.fixture
+def tables():
+    return {
+        "table_1": TableSetting(
+            name="table_1",
+            columns=[
+                ColumnSetting(name="A", ctype="SERIAL", is_primary=True),
+                ColumnSetting(name="B", ctype="VARCHAR(20)"),
+                ColumnSetting(name="C", ctype="INT", default="2"),
+            ],
+            indexes=[IndexSetting(columns=["B"])],
+        ),
+        "table_2": TableSetting(
+            name="new_table",
+            columns=[ColumnSetting(name="A", ctype="INT")],
+        ),
+    }
+
+
+def test_diff(planner, tables):
+    diff = planner.diff(tables)
+
+    assert not diff.is_empty
+    assert diff.missing_tables == ["new_table"]
+    assert diff.missing_columns == {"table_1": ["C"]}
+    assert diff.extra_columns == {"table_1": ["X"]}
+    assert diff.type_changes == {
+        "table_1": [("B", "character varying(10)", "character varying(20)")]
+    }
+    assert diff.missing_indexes == {"table_1": ["table_1_B_idx"]}
+
+
+def test_diff_empty(planner):
+    tables = {
+        "table_1": TableSetting(
+            name="table_1",
+            columns=[ColumnSetting(name="A", ctype="INT")],
+        )
+    }
+    assert planner.diff(tables).is_empty
+
+
+def test_plan(planner, tables):
+    plan = planner.plan(tables)
+
+    assert [step.description for step in plan] == [
+        "Create table new_table",
+        "Add column C to table_1",
+        "Change type of table_1.B from character varying(10) to "
+        "character varying(20)",
+        "Create index table_1_B_idx",
+    ]
+    assert plan[1].statements == [
+        'ALTER TABLE "table_1" ADD COLUMN "C" INT DEFAULT 2 NOT NULL'
+    ]
+    assert plan[2].statements == [
+        'ALTER TABLE "table_1" ALTER COLUMN "B" TYPE VARCHAR(20) '
+        'USING "B"::VARCHAR(20)'
+    ]
+
+
+@pytest.mark.parametrize("default", [None, "NULL"])
+def test_plan_not_nullable_wo_default(planner, tables, default):
+    tables["table_1"].columns.append(
+        ColumnSetting(name="D", ctype="INT", default=default)
+    )
+
+    with pytest.raises(ValueError, match="D of table_1 is not nullable"):
+        planner.plan(tables)
+
+    tables["table_1"].columns[-1] = ColumnSetting(
+        name="D", ctype="INT", default=default, is_nullable=True
+    )
+    assert 'ALTER TABLE "table_1" ADD COLUMN "D" INT' in [
+        s for step in planner.plan(tables) for s in step.statements
+    ]
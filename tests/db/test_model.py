@@ -1,11 +1,18 @@
 from dataclasses import asdict, is_dataclass
+from datetime import date
+from graphlib import CycleError
 from typing import Optional
 
 import pytest
 
 from data_organizer.db.model import (
     ColumnSetting,
+    IndexSetting,
+    PartitionSetting,
+    RetentionSetting,
     TableSetting,
+    get_creation_order,
+    get_foreign_key_settings,
     get_table_setting_from_dict,
 )
 
@@ -199,3 +206,146 @@ def test_dataclass(columns, values, types):
 
     for key, value in values.items():
         assert dc[key] == value
+
+
+@pytest.mark.parametrize(
+    ("init_dict", "exp_name"),
+    [
+        ({"columns": ["A"]}, "table_A_idx"),
+        ({"columns": ["A", "B"]}, "table_A_B_idx"),
+        ({"columns": ["lower(A)"]}, "table_lower_A_idx"),
+        ({"columns": ["A"], "name": "my_index"}, "my_index"),
+        ({"columns": ["A" * 100]}, ("table_" + "A" * 100)[:63]),
+    ],
+)
+def test_index_setting_name(init_dict, exp_name):
+    assert IndexSetting(**init_dict).get_name("table") == exp_name
+
+
+def test_get_table_setting_from_dict_w_indexes():
+    test_dict = {
+        "name": "table_name",
+        "indexes": [{"columns": ["A"], "method": "brin"}],
+        "A": {"ctype": "DATE"},
+    }
+
+    table_setting = get_table_setting_from_dict(test_dict)
+
+    assert len(table_setting.columns) == 1
+    assert table_setting.indexes == [IndexSetting(columns=["A"], method="brin")]
+
+
+@pytest.mark.parametrize(
+    ("interval", "first_day", "last_day", "exp_partitions"),
+    [
+        (
+            "month",
+            date(2022, 11, 15),
+            date(2023, 1, 1),
+            [
+                ("2022_11", date(2022, 11, 1), date(2022, 12, 1)),
+                ("2022_12", date(2022, 12, 1), date(2023, 1, 1)),
+                ("2023_01", date(2023, 1, 1), date(2023, 2, 1)),
+            ],
+        ),
+        (
+            "day",
+            date(2022, 12, 31),
+            date(2023, 1, 1),
+            [
+                ("2022_12_31", date(2022, 12, 31), date(2023, 1, 1)),
+                ("2023_01_01", date(2023, 1, 1), date(2023, 1, 2)),
+            ],
+        ),
+        (
+            "year",
+            date(2022, 6, 1),
+            date(2022, 7, 1),
+            [("2022", date(2022, 1, 1), date(2023, 1, 1))],
+        ),
+    ],
+)
+def test_partition_setting_range_partitions(
+    interval, first_day, last_day, exp_partitions
+):
+    partition = PartitionSetting(column="A", interval=interval)
+
+    assert partition.get_range_partitions(first_day, last_day) == exp_partitions
+
+
+@pytest.mark.parametrize(
+    ("start", "ahead", "exp_suffixes"),
+    [
+        (None, None, ["2022_05", "2022_06", "2022_07", "2022_08"]),
+        (None, 0, ["2022_05"]),
+        (date(2022, 3, 10), 1, ["2022_03", "2022_04", "2022_05", "2022_06"]),
+    ],
+)
+def test_partition_setting_premade_range_partitions(start, ahead, exp_suffixes):
+    partition = PartitionSetting(column="A", start=start)
+
+    partitions = partition.get_premade_range_partitions(date(2022, 5, 20), ahead)
+
+    assert [p[0] for p in partitions] == exp_suffixes
+
+
+@pytest.mark.parametrize(
+    ("interval", "suffix", "exp_start"),
+    [
+        ("month", "2022_05", date(2022, 5, 1)),
+        ("day", "2022_05_20", date(2022, 5, 20)),
+        ("year", "2022", date(2022, 1, 1)),
+        ("month", "default", None),
+    ],
+)
+def test_partition_setting_period_from_suffix(interval, suffix, exp_start):
+    partition = PartitionSetting(column="A", interval=interval)
+
+    assert partition.period_from_suffix(suffix) == exp_start
+
+
+def test_retention_setting_cutoff():
+    retention = RetentionSetting(column="A", keep_days=10)
+
+    assert retention.cutoff(date(2022, 5, 20)) == date(2022, 5, 10)
+
+
+def get_rel_test_tables():
+    def _table(name, rel_table=None, as_foreign_key=False):
+        return TableSetting(
+            name=f"{name}_long",
+            rel_table=rel_table,
+            rel_table_common_column="A" if rel_table else None,
+            rel_table_common_column_as_foreign_key=as_foreign_key,
+            columns=[ColumnSetting(name="A", ctype="INT", is_primary=True)],
+        )
+
+    return {
+        "rel_of_rel": _table("rel_of_rel"),
+        "rel": _table("rel", rel_table="rel_of_rel", as_foreign_key=True),
+        "main": _table("main", rel_table="rel"),
+        "standalone": _table("standalone"),
+    }
+
+
+def test_get_creation_order():
+    tables = get_rel_test_tables()
+
+    order = get_creation_order(tables)
+
+    assert set(order) == set(tables.keys())
+    assert order.index("main") < order.index("rel") < order.index("rel_of_rel")
+
+
+def test_get_creation_order_cycle():
+    tables = get_rel_test_tables()
+    tables["rel_of_rel"].rel_table = "main"
+
+    with pytest.raises(CycleError):
+        get_creation_order(tables)
+
+
+def test_get_foreign_key_settings():
+    tables = get_rel_test_tables()
+
+    assert get_foreign_key_settings(tables) == {"rel_of_rel_long": tables["rel"]}
@@ -0,0 +1,40 @@
+import pytest
+
+from data_organizer.db.script import split_sql_statements
+
+
+@pytest.mark.parametrize(
+    ("script", "exp_statements"),
+    [
+        ("SELECT 1", ["SELECT 1"]),
+        ("SELECT 1;SELECT 2;", ["SELECT 1", "SELECT 2"]),
+        ("SELECT 1;\n\n;\nSELECT 2", ["SELECT 1", "SELECT 2"]),
+        ("SELECT 'a;b';", ["SELECT 'a;b'"]),
+        ("SELECT 'it''s;';", ["SELECT 'it''s;'"]),
+        ('SELECT 1 AS "a;b";', ['SELECT 1 AS "a;b"']),
+        ("SELECT 1; -- comment; with semicolon\nSELECT 2;", ["SELECT 1", "SELECT 2"]),
+        ("SELECT /* a; \n b; */ 1;", ["SELECT  1"]),
+        (
+            "CREATE FUNCTION f() RETURNS int AS $$\nBEGIN\n RETURN 1;\nEND;\n$$ "
+            "LANGUAGE plpgsql;\nSELECT f();",
+            [
+                "CREATE FUNCTION f() RETURNS int AS $$\nBEGIN\n RETURN 1;\nEND;\n$$ "
+                "LANGUAGE plpgsql",
+                "SELECT f()",
+            ],
+        ),
+        (
+            "SELECT $body$ a; $$ b; $body$;",
+            ["SELECT $body$ a; $$ b; $body$"],
+        ),
+        ("SELECT $1::int;", ["SELECT $1::int"]),
+        ("SELECT E'it\\'s;';SELECT 2;", ["SELECT E'it\\'s;'", "SELECT 2"]),
+        ("SELECT e'a\\\\';SELECT 2;", ["SELECT e'a\\\\'", "SELECT 2"]),
+        ("SELECT E'a''b\\';c';", ["SELECT E'a''b\\';c'"]),
+        ("SELECT E'a\\\n;b';", ["SELECT E'a\\\n;b'"]),
+        ("SELECT 'a\\';SELECT 'b';", ["SELECT 'a\\'", "SELECT 'b'"]),
+    ],
+)
+def test_split_sql_statements(script, exp_statements):
+    lines = script.splitlines(keepends=True)
+    assert list(split_sql_statements(lines)) == exp_statements
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from data_organizer.db.exceptions import QueryReturnedNoData
+from data_organizer.db.model import ColumnSetting, TableSetting
+from data_organizer.db.sharding import MergeStrategy, ShardedDatabaseConnection
+
+
+def get_mock_shard(data):
+    shard = MagicMock()
+    if data:
+        shard.query_inc_keys.return_value = (data, ["key", "value"])
+        shard.query_to_df.return_value = pd.DataFrame(data, columns=["key", "value"])
+    else:
+        shard.query_inc_keys.side_effect = QueryReturnedNoData
+        shard.query_to_df.side_effect = QueryReturnedNoData
+    shard.insert.return_value = (True, None)
+    return shard
+
+
+@pytest.fixture
+def sharded_db():
+    return ShardedDatabaseConnection(
+        {
+            "eu": get_mock_shard([("a", 1), ("c", 3), ("e", 5)]),
+            "us": get_mock_shard([("b", 2), ("c", 4)]),
+            "asia": get_mock_shard([]),
+        }
+    )
+
+
+def test_query_concat(sharded_db):
+    data, keys = sharded_db.query_inc_keys("SELECT key, value FROM t")
+
+    assert keys == ["key", "value"]
+    assert data == [("a", 1), ("c", 3), ("e", 5), ("b", 2), ("c", 4)]
+
+
+def test_query_ordered(sharded_db):
+    data = sharded_db.query(
+        "SELECT key, value FROM t ORDER BY key",
+        merge=MergeStrategy.ORDERED,
+        order_key=lambda row: row[0],
+    )
+
+    assert [row[0] for row in data] == ["a", "b", "c", "c", "e"]
+
+
+@pytest.mark.parametrize(
+    ("group_key", "exp_data"),
+    [
+        (None, [("total", 15)]),
+        (lambda row: row[0], [("a", 1), ("c", 7), ("e", 5), ("b", 2)]),
+    ],
+)
+def test_query_reduce(sharded_db, group_key, exp_data):
+    data = sharded_db.query(
+        "SELECT key, value FROM t",
+        merge=MergeStrategy.REDUCE,
+        reducer=lambda row_1, row_2: (
+            row_1[0] if group_key is not None else "total",
+            row_1[1] + row_2[1],
+        ),
+        group_key=group_key,
+    )
+
+    assert data == exp_data
+
+
+def test_query_missing_merge_args(sharded_db):
+    with pytest.raises(ValueError, match="order_key"):
+        sharded_db.query("SELECT 1", merge=MergeStrategy.ORDERED)
+    with pytest.raises(ValueError, match="reducer"):
+        sharded_db.query("SELECT 1", merge=MergeStrategy.REDUCE)
+
+
+def test_query_no_data():
+    sharded_db = ShardedDatabaseConnection(
+        {"eu": get_mock_shard([]), "us": get_mock_shard([])}
+    )
+    with pytest.raises(QueryReturnedNoData):
+        sharded_db.query("SELECT 1")
+    with pytest.raises(QueryReturnedNoData):
+        sharded_db.query_to_df("SELECT 1")
+
+
+def test_query_to_df(sharded_db):
+    data = sharded_db.query_to_df("SELECT key, value FROM t", shard_column="shard")
+
+    assert len(data) == 5
+    assert data.shard.to_list() == ["eu", "eu", "eu", "us", "us"]
+
+
+def test_insert_routing(sharded_db):
+    table = TableSetting(
+        name="t",
+        columns=[
+            ColumnSetting(name="key", ctype="TEXT"),
+            ColumnSetting(name="value", ctype="INT"),
+        ],
+    )
+    rows = [["eu", 1], ["us", 2], ["eu", 3]]
+
+    ret = sharded_db.insert(table, rows, shard_key=lambda row: row[0])
+
+    assert ret == {"eu": (True, None), "us": (True, None)}
+    sharded_db.shards["eu"].insert.assert_called_once_with(
+        table, [["eu", 1], ["eu", 3]], schema=None
+    )
+    sharded_db.shards["us"].insert.assert_called_once_with(
+        table, [["us", 2]], schema=None
+    )
+    sharded_db.shards["asia"].insert.assert_not_called()
+
+    with pytest.raises(KeyError):
+        sharded_db.insert(table, [["mars", 1]], shard_key=lambda row: row[0])
+    with pytest.raises(ValueError, match="shard_key"):
+        sharded_db.insert(table, rows)
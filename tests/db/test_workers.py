@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from data_organizer.db.connection import DatabaseConnection
+from data_organizer.db.workers import get_worker_connection, worker_pool
+
+if os.getenv("PG_DEV_DB_USER") is None or os.getenv("PG_DEV_DB_PASSWORD") is None:
+    raise RuntimeError("Set $PG_DEV_DB_USER and $PG_DEV_DB_PASSWORD")
+
+USER = os.getenv("PG_DEV_DB_USER")
+PW = os.getenv("PG_DEV_DB_PASSWORD")
+DBNAME = "Development"
+
+
+def _query_in_worker(value):
+    db = get_worker_connection()
+    return db.query(f"SELECT {value}")[0][0], os.getpid()
+
+
+def test_get_worker_connection_not_initialized():
+    with pytest.raises(RuntimeError):
+        get_worker_connection()
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_worker_pool(start_method):
+    db = DatabaseConnection(USER, PW, DBNAME)
+    # Make sure the parent has a pooled connection that is inherited on fork
+    db.query("SELECT 1")
+
+    with worker_pool(db, processes=2, start_method=start_method) as pool:
+        results = pool.map(_query_in_worker, range(10))
+
+    assert [r[0] for r in results] == list(range(10))
+    assert os.getpid() not in [r[1] for r in results]
+    # Parent connection is still usable
+    assert db.query("SELECT 1")[0][0] == 1
+
+    db.close()
@@ -1,3 +1,5 @@
+from datetime import date
+
 import pytest
 from dynaconf import LazySettings, ValidationError
 
@@ -67,6 +69,18 @@ def test_get_config_table_good(monkeypatch):
         "test_table_rel_not_defined.toml",
         "test_table_common_not_defined.toml",
         "test_table_common_not_valid.toml",
+        "test_table_index_column_not_defined.toml",
+        "test_table_index_invalid_method.toml",
+        "test_table_partition_not_primary.toml",
+        "test_table_partition_list_wo_values.toml",
+        "test_table_partition_range_not_date.toml",
+        "test_view_source_not_defined.toml",
+        "test_view_wo_unique_columns.toml",
+        "test_table_retention_archive_wo_target.toml",
+        "test_table_retention_column_not_defined.toml",
+        "test_table_compression_not_bytea.toml",
+        "test_table_compression_invalid_codec.toml",
+        "test_table_deduplicate_not_bytea.toml",
     ],
 )
 def test_get_config_table_error(monkeypatch, table_file_name):
@@ -131,3 +145,97 @@ def test_organizer_is_inserted_auto_fill_cols(monkeypatch):
                 assert column.is_inserted
 
         assert has_serial_column
+
+
+def test_organizer_config_indexes(monkeypatch):
+    test_pw = "abcd"
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", test_pw)
+    config = OrganizerConfig(
+        "CONFIGTEST",
+        config_dir_base="tests/conf",
+        secrets="",
+        additional_configs=["test_table_good_w_indexes.toml"],
+    )
+
+    table = config.tables["table_1"]
+    assert [c.name for c in table.columns] == ["A", "B", "C", "ts"]
+    assert len(table.indexes) == 4
+    assert table.indexes[0].columns == ["A", "B"]
+    assert table.indexes[1].method == "brin"
+    assert table.indexes[2].where == '"B" > 0'
+
+
+def test_organizer_config_partition(monkeypatch):
+    test_pw = "abcd"
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", test_pw)
+    config = OrganizerConfig(
+        "CONFIGTEST",
+        config_dir_base="tests/conf",
+        secrets="",
+        additional_configs=["test_table_good_w_partition.toml"],
+    )
+
+    table_1 = config.tables["table_1"]
+    assert [c.name for c in table_1.columns] == ["id", "ts"]
+    assert table_1.partition.is_range
+    assert table_1.partition.premake == 2
+    assert table_1.partition.start == date(2022, 1, 1)
+
+    table_2 = config.tables["table_2"]
+    assert not table_2.partition.is_range
+    assert table_2.partition.values == {"eu": ["de", "fr"], "us": ["us"]}
+
+
+def test_organizer_config_retention(monkeypatch):
+    test_pw = "abcd"
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", test_pw)
+    config = OrganizerConfig(
+        "CONFIGTEST",
+        config_dir_base="tests/conf",
+        secrets="",
+        additional_configs=["test_table_good_w_retention.toml"],
+    )
+
+    table_1 = config.tables["table_1"]
+    assert [c.name for c in table_1.columns] == ["id", "ts"]
+    assert table_1.retention.keep_days == 30
+    assert table_1.retention.action == "delete"
+
+    table_2 = config.tables["table_2"]
+    assert table_2.retention.action == "archive"
+    assert table_2.retention.archive_table == "possibly_longer_name_for_table_2_archive"
+    assert table_2.retention.batch_size == 100
+
+
+def test_organizer_config_compression(monkeypatch):
+    test_pw = "abcd"
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", test_pw)
+    config = OrganizerConfig(
+        "CONFIGTEST",
+        config_dir_base="tests/conf",
+        secrets="",
+        additional_configs=["test_table_good_w_compression.toml"],
+    )
+
+    _, track, image = config.tables["table_1"].columns
+    assert track.compression == "zlib"
+    assert track.column_storage == "EXTERNAL"
+    assert track.deduplicate
+    assert image.compression is None
+    assert image.column_storage == "MAIN"
+
+
+def test_organizer_config_views(monkeypatch):
+    test_pw = "abcd"
+    monkeypatch.setenv("CONFIGTEST_DB__PASSWORD", test_pw)
+    config = OrganizerConfig(
+        "CONFIGTEST",
+        config_dir_base="tests/conf",
+        secrets="",
+        additional_configs=["test_table_good_w_views.toml"],
+    )
+
+    view = config.views["view_1"]
+    assert view.name == "daily_summary"
+    assert view.unique_columns == ["day"]
+    assert view.source_tables == ["possibly_longer_name_for_table_1"]